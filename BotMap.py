@@ -288,6 +288,8 @@ def combine_hotel_data(hotel_df, hotel_details_df):
 import folium
 from branca.element import Element
 
+from app.backend.maps import add_hotel_layer, map_center
+
 colors = {
     "Marriott International": "#B71234",
     "InterContinental Hotels Group (IHG)": "#5E2750",
@@ -358,37 +360,15 @@ def get_map(hotels_df):
     hotels_df = get_brand_colors_mapping(hotels_df)
     st.dataframe(hotels_df, use_container_width=True)
 
-    # normalize the number of rooms in a new col from 0-10
-    hotels_df["total_num_of_rooms_normalized"] = (
-        hotels_df["total_num_of_rooms"] - hotels_df["total_num_of_rooms"].min()
-    ) / (
-        hotels_df["total_num_of_rooms"].max() - hotels_df["total_num_of_rooms"].min()
-    ) * 9 + 1
-
-    # Times Square coordinates
-    times_square_lat, times_square_lon = 40.7580, -73.9855
-    # Create a map centered at Times Square
+    # Create a map centered on the hotels
     map_ts_hotels = folium.Map(
-        location=[times_square_lat, times_square_lon],
+        location=map_center(hotels_df),
         zoom_start=15,
         tiles="CartoDB positron",
     )
 
-    # Add hotel markers to the map
-    for idx, row in hotels_df.iterrows():
-        # Marker size based on the number of rooms
-        marker_size = row[
-            "total_num_of_rooms_normalized"
-        ]  # Scale factor to adjust sizes visually
-        st.write(row)
-        # Create a circle marker for each hotel
-        folium.CircleMarker(
-            location=[row["latitude"], row["longitude"]],
-            radius=marker_size,
-            popup=f"{row['name']}<br>Rooms: {row['total_num_of_rooms']}",
-            color=row["color"],
-            fill=True,
-        ).add_to(map_ts_hotels)
+    # Add hotel markers to the map, sized by the normalized number of rooms
+    add_hotel_layer(map_ts_hotels, hotels_df)
 
     add_legend(map_ts_hotels, "Hotel Brands", legend_colors, legend_labels)
     # Display the map
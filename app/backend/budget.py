@@ -0,0 +1,130 @@
+"""Spending limits for enriching a whole market instead of the first rows.
+
+A Budget caps LLM calls, tokens, dollars and wall time. Every call first
+reserves its estimated cost and settles the real usage (from the response)
+when it returns, so concurrent calls can't overshoot by more than what is
+in flight. Once a reservation is refused the budget stays exhausted and
+the remaining hotels are skipped; hotels go out in rank_listings order so
+the budget is spent on the ones that matter most.
+"""
+
+import math
+import time
+
+import numpy as np
+
+from app.backend.spatial import center_of, haversine
+from app.backend.supply import star_class
+from app.backend.telemetry import DEFAULT_COMPLETION_TOKENS, call_cost
+
+
+class BudgetExhausted(RuntimeError):
+    pass
+
+
+class Budget:
+    def __init__(
+        self, max_llm_calls=None, max_tokens=None, max_dollars=None, max_seconds=None
+    ):
+        self.limits = {
+            "llm_calls": max_llm_calls,
+            "tokens": max_tokens,
+            "dollars": max_dollars,
+            "seconds": max_seconds,
+        }
+        self.spent = {"llm_calls": 0, "tokens": 0, "dollars": 0.0}
+        self.reserved = {"llm_calls": 0, "tokens": 0, "dollars": 0.0}
+        self.exhausted = None
+        self.started_at = None
+
+    def set_limits(
+        self, max_llm_calls=None, max_tokens=None, max_dollars=None, max_seconds=None
+    ):
+        # takes effect from the next reservation; hotels skipped after the
+        # budget ran out stay skipped, see EnrichmentRun.with_budget
+        self.limits = Budget(max_llm_calls, max_tokens, max_dollars, max_seconds).limits
+
+    def start(self):
+        if self.started_at is None:
+            self.started_at = time.monotonic()
+        return self
+
+    def elapsed(self):
+        return 0.0 if self.started_at is None else time.monotonic() - self.started_at
+
+    def remaining_seconds(self):
+        if self.limits["seconds"] is None:
+            return math.inf
+        return self.limits["seconds"] - self.elapsed()
+
+    def reserve(
+        self, model, prompt_tokens, completion_tokens=DEFAULT_COMPLETION_TOKENS
+    ):
+        """Reserve one call's estimated cost. Returns the reservation to pass
+        to settle() or release(), or None (for good) once a limit would be
+        exceeded."""
+        if self.exhausted is None and self.remaining_seconds() <= 0:
+            self.exhausted = "seconds"
+        if self.exhausted is not None:
+            return None
+        cost = {
+            "llm_calls": 1,
+            "tokens": prompt_tokens + completion_tokens,
+            "dollars": call_cost(model, prompt_tokens, completion_tokens),
+        }
+        for name, amount in cost.items():
+            limit = self.limits[name]
+            used = self.spent[name] + self.reserved[name]
+            if limit is not None and used + amount > limit:
+                self.exhausted = name
+                return None
+        for name, amount in cost.items():
+            self.reserved[name] += amount
+        return cost
+
+    def release(self, reservation):
+        # nothing was spent, e.g. the answer came from the LLM cache
+        for name, amount in reservation.items():
+            self.reserved[name] -= amount
+
+    def settle(self, reservation, model, usage=None):
+        # usage is (prompt, completion) tokens; without it the estimate stands
+        self.release(reservation)
+        if usage is not None:
+            reservation = {
+                "llm_calls": 1,
+                "tokens": sum(usage),
+                "dollars": call_cost(model, *usage),
+            }
+        for name, amount in reservation.items():
+            self.spent[name] += amount
+
+    def summary(self):
+        return {
+            **self.spent,
+            "seconds": round(self.elapsed(), 2),
+            "exhausted": self.exhausted,
+        }
+
+
+def rank_listings(hotel_df, center=None):
+    """Listings in the order the budget should go to them: higher star class
+    first, then closer to `center` (lat, lon; default the listings' own
+    centre). Rows without a class or coordinates go last."""
+    if hotel_df.empty:
+        return hotel_df
+    located = hotel_df.dropna(subset=["latitude", "longitude"])
+    if center is None and not located.empty:
+        center = center_of(located["latitude"], located["longitude"])
+    stars = star_class(hotel_df["hotel_class"]).fillna(0).to_numpy()
+    if center is None:
+        distance = np.zeros(len(hotel_df))
+    else:
+        distance = haversine(
+            center[0],
+            center[1],
+            hotel_df["latitude"].to_numpy(dtype=float),
+            hotel_df["longitude"].to_numpy(dtype=float),
+        )
+    order = np.lexsort((np.nan_to_num(distance, nan=np.inf), -stars))
+    return hotel_df.iloc[order]
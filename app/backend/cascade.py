@@ -0,0 +1,237 @@
+"""Tiered model cascade for the hotel details stage.
+
+Each hotel is asked on the cheapest model first, as a RatedHotel so the
+answer carries the model's own confidence. The answer is accepted when it
+passes the checks below, otherwise the hotel is escalated to the next tier;
+the last tier (DETAILS_MODEL unless configured otherwise) is asked with the
+plain Hotel model and always accepted, so escalated hotels share the cache
+entries of the single-model path.
+
+- the confidence is at least min_confidence
+- the room count is within [min_rooms, max_rooms]
+- a brand or sub-brand in the name (per the catalog in gpt4_prompt) matches
+  the answer's brand and level, and a name without one isn't given a chain
+
+    LLM_DETAILS_TIERS=gpt-3.5-turbo,gpt-4 streamlit run Bot.py
+
+LLM_CASCADE_OVERRIDES_PATH points at a JSON file of {hotel name: model}
+that starts those hotels at that tier (or on that model only, when it isn't
+one of the tiers). The tier every hotel ended on is logged, stored with its
+details record as details_model, and counted in cascade.stats().
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import Counter
+
+from app.backend.budget import BudgetExhausted
+from app.backend.entity_resolution import normalize_name
+from app.backend.llm_async import (
+    DEFAULT_CONCURRENCY,
+    call_with_retries,
+    gather_in_order,
+    run_sync,
+)
+from app.backend.registry import fingerprint
+from app.backend.search import (
+    DETAILS_MODEL,
+    DETAILS_PROMPT,
+    Hotel,
+    HotelBrand,
+    HotelSubbrandLevel,
+    RatedHotel,
+    aget_hotel_details_from_model,
+    get_name_prefilter,
+    parse_hotel_pydantic_object,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIERS = os.getenv("LLM_DETAILS_TIERS", "")
+DEFAULT_MIN_CONFIDENCE = float(os.getenv("LLM_CASCADE_MIN_CONFIDENCE", "0.7"))
+DEFAULT_OVERRIDES_PATH = os.getenv("LLM_CASCADE_OVERRIDES_PATH", "")
+# the largest hotels in the world have a little over 7,000 rooms
+DEFAULT_MIN_ROOMS = 1
+DEFAULT_MAX_ROOMS = 7500
+
+
+def parse_tiers(spec):
+    # "gpt-3.5-turbo,gpt-4" -> cheapest first; empty means DETAILS_MODEL only
+    tiers = [model.strip() for model in spec.split(",") if model.strip()]
+    return tiers or [DETAILS_MODEL]
+
+
+def load_overrides(path):
+    if not path:
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+class DetailsCascade:
+    def __init__(
+        self,
+        tiers=None,
+        overrides=None,
+        min_confidence=DEFAULT_MIN_CONFIDENCE,
+        min_rooms=DEFAULT_MIN_ROOMS,
+        max_rooms=DEFAULT_MAX_ROOMS,
+    ):
+        self.tiers = list(tiers) if tiers else parse_tiers(DEFAULT_TIERS)
+        if overrides is None:
+            overrides = load_overrides(DEFAULT_OVERRIDES_PATH)
+        self.overrides = {
+            normalize_name(name): model for name, model in overrides.items()
+        }
+        self.min_confidence = min_confidence
+        self.min_rooms = min_rooms
+        self.max_rooms = max_rooms
+        # (model, "accepted" / "escalated" / "failed") -> hotels
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def version(self):
+        """The stage version of the details it produces. A single-tier cascade
+        on DETAILS_MODEL is the plain details call and keeps its version."""
+        schema = Hotel.model_json_schema()
+        if self.tiers == [DETAILS_MODEL] and not self.overrides:
+            return fingerprint(1, DETAILS_MODEL, DETAILS_PROMPT, schema)
+        return fingerprint(
+            1,
+            self.tiers,
+            self.overrides,
+            self.min_confidence,
+            self.min_rooms,
+            self.max_rooms,
+            DETAILS_PROMPT,
+            schema,
+            RatedHotel.model_json_schema(),
+        )
+
+    def tiers_for(self, hotel_name):
+        model = self.overrides.get(normalize_name(hotel_name))
+        if model is None:
+            return self.tiers
+        if model in self.tiers:
+            return self.tiers[self.tiers.index(model) :]
+        return [model]
+
+    def problems(self, hotel_name, hotel):
+        """Why a lower tier's answer can't be accepted, empty when it can."""
+        problems = []
+        if hotel.confidence < self.min_confidence:
+            problems.append(f"confidence {hotel.confidence:.2f}")
+        rooms = hotel.total_num_of_rooms
+        if rooms is None or not self.min_rooms <= rooms <= self.max_rooms:
+            problems.append(f"{rooms} rooms")
+        match, _ = get_name_prefilter().scan(hotel_name)
+        if match is not None:
+            brand, level = match
+            if hotel.brand != brand:
+                problems.append(f"brand {hotel.brand} for a {brand.value} name")
+            elif level is not None and hotel.subbrand != HotelSubbrandLevel(level):
+                problems.append(f"level {hotel.subbrand} for a {level} name")
+        elif hotel.brand not in (None, HotelBrand.Independent):
+            problems.append(f"brand {hotel.brand.value} not in the name")
+        return problems
+
+    def _count(self, model, outcome):
+        with self._lock:
+            self.counts[model, outcome] += 1
+
+    async def aresolve(self, hotel_name, call=None):
+        """(Hotel answer, model it came from) for one name. `call(func, model,
+        prompt, hotel_name)` makes each tier's call, by default with
+        call_with_retries; pipeline.astream_enriched passes its budgeted one.
+        Raises when the last tier fails."""
+        if call is None:
+
+            async def call(func, model, prompt, hotel_name):
+                return await call_with_retries(func, hotel_name)
+
+        tiers = self.tiers_for(hotel_name)
+        for model in tiers[:-1]:
+
+            async def func(hotel_name, model=model):
+                return await aget_hotel_details_from_model(
+                    hotel_name, model, RatedHotel
+                )
+
+            try:
+                hotel = await call(func, model, DETAILS_PROMPT, hotel_name)
+            except BudgetExhausted:
+                raise
+            except Exception as e:
+                logger.debug(f"Details of {hotel_name}: {model} failed", exc_info=True)
+                problems = [f"failed ({e!r})"]
+            else:
+                problems = self.problems(hotel_name, hotel)
+            if not problems:
+                self._count(model, "accepted")
+                logger.info(f"Details of {hotel_name}: {model} accepted")
+                return hotel, model
+            self._count(model, "escalated")
+            logger.info(
+                f"Details of {hotel_name}: {model} escalated, {'; '.join(problems)}"
+            )
+
+        model = tiers[-1]
+
+        async def func(hotel_name):
+            return await aget_hotel_details_from_model(hotel_name, model)
+
+        try:
+            hotel = await call(func, model, DETAILS_PROMPT, hotel_name)
+        except Exception:
+            self._count(model, "failed")
+            raise
+        self._count(model, "accepted")
+        logger.info(f"Details of {hotel_name}: {model} accepted")
+        return hotel, model
+
+    async def adetails_record(self, hotel_name, call=None):
+        # parse_hotel_pydantic_object plus the model the answer came from
+        hotel, model = await self.aresolve(hotel_name, call)
+        return {**parse_hotel_pydantic_object(hotel), "details_model": model}
+
+    def details_records(self, hotel_names, concurrency=DEFAULT_CONCURRENCY):
+        """Like search.hotel_details_records: one record per name, None where
+        every tier failed."""
+        # every tier's call is retried on its own, not the whole cascade
+        results = run_sync(
+            gather_in_order(
+                self.adetails_record,
+                hotel_names,
+                concurrency=concurrency,
+                timeout=None,
+                max_retries=0,
+            )
+        )
+        records = []
+        for hotel_name, result in zip(hotel_names, results):
+            if isinstance(result, Exception):
+                print(f"Error processing {hotel_name}: {result}")
+                result = None
+            records.append(result)
+        return records
+
+    def stats(self):
+        # {model: {"accepted": n, "escalated": n, "failed": n}}
+        with self._lock:
+            counts = dict(self.counts)
+        stats = {model: {} for model in self.tiers}
+        for (model, outcome), count in counts.items():
+            stats.setdefault(model, {})[outcome] = count
+        return stats
+
+
+_default_cascade = None
+
+
+def get_details_cascade():
+    global _default_cascade
+    if _default_cascade is None:
+        _default_cascade = DetailsCascade()
+    return _default_cascade
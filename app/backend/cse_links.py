@@ -0,0 +1,186 @@
+"""Google Custom Search lookups for hotel Cvent pages.
+
+One discovery client is built per api key and reused. Search results are
+cached in SQLite by normalized query, so "The Hotel X" and "hotel x" share
+an entry and a repeat crawl costs no queries at all. Real queries go
+through a token bucket sized to the daily CSE quota; the bucket starts
+from the number of queries already sent in the last 24 hours (also kept in
+the cache file), so back-to-back runs can't overrun the quota together.
+When it runs dry the lookup fails with CSEQuotaExceeded instead of blocking
+until tomorrow.
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import time
+
+from googleapiclient.discovery import build
+from thefuzz import fuzz
+
+from app.backend.entity_resolution import normalize_name
+from app.backend.ratelimit import TokenBucket
+from app.backend.sqlite_store import SQLiteStore
+from app.backend.telemetry import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.getenv("CSE_CACHE_PATH", "data/cse_cache.sqlite")
+DEFAULT_TTL = float(os.getenv("CSE_CACHE_TTL", str(30 * 24 * 3600)))
+# the free tier allows 100 queries a day
+DEFAULT_DAILY_QUOTA = int(os.getenv("CSE_DAILY_QUOTA", "100"))
+DAY = 24 * 3600
+
+
+class CSEQuotaExceeded(RuntimeError):
+    pass
+
+
+class CSECache(SQLiteStore):
+    schema = """
+        CREATE TABLE IF NOT EXISTS cse_results (
+            key TEXT PRIMARY KEY,
+            query TEXT NOT NULL,
+            items TEXT NOT NULL,
+            fetched_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS cse_requests (
+            requested_at REAL NOT NULL
+        );
+    """
+
+    def make_key(self, query, cse_id):
+        return hashlib.sha256(
+            f"{cse_id}\x1f{normalize_name(query)}".encode()
+        ).hexdigest()
+
+    def get(self, key, ttl=DEFAULT_TTL):
+        row = (
+            self.connect()
+            .execute("SELECT items, fetched_at FROM cse_results WHERE key = ?", (key,))
+            .fetchone()
+        )
+        if row is None or time.time() - row[1] > ttl:
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, query, items):
+        self.connect().execute(
+            "INSERT OR REPLACE INTO cse_results VALUES (?, ?, ?, ?)",
+            (key, query, json.dumps(items), time.time()),
+        )
+
+    def log_request(self):
+        conn = self.connect()
+        now = time.time()
+        conn.execute("INSERT INTO cse_requests VALUES (?)", (now,))
+        conn.execute("DELETE FROM cse_requests WHERE requested_at < ?", (now - DAY,))
+
+    def requests_last_day(self):
+        return (
+            self.connect()
+            .execute(
+                "SELECT COUNT(*) FROM cse_requests WHERE requested_at >= ?",
+                (time.time() - DAY,),
+            )
+            .fetchone()[0]
+        )
+
+
+@functools.cache
+def get_cse_service(api_key):
+    # building the client fetches and parses the discovery document, do it once
+    # GOOGLE_CSE_BASE_URL points it at a stand-in, see benchmarks/fake_cse.py
+    client_options = None
+    if os.getenv("GOOGLE_CSE_BASE_URL"):
+        client_options = {"api_endpoint": os.getenv("GOOGLE_CSE_BASE_URL")}
+    return build(
+        "customsearch",
+        "v1",
+        developerKey=api_key,
+        cache_discovery=False,
+        client_options=client_options,
+    )
+
+
+def pick_cvent_link(hotel_name, items):
+    for item in items:
+        if (
+            fuzz.partial_ratio(hotel_name.lower(), item["title"].lower()) > 70
+            and "cvent" in item["link"]
+        ):
+            return item["link"]
+    return None
+
+
+class CventLinkResolver:
+    def __init__(
+        self,
+        api_key,
+        cse_id,
+        cache=None,
+        ttl=DEFAULT_TTL,
+        daily_quota=DEFAULT_DAILY_QUOTA,
+    ):
+        self.api_key = api_key
+        self.cse_id = cse_id
+        self.cache = cache or CSECache(DEFAULT_CACHE_PATH)
+        self.ttl = ttl
+        self.quota = TokenBucket(daily_quota / DAY, capacity=daily_quota)
+        self.quota.tokens = max(0, daily_quota - self.cache.requests_last_day())
+        self.requests = 0
+        self.cache_hits = 0
+
+    def search(self, query):
+        """The CSE result items for `query`, from the cache when possible."""
+        key = self.cache.make_key(query, self.cse_id)
+        items = self.cache.get(key, self.ttl)
+        if items is not None:
+            self.cache_hits += 1
+            with span("cse", hotel=query, outcome="cache_hit"):
+                return items
+        if not self.quota.try_acquire():
+            raise CSEQuotaExceeded(f"CSE daily quota used up, not searching {query!r}")
+        service = get_cse_service(self.api_key)
+        with span("cse", hotel=query):
+            results = service.cse().list(q=query, cx=self.cse_id).execute()
+        self.requests += 1
+        self.cache.log_request()
+        # "items" is missing when nothing matched, cache that too
+        items = [
+            {"title": item["title"], "link": item["link"]}
+            for item in results.get("items", [])
+        ]
+        self.cache.set(key, query, items)
+        return items
+
+    def resolve(self, hotel_name):
+        return pick_cvent_link(hotel_name, self.search(f"cvent {hotel_name}"))
+
+    def iter_resolve(self, hotel_names):
+        """Yield (hotel_name, link or None or exception) for every name, as each
+        resolves. Names that normalize to the same query are searched once."""
+        resolved = {}
+        for hotel_name in hotel_names:
+            key = normalize_name(hotel_name)
+            if key not in resolved:
+                try:
+                    resolved[key] = self.resolve(hotel_name)
+                except Exception as e:
+                    logger.debug(f"CSE lookup of {hotel_name} failed", exc_info=True)
+                    resolved[key] = e
+            yield hotel_name, resolved[key]
+        logger.info(
+            f"CSE: {len(resolved)} unique of {len(hotel_names)} names, "
+            f"{self.requests} queries sent, {self.cache_hits} served from cache"
+        )
+
+    def resolve_many(self, hotel_names):
+        return dict(self.iter_resolve(hotel_names))
+
+
+@functools.cache
+def get_link_resolver(api_key, cse_id):
+    return CventLinkResolver(api_key, cse_id)
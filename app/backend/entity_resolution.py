@@ -0,0 +1,143 @@
+"""Fuzzy matching of hotel names between SerpAPI listings and LLM detail records.
+
+The LLM sometimes rewrites a hotel name ("Hilton NY Midtown" for "New York
+Hilton Midtown"), which makes an exact join on name drop the row. Comparing
+every pair of names is quadratic, so candidates are blocked first: names
+are broken into word tokens and character trigrams, keys shared by too many
+listings are dropped, and only listings sharing the most keys with a record
+are scored with thefuzz, the same scorer `cse_links.pick_cvent_link` uses.
+"""
+
+import re
+import unicodedata
+
+import numpy as np
+from scipy import sparse
+from thefuzz import fuzz
+
+DEFAULT_THRESHOLD = 85
+# keys shared by more listings than this ("hotel", "new", "york") don't block
+DEFAULT_MAX_BLOCK_SIZE = 200
+DEFAULT_MAX_CANDIDATES = 10
+
+ABBREVIATIONS = {
+    "ny": "new york",
+    "nyc": "new york city",
+    "intl": "international",
+    "ste": "suites",
+}
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def normalize_name(name):
+    text = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore")
+    text = text.decode().lower().replace("&", " and ")
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text):
+        tokens += ABBREVIATIONS.get(token, token).split()
+    return " ".join(tokens)
+
+
+def blocking_keys(normalized):
+    keys = set(normalized.split())
+    # trigrams catch typos and run-together words ("timessquare")
+    joined = normalized.replace(" ", "")
+    keys.update("#" + joined[i : i + 3] for i in range(len(joined) - 2))
+    return keys
+
+
+def key_coordinates(key_sets, vocabulary, grow):
+    rows, cols = [], []
+    for row, keys in enumerate(key_sets):
+        for key in keys:
+            col = vocabulary.get(key)
+            if col is None:
+                if not grow:
+                    continue
+                col = vocabulary[key] = len(vocabulary)
+            rows.append(row)
+            cols.append(col)
+    data = np.ones(len(rows), dtype=np.int32)
+    return rows, cols, data
+
+
+def score_pair(left, right):
+    # token_set_ratio alone scores any subset as 100, so "Hampton Inn" would
+    # tie between every Hampton Inn; averaging in token_sort_ratio penalizes
+    # the extra tokens while still ignoring word order
+    return (fuzz.token_set_ratio(left, right) + fuzz.token_sort_ratio(left, right)) // 2
+
+
+def candidate_pairs(left, right, max_block_size, max_candidates):
+    """Return (left positions, right positions) of the pairs worth scoring."""
+    vocabulary = {}
+    rows, cols, data = key_coordinates(map(blocking_keys, right), vocabulary, grow=True)
+    right_keys = sparse.csr_matrix(
+        (data, (rows, cols)), shape=(len(right), len(vocabulary))
+    )
+    rows, cols, data = key_coordinates(map(blocking_keys, left), vocabulary, grow=False)
+    left_keys = sparse.csr_matrix(
+        (data, (rows, cols)), shape=(len(left), len(vocabulary))
+    )
+
+    # drop keys that are too common to narrow anything down
+    block_sizes = np.asarray(right_keys.sum(axis=0)).ravel()
+    keep = sparse.diags((block_sizes <= max_block_size).astype(np.int32))
+    shared = (left_keys @ keep @ (right_keys @ keep).T).tocsr()
+
+    # keep the max_candidates listings sharing the most keys with each record
+    shared.sort_indices()
+    counts = np.diff(shared.indptr)
+    left_pos = np.repeat(np.arange(len(left)), counts)
+    order = np.lexsort((-shared.data, left_pos))
+    rank = np.arange(len(order)) - np.repeat(shared.indptr[:-1], counts)
+    selected = order[rank < max_candidates]
+    return left_pos[selected], shared.indices[selected]
+
+
+def match_names(
+    left_names,
+    right_names,
+    threshold=DEFAULT_THRESHOLD,
+    max_block_size=DEFAULT_MAX_BLOCK_SIZE,
+    max_candidates=DEFAULT_MAX_CANDIDATES,
+):
+    """Match every left name to its best right name.
+
+    Returns (left positions, right positions, confidence 0-100) for the left
+    names that matched exactly or scored at least `threshold`."""
+    left = [normalize_name(name) for name in left_names]
+    right = [normalize_name(name) for name in right_names]
+
+    # exact matches (after normalizing) need no scoring
+    exact = {}
+    for position, name in enumerate(right):
+        exact.setdefault(name, position)
+    left_exact = np.array([exact.get(name, -1) for name in left], dtype=np.int64)
+    unmatched = np.flatnonzero(left_exact < 0)
+
+    left_pos, right_pos = candidate_pairs(
+        [left[i] for i in unmatched], right, max_block_size, max_candidates
+    )
+    left_pos = unmatched[left_pos]
+    scores = np.fromiter(
+        (score_pair(left[i], right[j]) for i, j in zip(left_pos, right_pos)),
+        dtype=np.int64,
+        count=len(left_pos),
+    )
+
+    # best candidate per left name, ties going to the earlier listing
+    order = np.lexsort((right_pos, -scores, left_pos))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = left_pos[order][1:] != left_pos[order][:-1]
+    best = order[first]
+    best = best[scores[best] >= threshold]
+
+    matched = np.flatnonzero(left_exact >= 0)
+    positions = np.concatenate([matched, left_pos[best]])
+    order = np.argsort(positions, kind="stable")
+    return (
+        positions[order],
+        np.concatenate([left_exact[matched], right_pos[best]])[order],
+        np.concatenate([np.full(len(matched), 100), scores[best]])[order],
+    )
@@ -0,0 +1,151 @@
+"""Helpers for running many structured LLM calls concurrently with asyncio."""
+
+import asyncio
+import concurrent.futures
+import contextvars
+import logging
+import os
+import random
+import threading
+import weakref
+
+from tqdm import tqdm
+
+from app.backend.ratelimit import DEFAULT_MAX_REQUEUES, RateLimited
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "16"))
+DEFAULT_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+DEFAULT_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+
+# {loop: [async cleanup]} awaited by run_sync before the loop closes
+_loop_cleanups = weakref.WeakKeyDictionary()
+_loop_cleanups_lock = threading.Lock()
+# the asyncio.timeout of the call_with_retries attempt in progress
+_attempt_timeout = contextvars.ContextVar("attempt_timeout", default=None)
+
+
+def backoff_delay(attempt, base=0.5, cap=20.0):
+    # "full jitter" backoff: sleep anywhere between 0 and the exponential ceiling
+    # so that workers that failed together don't all retry together
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+async def call_with_retries(
+    func,
+    *args,
+    timeout=DEFAULT_TIMEOUT,
+    max_retries=DEFAULT_MAX_RETRIES,
+    max_requeues=DEFAULT_MAX_REQUEUES,
+    **kwargs,
+):
+    attempt = requeues = 0
+    while True:
+        try:
+            async with asyncio.timeout(timeout) as attempt_timeout:
+                token = _attempt_timeout.set(attempt_timeout)
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    _attempt_timeout.reset(token)
+        except RateLimited as e:
+            # the call itself was fine, so this doesn't use up a retry; the
+            # limiter that raised it paces the next try
+            requeues += 1
+            if requeues > max_requeues:
+                raise
+            logger.info(f"Rate limited ({e}), requeued {requeues} times")
+            await asyncio.sleep(e.delay)
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(
+                f"Attempt {attempt + 1} failed ({e!r}), retrying in {delay:.2f}s"
+            )
+            attempt += 1
+            await asyncio.sleep(delay)
+
+
+async def untimed(awaitable):
+    """Await `awaitable` with the timeout of the surrounding call_with_retries
+    stopped, e.g. while queueing for a rate limiter: waiting for a turn is not
+    the request taking too long, and should not use up a retry."""
+    attempt_timeout = _attempt_timeout.get()
+    if attempt_timeout is None or attempt_timeout.when() is None:
+        return await awaitable
+    loop = asyncio.get_running_loop()
+    remaining = attempt_timeout.when() - loop.time()
+    attempt_timeout.reschedule(None)
+    try:
+        return await awaitable
+    finally:
+        attempt_timeout.reschedule(loop.time() + remaining)
+
+
+async def gather_in_order(
+    func,
+    items,
+    concurrency=DEFAULT_CONCURRENCY,
+    timeout=DEFAULT_TIMEOUT,
+    max_retries=DEFAULT_MAX_RETRIES,
+    progress=True,
+):
+    """Run `await func(item)` for every item with at most `concurrency` calls in
+    flight. Returns one entry per item in input order; calls that still fail
+    after all retries return their exception instead of raising."""
+    semaphore = asyncio.Semaphore(concurrency)
+    progress_bar = tqdm(total=len(items), disable=not progress)
+
+    async def worker(item):
+        async with semaphore:
+            try:
+                return await call_with_retries(
+                    func, item, timeout=timeout, max_retries=max_retries
+                )
+            except Exception as e:
+                logger.debug(f"Gave up on {item!r}", exc_info=True)
+                return e
+            finally:
+                progress_bar.update(1)
+
+    try:
+        return await asyncio.gather(*(worker(item) for item in items))
+    finally:
+        progress_bar.close()
+
+
+def on_loop_exit(cleanup):
+    """Have run_sync await `cleanup()` before the running loop closes, e.g. to
+    close connection pools bound to it. Loops started some other way keep
+    their resources until they are garbage collected."""
+    with _loop_cleanups_lock:
+        _loop_cleanups.setdefault(asyncio.get_running_loop(), []).append(cleanup)
+
+
+async def _run_and_clean_up(coro):
+    try:
+        return await coro
+    finally:
+        with _loop_cleanups_lock:
+            cleanups = _loop_cleanups.pop(asyncio.get_running_loop(), [])
+        for cleanup in cleanups:
+            try:
+                await cleanup()
+            except Exception:
+                logger.warning("Loop cleanup failed", exc_info=True)
+
+
+def run_sync(coro):
+    # streamlit and plain scripts have no running loop, but jupyter does and
+    # asyncio.run refuses to nest, so hop onto a helper thread in that case
+    coro = _run_and_clean_up(coro)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+
+    # copy the context so telemetry spans stay attached to the caller's run
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(contextvars.copy_context().run, asyncio.run, coro).result()
@@ -0,0 +1,130 @@
+"""Pack many names into a single structured LLM request.
+
+The batch response must contain every input name exactly once. Names that
+come back missing, duplicated or rewritten are re-split into smaller batches
+and retried until they either resolve or end up alone in a batch of one.
+"""
+
+import logging
+import os
+
+from app.backend.llm_async import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_TIMEOUT,
+    gather_in_order,
+)
+
+logger = logging.getLogger(__name__)
+
+# prompt + names + expected answers for one request, in (estimated) tokens
+DEFAULT_TOKEN_BUDGET = int(os.getenv("LLM_BATCH_TOKEN_BUDGET", "3000"))
+DEFAULT_MAX_BATCH_SIZE = int(os.getenv("LLM_MAX_BATCH_SIZE", "50"))
+
+
+def estimate_tokens(text):
+    # ~4 characters per token is close enough for english prose and names
+    return len(text) // 4 + 1
+
+
+def pack_batches(
+    names,
+    prompt_tokens,
+    item_tokens,
+    token_budget=DEFAULT_TOKEN_BUDGET,
+    max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+):
+    # greedily fill each batch until the next name would blow the token budget
+    batches, batch, used = [], [], prompt_tokens
+    for name in names:
+        cost = item_tokens(name)
+        if batch and (used + cost > token_budget or len(batch) >= max_batch_size):
+            batches.append(batch)
+            batch, used = [], prompt_tokens
+        batch.append(name)
+        used += cost
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def match_batch(batch, items, key):
+    """Split a batch answer into (results by name, names to retry)."""
+    if len(batch) == 1 and len(items) == 1:
+        # a batch of one can't be ambiguous, accept even a rewritten name
+        return {batch[0]: items[0]}, []
+    returned = {}
+    counts = {}
+    for item in items:
+        name = key(item).strip()
+        counts[name] = counts.get(name, 0) + 1
+        returned[name] = item
+    resolved = {
+        name: returned[name.strip()] for name in batch if counts.get(name.strip()) == 1
+    }
+    return resolved, [name for name in batch if name not in resolved]
+
+
+def split(batch):
+    middle = len(batch) // 2
+    return [batch[:middle], batch[middle:]]
+
+
+async def run_batched(
+    call_batch,
+    names,
+    prompt_tokens,
+    item_tokens,
+    key=lambda item: item.name,
+    token_budget=DEFAULT_TOKEN_BUDGET,
+    max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+    concurrency=DEFAULT_CONCURRENCY,
+    timeout=DEFAULT_TIMEOUT,
+    max_retries=DEFAULT_MAX_RETRIES,
+):
+    """Resolve `names` with `await call_batch(batch) -> list of items`.
+
+    Returns ({name: item or exception}, number of requests sent)."""
+    unique_names = list(dict.fromkeys(names))
+    batches = pack_batches(
+        unique_names, prompt_tokens, item_tokens, token_budget, max_batch_size
+    )
+    results = {}
+    requests = 0
+    while batches:
+        requests += len(batches)
+        answers = await gather_in_order(
+            call_batch,
+            batches,
+            concurrency=concurrency,
+            timeout=timeout,
+            max_retries=max_retries,
+            progress=False,
+        )
+        retry_batches = []
+        for batch, answer in zip(batches, answers):
+            if isinstance(answer, Exception):
+                if len(batch) == 1:
+                    results[batch[0]] = answer
+                else:
+                    retry_batches += split(batch)
+                continue
+            resolved, leftover = match_batch(batch, answer, key)
+            results.update(resolved)
+            if not leftover:
+                continue
+            if len(batch) == 1:
+                results[batch[0]] = ValueError(
+                    f"Expected one answer for {batch[0]!r}, got {len(answer)}"
+                )
+            elif len(leftover) == 1:
+                retry_batches.append(leftover)
+            else:
+                retry_batches += split(leftover)
+        if retry_batches:
+            logger.info(
+                f"Retrying {sum(map(len, retry_batches))} names in "
+                f"{len(retry_batches)} smaller batches"
+            )
+        batches = retry_batches
+    return results, requests
@@ -0,0 +1,176 @@
+"""Disk-backed cache for validated structured LLM outputs.
+
+Entries are keyed by a hash of (model, prompt template, response model JSON
+schema, hotel name), so changing any of them naturally misses the old
+entries. The store is a single SQLite file in WAL mode, which lets several
+Streamlit workers and batch jobs read and write it at the same time.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+
+from app.backend.sqlite_store import SQLiteStore
+from app.backend.telemetry import response_usage, span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "data/llm_cache.sqlite")
+DEFAULT_TTL = float(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600)))
+DEFAULT_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# refreshing accessed_at on every hit would turn each read into a write, so
+# only touch entries whose access time is older than this
+TOUCH_INTERVAL = 3600
+# check the size budget once every this many writes
+EVICT_EVERY = 500
+
+
+class LLMCache(SQLiteStore):
+    schema = """
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            model TEXT NOT NULL,
+            hotel_name TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS llm_cache_accessed_at ON llm_cache (accessed_at);
+    """
+
+    def __init__(
+        self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, max_bytes=DEFAULT_MAX_BYTES
+    ):
+        super().__init__(path)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._writes = 0
+        self._schema_hashes = {}
+
+    def _schema_hash(self, response_model):
+        if response_model not in self._schema_hashes:
+            schema = json.dumps(response_model.model_json_schema(), sort_keys=True)
+            self._schema_hashes[response_model] = hashlib.sha256(
+                schema.encode()
+            ).hexdigest()
+        return self._schema_hashes[response_model]
+
+    def make_key(self, model, prompt_template, response_model, hotel_name):
+        # None for listings without a name, which are never cached
+        if hotel_name is None:
+            return None
+        parts = [
+            model,
+            prompt_template,
+            self._schema_hash(response_model),
+            hotel_name.strip(),
+        ]
+        return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+    def get(self, key, response_model):
+        row = (
+            self.connect()
+            .execute(
+                "SELECT payload, created_at, accessed_at FROM llm_cache WHERE key = ?",
+                (key,),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        payload, created_at, accessed_at = row
+        now = time.time()
+        if now - created_at > self.ttl:
+            self.connect().execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            return None
+        if now - accessed_at > TOUCH_INTERVAL:
+            self.connect().execute(
+                "UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+        return response_model.model_validate_json(payload)
+
+    def set(self, key, value, model="", hotel_name=""):
+        payload = value.model_dump_json()
+        now = time.time()
+        self.connect().execute(
+            "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, model, hotel_name, payload, len(payload), now, now),
+        )
+        self._writes += 1
+        if self._writes % EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self):
+        conn = self.connect()
+        conn.execute(
+            "DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl,)
+        )
+        (total,) = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM llm_cache"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        # drop least recently used entries until we are back under budget
+        conn.execute(
+            """
+            DELETE FROM llm_cache WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC) AS kept
+                    FROM llm_cache
+                ) WHERE kept > ?
+            )
+            """,
+            (self.max_bytes,),
+        )
+        logger.info(f"Evicted LLM cache entries down to {self.max_bytes} bytes")
+
+    def clear(self):
+        self.connect().execute("DELETE FROM llm_cache")
+
+
+_default_cache = None
+
+
+def get_llm_cache():
+    # one shared cache per process, created lazily so importing is free
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = LLMCache()
+    return _default_cache
+
+
+def cached_call(model, prompt_template, response_model, hotel_name, call, stage="llm"):
+    cache = get_llm_cache()
+    key = cache.make_key(model, prompt_template, response_model, hotel_name)
+    with span(stage, hotel=hotel_name, model=model) as event:
+        cached = None if key is None else cache.get(key, response_model)
+        if cached is not None:
+            event["outcome"] = "cache_hit"
+            return cached
+        result = call()
+        event["usage"] = response_usage(result)
+    if key is not None:
+        cache.set(key, result, model=model, hotel_name=hotel_name)
+    return result
+
+
+async def acached_call(
+    model, prompt_template, response_model, hotel_name, call, stage="llm"
+):
+    # lookups are sub-millisecond point reads, fine to do on the event loop
+    cache = get_llm_cache()
+    key = cache.make_key(model, prompt_template, response_model, hotel_name)
+    with span(stage, hotel=hotel_name, model=model) as event:
+        cached = None if key is None else cache.get(key, response_model)
+        if cached is not None:
+            event["outcome"] = "cache_hit"
+            return cached
+        result = await call()
+        event["usage"] = response_usage(result)
+    if key is not None:
+        cache.set(key, result, model=model, hotel_name=hotel_name)
+    return result
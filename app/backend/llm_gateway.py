@@ -0,0 +1,234 @@
+"""One process-wide gateway for the structured OpenAI calls.
+
+Every prompt goes through get_llm_gateway() instead of building its own
+instructor.patch(OpenAI()) per call. The gateway keeps one keep-alive
+connection pool (HTTP/2 when the h2 package is installed; async calls get
+one pool per event loop, closed by run_sync as the loop ends), picks the model
+for each task, paces every model with an AdaptiveLimiter and owns the
+client retry policy: the openai client retries 5xx and dropped connections
+with backoff, timeouts and invalid answers are retried by
+llm_async.call_with_retries around the call, and 429s are requeued through
+the model's limiter (RateLimited) instead of failing the row.
+
+Every response's x-ratelimit-* headers feed the limiter of the model it was
+for, so the ceilings are learned from the account's real quota; gateway.
+stats() shows the observed and allowed requests and tokens per minute.
+
+    gateway = get_llm_gateway()
+    hotel = gateway.create(model_for("details"), prompt, Hotel)
+    hotel = await gateway.acreate(model_for("details"), prompt, Hotel)
+
+LLM_MODEL_<TASK> switches a task to another model and LLM_RATE_LIMITS sets
+starting ceilings as "model=rpm:tpm,...".
+"""
+
+import asyncio
+import importlib.util
+import json
+import os
+import threading
+import weakref
+
+import httpx
+import instructor
+from openai import AsyncOpenAI, OpenAI, RateLimitError
+
+from app.backend.llm_async import DEFAULT_TIMEOUT, on_loop_exit, untimed
+from app.backend.llm_batch import estimate_tokens
+from app.backend.ratelimit import DEFAULT_MAX_REQUEUES, AdaptiveLimiter, RateLimited
+from app.backend.telemetry import DEFAULT_COMPLETION_TOKENS, response_usage
+
+TASK_MODELS = {
+    "legitimacy": os.getenv("LLM_MODEL_LEGITIMACY", "gpt-3.5-turbo"),
+    "details": os.getenv("LLM_MODEL_DETAILS", "gpt-4"),
+    # the fused legitimacy + details call answers the details too
+    "enrichment": os.getenv("LLM_MODEL_ENRICHMENT", "gpt-4"),
+}
+DEFAULT_RATE_LIMITS = os.getenv("LLM_RATE_LIMITS", "")
+DEFAULT_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "64"))
+DEFAULT_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+# retries of 5xx and connection errors inside the openai client; 429s are
+# requeued through the model's limiter instead
+DEFAULT_CLIENT_RETRIES = int(os.getenv("LLM_CLIENT_RETRIES", "2"))
+HTTP2 = importlib.util.find_spec("h2") is not None
+# the response model's function schema goes out with every prompt
+SCHEMA_TOKENS = 150
+
+
+def model_for(task):
+    return TASK_MODELS[task]
+
+
+def parse_rate_limits(spec):
+    # "gpt-4=500:10000,gpt-3.5-turbo=3500:60000" -> {model: (rpm, tpm)}
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        model, _, rates = item.partition("=")
+        rpm, _, tpm = rates.partition(":")
+        limits[model.strip()] = (float(rpm), float(tpm) if tpm else None)
+    return limits
+
+
+def request_tokens(prompt):
+    # what a call is charged against the tokens-per-minute limit up front
+    return estimate_tokens(prompt) + SCHEMA_TOKENS + DEFAULT_COMPLETION_TOKENS
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        api_key=None,
+        base_url=None,
+        rate_limits=None,
+        http2=HTTP2,
+        max_connections=DEFAULT_MAX_CONNECTIONS,
+        timeout=DEFAULT_TIMEOUT,
+        client_retries=DEFAULT_CLIENT_RETRIES,
+    ):
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        # None lets the openai client read OPENAI_BASE_URL itself
+        self.base_url = base_url
+        self.http2 = http2
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.client_retries = client_retries
+        if rate_limits is None:
+            rate_limits = parse_rate_limits(DEFAULT_RATE_LIMITS)
+        self.limiters = {
+            model: AdaptiveLimiter(rpm, tpm)
+            for model, (rpm, tpm) in rate_limits.items()
+        }
+        self._client = None
+        # an AsyncOpenAI connection pool is bound to the loop that first uses it
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def _http_options(self):
+        return {
+            "http2": self.http2,
+            "timeout": self.timeout,
+            "limits": httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections,
+                keepalive_expiry=DEFAULT_KEEPALIVE_EXPIRY,
+            ),
+        }
+
+    def limiter(self, model):
+        with self._lock:
+            if model not in self.limiters:
+                self.limiters[model] = AdaptiveLimiter()
+            return self.limiters[model]
+
+    def stats(self):
+        return {model: limiter.stats() for model, limiter in self.limiters.items()}
+
+    def _observe(self, response):
+        # every response, including ones the client retries, feeds the limiter
+        try:
+            model = json.loads(response.request.content)["model"]
+        except (ValueError, KeyError, TypeError):
+            return
+        self.limiter(model).update_from_headers(response.headers, response.status_code)
+        if response.status_code == 429:
+            # requeued through the limiter, which paces all workers together,
+            # instead of the openai client's own per-request retry
+            response.headers["x-should-retry"] = "false"
+
+    async def _aobserve(self, response):
+        self._observe(response)
+
+    def _openai_options(self):
+        options = {"api_key": self.api_key, "max_retries": self.client_retries}
+        if self.base_url:
+            options["base_url"] = self.base_url
+        return options
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = instructor.patch(
+                    OpenAI(
+                        **self._openai_options(),
+                        http_client=httpx.Client(
+                            **self._http_options(),
+                            event_hooks={"response": [self._observe]},
+                        ),
+                    )
+                )
+            return self._client
+
+    def aclient(self):
+        # the instructor-patched AsyncOpenAI client of the running loop
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = instructor.patch(
+                    AsyncOpenAI(
+                        **self._openai_options(),
+                        http_client=httpx.AsyncClient(
+                            **self._http_options(),
+                            event_hooks={"response": [self._aobserve]},
+                        ),
+                    )
+                )
+                self._async_clients[loop] = client
+                # its connections are useless once the loop is gone
+                on_loop_exit(self._aclose)
+            return client
+
+    async def _aclose(self):
+        with self._lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.close()
+
+    def create(self, model, prompt, response_model):
+        # sync callers have no requeue loop of their own, requeue here
+        limiter = self.limiter(model)
+        requeues = 0
+        while True:
+            limiter.acquire(request_tokens(prompt))
+            try:
+                response = self.client().chat.completions.create(
+                    model=model,
+                    messages=[{"role": "user", "content": prompt}],
+                    response_model=response_model,
+                )
+            except RateLimitError as e:
+                requeues += 1
+                if requeues > DEFAULT_MAX_REQUEUES:
+                    raise RateLimited(f"{model}: {e}") from e
+                continue
+            limiter.on_success(sum(response_usage(response) or ()))
+            return response
+
+    async def acreate(self, model, prompt, response_model):
+        """One attempt; a 429 raises RateLimited for call_with_retries to
+        requeue once the limiter lets it through again. Only the request
+        counts against call_with_retries' timeout, not the wait for the
+        limiter."""
+        limiter = self.limiter(model)
+        await untimed(limiter.aacquire(request_tokens(prompt)))
+        try:
+            response = await self.aclient().chat.completions.create(
+                model=model,
+                messages=[{"role": "user", "content": prompt}],
+                response_model=response_model,
+            )
+        except RateLimitError as e:
+            raise RateLimited(f"{model}: {e}") from e
+        limiter.on_success(sum(response_usage(response) or ()))
+        return response
+
+
+_default_gateway = None
+
+
+def get_llm_gateway():
+    # one shared gateway per process, created lazily so importing is free
+    global _default_gateway
+    if _default_gateway is None:
+        _default_gateway = LLMGateway()
+    return _default_gateway
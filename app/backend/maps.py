@@ -1,5 +1,13 @@
+import json
+import os
+
 import folium
-from branca.element import Element
+import numpy as np
+import pandas as pd
+from branca.element import Element, MacroElement
+from jinja2 import Template
+
+from app.backend.spatial import center_of
 
 colors = {
     "Marriott International": "#B71234",
@@ -25,7 +33,14 @@ colors = {
 
 
 def get_brand_colors_mapping(hotel_df):
-    return hotel_df["brand"].apply(lambda x: colors[x])
+    # brands without a color of their own (Best Western, Airbnb...) are drawn
+    # like independents
+    return (
+        hotel_df["brand"]
+        .fillna("Independent")
+        .map(colors)
+        .fillna(colors["Independent"])
+    )
 
 
 # Function to add a legend to the map
@@ -55,56 +70,282 @@ def add_legend(map_obj, title, colors, labels):
     map_obj.get_root().html.add_child(legend_element)
 
 
-def get_map(hotel_df):
-    # Prepare the legend labels (brands) and colors
-    legend_labels = hotel_df["brand"].unique().tolist()
-    legend_colors = colors  # The custom color palette
+# above this many hotels in view, "auto" mode draws clusters instead
+DEFAULT_MAX_MARKERS = int(os.getenv("MAP_MAX_MARKERS", "2000"))
+# clusters are square screen cells of this many pixels at the current zoom
+DEFAULT_CLUSTER_PX = 64
+DEFAULT_ZOOM = 15
+# Times Square, for when there are no hotels to center on
+DEFAULT_CENTER = (40.7580, -73.9855)
+
 
+def map_center(hotel_df):
+    located = hotel_df.dropna(subset=["latitude", "longitude"])
+    if located.empty:
+        return list(DEFAULT_CENTER)
+    return list(center_of(located["latitude"], located["longitude"]))
+
+
+def room_count_radius(total_num_of_rooms):
+    # normalize the number of rooms to a marker radius from 1-10
+    low, high = total_num_of_rooms.min(), total_num_of_rooms.max()
+    if high == low:
+        return np.ones(len(total_num_of_rooms))
+    return ((total_num_of_rooms - low) / (high - low) * 9 + 1).to_numpy()
+
+
+def prepare_hotels(hotel_df):
     hotels_df = hotel_df.copy()
     # filter out hotels with total_num_of_rooms less than 0
     hotels_df = hotels_df[hotels_df["total_num_of_rooms"] > 0]
+    brand = hotels_df["brand"]
+    hotels_df["brand"] = brand.mask(brand == "").fillna("Independent")
+    if "color" not in hotels_df:
+        hotels_df["color"] = get_brand_colors_mapping(hotels_df)
+    # sized against every hotel, not just the ones in view, so markers keep
+    # their size while panning
+    hotels_df["marker_radius"] = room_count_radius(hotels_df["total_num_of_rooms"])
+    return hotels_df
+
+
+def hotel_features(hotels_df):
+    """GeoJSON points for the hotels, with the marker radius, color and popup
+    html as feature properties."""
+    popups = (
+        hotels_df["name"].astype(str)
+        + "<br>Rooms: "
+        + hotels_df["total_num_of_rooms"].astype(str)
+    )
+    return point_features(
+        hotels_df,
+        {
+            "radius": hotels_df["marker_radius"].round(2).tolist(),
+            "color": hotels_df["color"].tolist(),
+            "popup": popups.tolist(),
+        },
+    )
+
+
+def point_features(points_df, properties):
+    # 6 decimals is ~10cm, plenty for a marker and a lot less html
+    coordinates = np.round(
+        points_df[["longitude", "latitude"]].to_numpy(dtype=float), 6
+    ).tolist()
+    keys = list(properties)
+    return [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Point", "coordinates": point},
+            "properties": dict(zip(keys, values)),
+        }
+        for point, *values in zip(coordinates, *properties.values())
+    ]
+
+
+def viewport_mask(hotels_df, bounds, padding=0.25):
+    """Hotels inside the bounds dict st_folium returns, grown by `padding`
+    times the view size on every side so short pans don't show empty edges."""
+    south_west = bounds.get("_southWest") or {}
+    north_east = bounds.get("_northEast") or {}
+    south, west = south_west.get("lat"), south_west.get("lng")
+    north, east = north_east.get("lat"), north_east.get("lng")
+    if None in (south, west, north, east):
+        return np.ones(len(hotels_df), dtype=bool)
+    pad_lat, pad_lon = (north - south) * padding, (east - west) * padding
+    return hotels_df["latitude"].between(south - pad_lat, north + pad_lat) & hotels_df[
+        "longitude"
+    ].between(west - pad_lon, east + pad_lon)
+
+
+def grid_cells(latitude, longitude, zoom, cell_px=DEFAULT_CLUSTER_PX):
+    # web mercator pixel position at this zoom, bucketed into cell_px squares.
+    # With a power of two cell_px these are the quadkey tiles
+    # log2(256 / cell_px) levels below the zoom
+    scale = 256 * 2 ** int(zoom) / cell_px
+    lat = np.radians(np.clip(latitude, -85.05112878, 85.05112878))
+    x = (np.asarray(longitude) + 180) / 360 * scale
+    y = (1 - np.log(np.tan(lat) + 1 / np.cos(lat)) / np.pi) / 2 * scale
+    return (np.floor(x).astype(np.int64) << 32) + np.floor(y).astype(np.int64)
+
+
+def cluster_hotels(hotels_df, zoom, cell_px=DEFAULT_CLUSTER_PX):
+    """One row per occupied grid cell: mean position, hotel and room counts,
+    and the room total of every brand in it (`rooms_by_brand`)."""
+    cells = grid_cells(hotels_df["latitude"], hotels_df["longitude"], zoom, cell_px)
+    hotels_df = hotels_df.assign(cell=cells)
+    clusters = hotels_df.groupby("cell").agg(
+        latitude=("latitude", "mean"),
+        longitude=("longitude", "mean"),
+        num_hotels=("latitude", "size"),
+        total_num_of_rooms=("total_num_of_rooms", "sum"),
+    )
+    brand_rooms = hotels_df.pivot_table(
+        index="cell",
+        columns="brand",
+        values="total_num_of_rooms",
+        aggfunc="sum",
+        fill_value=0,
+    )
+    # the cluster takes the color of the brand with the most rooms in it
+    clusters["color"] = (
+        brand_rooms.idxmax(axis=1).map(colors).fillna(colors["Independent"])
+    )
+    by_brand = brand_rooms.stack()
+    by_brand = by_brand[by_brand > 0].sort_values(ascending=False)
+    clusters["rooms_by_brand"] = pd.Series(
+        {
+            cell: rooms.droplevel("cell").to_dict()
+            for cell, rooms in by_brand.groupby(level="cell")
+        },
+        dtype=object,
+    )
+    return clusters
 
-    # normalize the number of rooms in a new col from 0-10
-    hotels_df["total_num_of_rooms_normalized"] = (
-        hotels_df["total_num_of_rooms"] - hotels_df["total_num_of_rooms"].min()
-    ) / (
-        hotels_df["total_num_of_rooms"].max() - hotels_df["total_num_of_rooms"].min()
-    ) * 9 + 1
 
-    # Times Square coordinates
-    times_square_lat, times_square_lon = 40.7580, -73.9855
-    # Create a map centered at Times Square
+def cluster_features(hotels_df, zoom, cell_px=DEFAULT_CLUSTER_PX):
+    """Hotels alone in their cell as their own marker, the rest as one
+    cluster marker per cell labelled with its hotel count, whose popup lists
+    the room totals by brand."""
+    cells = grid_cells(hotels_df["latitude"], hotels_df["longitude"], zoom, cell_px)
+    alone = ~pd.Series(cells).duplicated(keep=False).to_numpy()
+    clusters = cluster_hotels(hotels_df[~alone], zoom, cell_px)
+    popups = [
+        f"<b>{num_hotels} hotels, {rooms} rooms</b><br>"
+        + "<br>".join(f"{brand}: {n}" for brand, n in by_brand.items())
+        for num_hotels, rooms, by_brand in zip(
+            clusters["num_hotels"],
+            clusters["total_num_of_rooms"],
+            clusters["rooms_by_brand"],
+        )
+    ]
+    cluster_points = point_features(
+        clusters,
+        {
+            "radius": (12 + 4 * np.log2(clusters["num_hotels"])).round(1).tolist(),
+            "color": clusters["color"].tolist(),
+            "popup": popups,
+            "label": clusters["num_hotels"].astype(str).tolist(),
+            "fillOpacity": [0.6] * len(clusters),
+        },
+    )
+    return hotel_features(hotels_df[alone]) + cluster_points
+
+
+class RawScript(Element):
+    # branca wraps rendered scripts in Element(), which compiles them as jinja
+    # templates; with the data inlined that is most of the render time
+    def __init__(self, script):
+        super().__init__()
+        self.script = script
+
+    def render(self, **kwargs):
+        return self.script
+
+
+class HotelLayer(MacroElement):
+    """All hotels as one L.geoJson layer of circle markers, styled in the
+    browser from each feature's properties. Renders the same markers and
+    popups as one folium.CircleMarker per hotel, without a JS variable and
+    a Popup element per point."""
+
+    _template = Template(
+        """
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = L.geoJson({{ this.data }}, {
+            pointToLayer: function (feature, latlng) {
+                return L.circleMarker(latlng, {
+                    radius: feature.properties.radius,
+                    color: feature.properties.color,
+                    fill: true,
+                    fillOpacity: feature.properties.fillOpacity || 0.2,
+                });
+            },
+            onEachFeature: function (feature, layer) {
+                layer.bindPopup(feature.properties.popup, {maxWidth: "100%"});
+                if (feature.properties.label) {
+                    layer.bindTooltip(feature.properties.label, {
+                        permanent: true, direction: "center", opacity: 0.9,
+                    });
+                }
+            },
+        }).addTo({{ this._parent.get_name() }});
+        {% endmacro %}
+        """
+    )
+
+    def __init__(self, features):
+        super().__init__()
+        self._name = "HotelLayer"
+        feature_collection = {"type": "FeatureCollection", "features": features}
+        # keep a hotel name containing "</script>" from closing the tag
+        self.data = json.dumps(feature_collection, separators=(",", ":")).replace(
+            "</", "<\\/"
+        )
+
+    def render(self, **kwargs):
+        script = self._template.module.script(self, kwargs)
+        self.get_root().script.add_child(RawScript(script), name=self.get_name())
+
+
+def add_hotel_layer(map_obj, hotels_df):
+    """Add circle markers sized by room count and colored by brand. Expects
+    `color` and `total_num_of_rooms` columns."""
+    radius = room_count_radius(hotels_df["total_num_of_rooms"])
+    features = hotel_features(hotels_df.assign(marker_radius=radius))
+    HotelLayer(features).add_to(map_obj)
+    return radius
+
+
+def get_hotel_layer(
+    hotel_df,
+    bounds=None,
+    zoom=DEFAULT_ZOOM,
+    mode="auto",
+    max_markers=DEFAULT_MAX_MARKERS,
+    cluster_px=DEFAULT_CLUSTER_PX,
+):
+    """A FeatureGroup with the hotels in view.
+
+    `bounds` and `zoom` are what st_folium returned for the current view;
+    without bounds every hotel is drawn. mode is "markers", "clusters", or
+    "auto" to cluster only when more than `max_markers` hotels are in view.
+    Pass the group to st_folium's feature_group_to_add so panning swaps the
+    layer instead of reloading the map."""
+    hotels_df = prepare_hotels(hotel_df)
+    if bounds:
+        hotels_df = hotels_df[viewport_mask(hotels_df, bounds)]
+    if mode == "clusters" or (mode == "auto" and len(hotels_df) > max_markers):
+        features = cluster_features(hotels_df, zoom or DEFAULT_ZOOM, cluster_px)
+    else:
+        features = hotel_features(hotels_df)
+    group = folium.FeatureGroup(name="Hotels")
+    HotelLayer(features).add_to(group)
+    return group
+
+
+def get_base_map(hotel_df, zoom=DEFAULT_ZOOM):
+    # Prepare the legend labels (brands) and colors
+    legend_labels = hotel_df["brand"].unique().tolist()
+    legend_colors = colors  # The custom color palette
+
+    # Create a map centered on the hotels
     map_ts_hotels = folium.Map(
-        location=[times_square_lat, times_square_lon],
-        zoom_start=15,
+        location=map_center(hotel_df),
+        zoom_start=zoom,
         tiles="CartoDB positron",
     )
 
     # Define a color scale for the number of rooms. More rooms => darker color
-    color_scale = folium.LinearColormap(
-        ["green", "yellow", "red"],
-        vmin=hotels_df["total_num_of_rooms_normalized"].min(),
-        vmax=hotels_df["total_num_of_rooms_normalized"].max(),
-    )
-
-    # Add hotel markers to the map
-    for idx, row in hotels_df.iterrows():
-        # Marker size based on the number of rooms
-        marker_size = row[
-            "total_num_of_rooms_normalized"
-        ]  # Scale factor to adjust sizes visually
-
-        # Create a circle marker for each hotel
-        folium.CircleMarker(
-            location=[row["latitude"], row["longitude"]],
-            radius=marker_size,
-            popup=f"{row['name']}<br>Rooms: {row['total_num_of_rooms']}",
-            color=row["color"],
-            fill=True,
-        ).add_to(map_ts_hotels)
+    color_scale = folium.LinearColormap(["green", "yellow", "red"], vmin=1, vmax=10)
 
     # Adding the color scale to the map
     color_scale.add_to(map_ts_hotels)
     add_legend(map_ts_hotels, "Hotel Brands", legend_colors, legend_labels)
+    return map_ts_hotels
+
+
+def get_map(hotel_df, bounds=None, zoom=DEFAULT_ZOOM, mode="auto"):
+    map_ts_hotels = get_base_map(hotel_df, zoom)
+    get_hotel_layer(hotel_df, bounds, zoom, mode).add_to(map_ts_hotels)
     # Display the map
-    return map_ts_hotels
\ No newline at end of file
+    return map_ts_hotels
@@ -0,0 +1,558 @@
+"""Incremental hotel enrichment on top of the HotelRegistry.
+
+The chain is the same as before (legitimacy -> details -> combine), but a
+stage only runs for properties whose stage fingerprint has no stored
+result. Everything else is read back from the registry and merged in.
+
+    hotel_df = fetch_listings("Hotels in Times Square New York", api_key)
+    combined_hotel_df, report = enrich_hotels(hotel_df)
+
+Details go through the DetailsCascade (cheap model first, see cascade.py),
+which is just the DETAILS_MODEL call unless LLM_DETAILS_TIERS sets tiers.
+Before that, the RoomCountResolver (see room_counts.py) answers every hotel
+whose room count and brand are already known from manual overrides, the
+Cvent scrape or an earlier answer, and its override and Cvent counts replace
+the LLM's in every details record. report["rooms"] counts where the room
+counts came from.
+
+With fused=True the legitimacy and details stages are one "enrichment"
+stage: a single HotelEnrichment call per name answers both, and names that
+aren't hotels come back without details instead of costing a second call.
+
+astream_enriched runs the same stages one hotel at a time and yields each
+hotel as soon as it is done; EnrichmentRun drives it on a background thread
+for the Streamlit app.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+import pandas as pd
+
+from app.backend.budget import Budget, BudgetExhausted, rank_listings
+from app.backend.cascade import get_details_cascade
+from app.backend.llm_async import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_TIMEOUT,
+    call_with_retries,
+    run_sync,
+)
+from app.backend.llm_batch import estimate_tokens
+from app.backend.llm_gateway import SCHEMA_TOKENS
+from app.backend.registry import fingerprint, get_hotel_registry, listing_fingerprints
+from app.backend.room_counts import get_room_count_resolver, rooms_report
+from app.backend.search import (
+    COMBINED_COLUMNS,
+    ENRICHMENT_MODEL,
+    ENRICHMENT_PROMPT,
+    LEGIT_MODEL,
+    LEGIT_PROMPT,
+    HotelEnrichment,
+    LegitHotel,
+    aget_hotel_enrichment,
+    aget_hotel_name_legitimacy,
+    classify_legitimacy,
+    concat_hotel_pages,
+    get_name_prefilter,
+    hotel_enrichment_records,
+    iter_hotel_pages,
+    merge_hotel_data,
+    parse_hotel_enrichment,
+)
+from app.backend.sweep import property_keys
+from app.backend.telemetry import Recorder, record_run, response_usage
+
+logger = logging.getLogger(__name__)
+
+# bump when a stage changes in a way its model/prompt/schema don't capture
+STAGE_VERSIONS = {
+    "legitimacy": fingerprint(
+        1, LEGIT_MODEL, LEGIT_PROMPT, LegitHotel.model_json_schema()
+    ),
+    "details": get_details_cascade().version(),
+    "enrichment": fingerprint(
+        1, ENRICHMENT_MODEL, ENRICHMENT_PROMPT, HotelEnrichment.model_json_schema()
+    ),
+}
+
+
+def fetch_listings(query, api_key, check_in_date=None, check_out_date=None):
+    # SerpAPI pages come from the on-disk response cache when fresh
+    pages = iter_hotel_pages(query, api_key, check_in_date, check_out_date)
+    return concat_hotel_pages(pages)
+
+
+def stage_fingerprints(stage, names):
+    return [fingerprint(STAGE_VERSIONS[stage], str(name).strip()) for name in names]
+
+
+def run_stage(registry, stage, keys, names, compute, report):
+    """Stored results for the keys with a matching fingerprint, `compute(names)`
+    for the rest. Results are listed in key order, None where compute failed;
+    failures are not stored, so they are retried on the next run."""
+    fingerprints = stage_fingerprints(stage, names)
+    stored = registry.stage_results(stage, keys, fingerprints)
+    misses = [i for i, key in enumerate(keys) if key not in stored]
+    computed = compute([names[i] for i in misses]) if misses else []
+
+    results = [stored.get(key) for key in keys]
+    done = []
+    for i, result in zip(misses, computed):
+        results[i] = result
+        if result is not None:
+            done.append(i)
+    if done:
+        registry.save_stage(
+            stage,
+            [keys[i] for i in done],
+            [fingerprints[i] for i in done],
+            [results[i] for i in done],
+        )
+    report[stage] = {
+        "total": len(keys),
+        "hits": len(stored),
+        "misses": len(misses),
+        "failed": len(misses) - len(done),
+    }
+    return results
+
+
+def register_listings(registry, hotel_df, report):
+    keys = hotel_df["property_key"].to_list()
+    fingerprints = listing_fingerprints(hotel_df)
+    stored = registry.listing_fingerprints(keys)
+    changed = [i for i, key in enumerate(keys) if stored.get(key) != fingerprints[i]]
+    if changed:
+        records = hotel_df.iloc[changed].to_dict(orient="records")
+        registry.save_listings(
+            [keys[i] for i in changed], [fingerprints[i] for i in changed], records
+        )
+    report["listings"] = {
+        "total": len(keys),
+        "hits": len(keys) - len(changed),
+        "misses": len(changed),
+        "new": sum(key not in stored for key in keys),
+    }
+
+
+def enrich_hotels(
+    hotel_df,
+    registry=None,
+    concurrency=DEFAULT_CONCURRENCY,
+    batched=False,
+    prefilter=True,
+    fuzzy_threshold=None,
+    fused=False,
+):
+    """Run the listings through legitimacy, details and combine, reusing every
+    stored stage result whose inputs haven't changed. With fused=True the
+    first two are the single "enrichment" stage.
+
+    Returns (combined_hotel_df, report) where report is
+    {stage: {"total", "hits", "misses", ...}}."""
+    if registry is None:
+        registry = get_hotel_registry()
+    report = {}
+    hotel_df = keyed_listings(hotel_df)
+    register_listings(registry, hotel_df, report)
+
+    keys = hotel_df["property_key"].to_list()
+    names = hotel_df["name"].to_list()
+    if fused:
+        enriched = run_stage(
+            registry,
+            "enrichment",
+            keys,
+            names,
+            lambda misses: hotel_enrichment_records(misses, concurrency, prefilter),
+            report,
+        )
+        is_legit_name = [result and result["is_legit_name"] for result in enriched]
+    else:
+
+        def classify(misses):
+            return classify_legitimacy(misses, concurrency, batched, prefilter)[0]
+
+        is_legit_name = run_stage(
+            registry,
+            "legitimacy",
+            keys,
+            names,
+            classify,
+            report,
+        )
+    legit_hotel_df = hotel_df.assign(is_legit_name=is_legit_name)
+    legit_hotel_df = legit_hotel_df[legit_hotel_df["is_legit_name"] == True]
+
+    resolver = get_room_count_resolver()
+    if fused:
+        # non-hotels came back without details, there is no second call
+        details = [result and result["details"] for result in enriched]
+        details_names = names
+    else:
+        details_names = legit_hotel_df["name"].to_list()
+
+        def fetch(misses):
+            return get_details_cascade().details_records(misses, concurrency)
+
+        details = run_stage(
+            registry,
+            "details",
+            legit_hotel_df["property_key"].to_list(),
+            details_names,
+            lambda misses: resolver.details_records(misses, fetch),
+            report,
+        )
+    details = resolver.overlay(details, details_names)
+    report["rooms"] = rooms_report(details)
+    hotel_details_df = pd.DataFrame([record for record in details if record])
+    combined_hotel_df = combine_enriched(
+        legit_hotel_df, hotel_details_df, fuzzy_threshold
+    )
+    report["combine"] = {"total": len(combined_hotel_df)}
+    return combined_hotel_df, report
+
+
+def keyed_listings(hotel_df):
+    hotel_df = hotel_df.assign(property_key=property_keys(hotel_df))
+    # the same property can show up on several result pages
+    return hotel_df.drop_duplicates(subset=["property_key"], ignore_index=True)
+
+
+def combine_enriched(legit_hotel_df, hotel_details_df, fuzzy_threshold=None):
+    # merge_hotel_data rather than the st.cache_data wrapper, the streaming
+    # snapshots change on every rerun and would only fill the cache
+    if hotel_details_df.empty:
+        return pd.DataFrame(columns=COMBINED_COLUMNS)
+    return merge_hotel_data(legit_hotel_df, hotel_details_df, fuzzy_threshold).dropna(
+        subset=["latitude", "longitude", "name"]
+    )
+
+
+async def astream_enriched(
+    hotel_df,
+    registry=None,
+    concurrency=DEFAULT_CONCURRENCY,
+    timeout=DEFAULT_TIMEOUT,
+    max_retries=DEFAULT_MAX_RETRIES,
+    prefilter=True,
+    budget=None,
+    report=None,
+    fused=False,
+):
+    """Yield (listing record, details record) for every legit hotel as soon as
+    both stages are done for it. Hotels with stored results come out first,
+    without waiting on any LLM call. Stage results are written to the
+    registry per hotel, and `report` is updated as the stream goes.
+
+    With a Budget, hotels are queued in rank_listings order and every LLM
+    call is charged to it; once it runs out the remaining hotels are
+    skipped and the stream ends. report["coverage"] counts the hotels that
+    made it through every stage they need. With fused=True one enrichment
+    call per hotel stands in for the legitimacy and details calls."""
+    if registry is None:
+        registry = get_hotel_registry()
+    if report is None:
+        report = {}
+    hotel_df = keyed_listings(hotel_df)
+    if budget is not None:
+        hotel_df = rank_listings(hotel_df).reset_index(drop=True)
+        budget.start()
+    register_listings(registry, hotel_df, report)
+    keys = hotel_df["property_key"].to_list()
+    names = hotel_df["name"].to_list()
+    records = hotel_df.to_dict(orient="records")
+    stages = ("enrichment",) if fused else ("legitimacy", "details")
+    fingerprints = {stage: stage_fingerprints(stage, names) for stage in stages}
+    stored = {
+        stage: registry.stage_results(stage, keys, fingerprints[stage])
+        for stage in fingerprints
+    }
+    if prefilter:
+        decisions, _ = get_name_prefilter().decide_many(names)
+    else:
+        decisions = [None] * len(names)
+    for stage in fingerprints:
+        report[stage] = {"total": 0, "hits": 0, "misses": 0, "failed": 0, "skipped": 0}
+    report[stages[0]]["total"] = len(keys)
+    report["coverage"] = {"total": len(keys), "completed": 0, "skipped": 0}
+    report["rooms"] = rooms_report()
+    resolver = get_room_count_resolver()
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def stage_result(stage, i, call):
+        counts = report[stage]
+        if keys[i] in stored[stage]:
+            counts["hits"] += 1
+            return stored[stage][keys[i]]
+        counts["misses"] += 1
+        try:
+            result = await call()
+        except BudgetExhausted:
+            counts["skipped"] += 1
+            return None
+        except Exception as e:
+            logger.warning(f"Error processing {names[i]}: {e}", exc_info=True)
+            counts["failed"] += 1
+            return None
+        registry.save_stage(stage, [keys[i]], [fingerprints[stage][i]], [result])
+        return result
+
+    async def ask(func, model, prompt, name):
+        async with semaphore:
+            if budget is None:
+                return await call_with_retries(
+                    func, name, timeout=timeout, max_retries=max_retries
+                )
+            prompt_tokens = estimate_tokens(prompt.format(hotel_name=name))
+            reservation = budget.reserve(model, prompt_tokens + SCHEMA_TOKENS)
+            if reservation is None:
+                raise BudgetExhausted(budget.exhausted)
+            # calls still running at the deadline are cut off, not retried
+            remaining = max(0, budget.remaining_seconds())
+            try:
+                response = await call_with_retries(
+                    func,
+                    name,
+                    timeout=min(timeout, remaining),
+                    max_retries=max_retries if remaining > timeout else 0,
+                )
+            except Exception:
+                budget.settle(reservation, model)
+                if budget.remaining_seconds() <= 0:
+                    budget.exhausted = budget.exhausted or "seconds"
+                    raise BudgetExhausted(budget.exhausted)
+                raise
+            usage = response_usage(response)
+            if usage is None:
+                budget.release(reservation)
+            else:
+                budget.settle(reservation, model, usage)
+            return response
+
+    async def legitimacy(i):
+        if decisions[i] is not None:
+            return decisions[i]
+        answer = await ask(
+            aget_hotel_name_legitimacy, LEGIT_MODEL, LEGIT_PROMPT, names[i]
+        )
+        return answer.is_legit_name
+
+    async def details(i):
+        (entry,) = resolver.lookup_many([names[i]])
+        record = resolver.local_record(names[i], entry)
+        if record is None:
+            # each tier the cascade tries is a call of its own against the budget
+            record = await get_details_cascade().adetails_record(names[i], ask)
+            resolver.remember([names[i]], [record])
+        return record
+
+    async def enrichment(i):
+        if decisions[i] is False:
+            return {"is_legit_name": False, "details": None}
+        answer = await ask(
+            aget_hotel_enrichment, ENRICHMENT_MODEL, ENRICHMENT_PROMPT, names[i]
+        )
+        return parse_hotel_enrichment(answer, decisions[i])
+
+    async def enrich(i):
+        if fused:
+            result = await stage_result("enrichment", i, lambda: enrichment(i))
+            if result is None:
+                return None
+            is_legit_name = result["is_legit_name"]
+        else:
+            is_legit_name = await stage_result("legitimacy", i, lambda: legitimacy(i))
+            if is_legit_name is None:
+                return None
+        if is_legit_name is not True:
+            report["coverage"]["completed"] += 1
+            return None
+        if fused:
+            record = result["details"]
+        else:
+            report["details"]["total"] += 1
+            record = await stage_result("details", i, lambda: details(i))
+        if record is None:
+            return None
+        (record,) = resolver.overlay([record], [names[i]])
+        report["rooms"]["total"] += 1
+        report["rooms"][record["rooms_source"]] += 1
+        report["coverage"]["completed"] += 1
+        return records[i], record
+
+    tasks = [asyncio.ensure_future(enrich(i)) for i in range(len(keys))]
+    try:
+        for task in asyncio.as_completed(tasks):
+            result = await task
+            if result is not None:
+                yield result
+    finally:
+        for task in tasks:
+            task.cancel()
+        report["coverage"]["skipped"] = sum(
+            report[stage]["skipped"] for stage in stages
+        )
+
+
+def coverage(report):
+    # share of the candidate listings that made it through every stage
+    counts = report.get("coverage", {})
+    return counts.get("completed", 0) / counts["total"] if counts.get("total") else 0.0
+
+
+class EnrichmentRun:
+    """Runs astream_enriched on a background thread and collects its rows.
+
+    The thread outlives Streamlit reruns as long as the run object is kept
+    around (e.g. in st.session_state); each rerun just reads snapshot()."""
+
+    def __init__(
+        self,
+        hotel_df,
+        registry=None,
+        concurrency=DEFAULT_CONCURRENCY,
+        prefilter=True,
+        budget=None,
+        recorder=None,
+        fused=False,
+    ):
+        self.hotel_df = hotel_df
+        self.registry = registry
+        self.concurrency = concurrency
+        self.prefilter = prefilter
+        self.budget = budget
+        self.fused = fused
+        # telemetry spans of the run, see recorder.summary()
+        self.recorder = recorder or Recorder()
+        self.report = {}
+        self.listings = []
+        self.details = []
+        self.error = None
+        self.started_at = None
+        self.first_result_at = None
+        self.finished_at = None
+        self._lock = threading.Lock()
+        self._loop = None
+        self._task = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            with record_run(recorder=self.recorder):
+                run_sync(self._consume())
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.exception("Enrichment run failed")
+            self.error = e
+        finally:
+            self.finished_at = time.monotonic()
+
+    async def _consume(self):
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        stream = astream_enriched(
+            self.hotel_df,
+            self.registry,
+            concurrency=self.concurrency,
+            prefilter=self.prefilter,
+            budget=self.budget,
+            report=self.report,
+            fused=self.fused,
+        )
+        async for listing, details in stream:
+            with self._lock:
+                if self.first_result_at is None:
+                    self.first_result_at = time.monotonic()
+                self.listings.append(listing)
+                self.details.append(details)
+
+    def stop(self):
+        # cancels the stream; calls in flight are abandoned, finished ones
+        # are already in the registry
+        if self._task is not None and not self.done:
+            self._loop.call_soon_threadsafe(self._task.cancel)
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+        return self
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    def with_budget(self, **limits):
+        """This run under new Budget limits: changed in place while the budget
+        still holds, otherwise a fresh run over the same listings, since the
+        hotels skipped once it ran out are gone from this one. Hotels already
+        enriched come back from the registry without new LLM calls."""
+        budget = Budget(**limits)
+        if self.budget is not None and self.budget.limits == budget.limits:
+            return self
+        if self.budget is not None and self.budget.exhausted is None:
+            self.budget.set_limits(**limits)
+            return self
+        self.stop()
+        run = EnrichmentRun(
+            self.hotel_df,
+            self.registry,
+            concurrency=self.concurrency,
+            prefilter=self.prefilter,
+            budget=budget,
+            recorder=self.recorder,
+            fused=self.fused,
+        )
+        return run.start()
+
+    def time_to_first_result(self):
+        if self.first_result_at is None:
+            return None
+        return self.first_result_at - self.started_at
+
+    def snapshot(self):
+        """The combined frame for the hotels finished so far. The stream pairs
+        every listing with its own details already, so the rows are put side
+        by side rather than joined on name, which would fold listings that
+        share a name into one."""
+        with self._lock:
+            listings = pd.DataFrame(self.listings)
+            details = pd.DataFrame(self.details)
+        if listings.empty:
+            return pd.DataFrame(columns=COMBINED_COLUMNS)
+        combined = pd.concat(
+            [
+                listings[["name", "latitude", "longitude", "link", "hotel_class"]],
+                details[["brand", "subbrand", "total_num_of_rooms"]],
+            ],
+            axis=1,
+        )
+        return combined.rename(
+            columns={"hotel_class": "star_rating", "subbrand": "scale"}
+        )[COMBINED_COLUMNS].dropna(subset=["latitude", "longitude", "name"])
+
+
+def run_enrichment(hotel_df, budget=None, **kwargs):
+    """Blocking EnrichmentRun for scripts and notebooks: every listing, in
+    priority order when there is a budget. Returns (combined_hotel_df,
+    report); see coverage(report) for how much of the market was covered."""
+    run = EnrichmentRun(hotel_df, budget=budget, **kwargs).start().join()
+    if run.error is not None:
+        raise run.error
+    return run.snapshot(), run.report
+
+
+def format_report(report):
+    # one row per stage, for st.dataframe or printing; copied first, a
+    # running stream may still be updating the counts
+    report = {stage: dict(counts) for stage, counts in list(report.items())}
+    return pd.DataFrame.from_dict(report, orient="index").astype("Int64")
@@ -0,0 +1,223 @@
+"""Deterministic pre-filter for the hotel name legitimacy check.
+
+Obvious listing blurbs ("Located In Midtown! Trendy Bars, Pet-friendly...")
+and obviously branded hotels ("Hilton Garden Inn Times Square") are decided
+locally. Only the names in between are sent to the LLM.
+
+Brand and marketing phrases are matched in a single pass per name with an
+Aho-Corasick automaton built from the brand catalog in `gpt4_prompt`.
+"""
+
+import re
+from collections import deque
+
+LEVELS = ("Luxury", "Premium", "Midscale", "Economy")
+LEVEL_LINE = re.compile(rf"^\s*({'|'.join(LEVELS)})\s*:(.*)$")
+BRAND_HEADER = re.compile(r"^\s*\d+\.\s*(.+?)\s*$")
+
+SUBBRAND_SUFFIX = re.compile(
+    r"\s+(?:hotels?(?: (?:&|and) resorts)?(?: (?:&|and) \w+)?|resorts|by \w+(?: \w+)?)$"
+)
+
+# sub-brands that are ordinary words too; on their own they say nothing
+AMBIGUOUS_SUBBRANDS = {
+    "avid",
+    "caption",
+    "delta",
+    "element",
+    "tempo",
+    "edition",
+    "tribe",
+    "greet",
+    "peppers",
+    "palette",
+    "sadie",
+    "aiden",
+    "mantra",
+    "adagio",
+    "art series",
+    "destination hotels",
+    "collection o",
+    "capital o",
+    "oyo home",
+    "oyo life",
+}
+
+MARKETING_PHRASES = (
+    "located in",
+    "close to",
+    "near ",
+    "steps to",
+    "steps from",
+    "walk to",
+    "walking distance",
+    "minutes to",
+    "min to",
+    "pet-friendly",
+    "pet friendly",
+    "onsite dining",
+    "on-site dining",
+    "trendy",
+    "spacious",
+    "cozy",
+    "cosy",
+    "in the heart of",
+    "a trip to",
+    "vibrant",
+    "private room",
+    "entire",
+    "bedroom",
+    "studio apartment",
+    "apartment",
+    "apt",
+    "sleeps",
+    "amazing",
+    "stunning",
+    "beautiful",
+    "w/",
+    "free parking",
+    "free wifi",
+    "perfect for",
+    "great location",
+)
+
+# a name scoring at least this many marketing points is treated as a blurb
+BLURB_SCORE = 3
+
+
+class AhoCorasick:
+    def __init__(self, patterns):
+        # patterns: {lowercase phrase: payload}
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [()]
+        for phrase, payload in patterns.items():
+            state = 0
+            for char in phrase:
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto[state][char] = next_state
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append(())
+                state = next_state
+            self.output[state] += ((len(phrase), payload),)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                if self.fail[next_state] == next_state:
+                    self.fail[next_state] = 0
+                self.output[next_state] += self.output[self.fail[next_state]]
+
+    def find(self, text):
+        """Yield (start, end, payload) for every pattern occurrence in text."""
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for end, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, payload in output[state]:
+                yield end - length, end, payload
+
+
+def parse_brand_catalog(prompt, brands):
+    """Read {sub-brand phrase: (brand, level)} from the numbered brand lists in
+    `gpt4_prompt`. `brands` is the HotelBrand enum; list headers are mapped to
+    it by their first word."""
+    by_first_word = {brand.value.split()[0].lower(): brand for brand in brands}
+    catalog = {}
+    brand, level = None, None
+    for line in prompt.splitlines():
+        header = BRAND_HEADER.match(line)
+        if header:
+            brand = by_first_word.get(header.group(1).split()[0].lower())
+            level = None
+            continue
+        level_line = LEVEL_LINE.match(line)
+        if level_line:
+            level, names = level_line.groups()
+        elif level is not None and line.strip():
+            # wrapped continuation of the previous level's list
+            names = line
+        else:
+            continue
+        if brand is None:
+            continue
+        for name in names.split(","):
+            name = name.strip().lower()
+            if not name or name == "n/a":
+                continue
+            # properties drop the suffix: "Moxy NYC", "Hampton Inn Manhattan"
+            short_name = SUBBRAND_SUFFIX.sub("", name)
+            for phrase in {name, short_name}:
+                if len(phrase) >= 4 and phrase not in AMBIGUOUS_SUBBRANDS:
+                    catalog.setdefault(phrase, (brand, level))
+    return catalog
+
+
+class NamePrefilter:
+    def __init__(self, catalog, brands):
+        patterns = {phrase: ("subbrand", value) for phrase, value in catalog.items()}
+        for brand in brands:
+            # parent brand names, e.g. "hilton", "best western"
+            short_name = re.sub(r"(?<=[a-z])(?=[A-Z])", " ", brand.name).lower()
+            if short_name not in ("independent", "airbnb", "choice", "accor"):
+                patterns.setdefault(short_name, ("brand", (brand, None)))
+        for phrase in MARKETING_PHRASES:
+            patterns.setdefault(phrase, ("marketing", None))
+        self.automaton = AhoCorasick(patterns)
+
+    def scan(self, hotel_name):
+        """Return (best brand match as (brand, level) or None, marketing score)."""
+        text = hotel_name.lower()
+        best, best_length, score = None, 0, 0
+        for start, end, (kind, value) in self.automaton.find(text):
+            # phrases must sit on word boundaries ("w hotels" in "new hotels"),
+            # give or take a plural "s" ("apartment" in "conrad apartments")
+            if text[start].isalnum() and start > 0 and text[start - 1].isalnum():
+                continue
+            if text[end - 1].isalnum() and text[end : end + 1] == "s":
+                end += 1
+            if text[end - 1].isalnum() and end < len(text) and text[end].isalnum():
+                continue
+            if kind == "marketing":
+                score += 1
+                continue
+            # prefer the longest (most specific) phrase, and sub-brands to parents
+            length = end - start + (1000 if kind == "subbrand" else 0)
+            if length > best_length:
+                best, best_length = value, length
+        score += 2 * hotel_name.count("!") + (hotel_name.count(",") >= 2)
+        score += len(hotel_name) > 70
+        return best, score
+
+    def decide(self, hotel_name):
+        """True/False when the name can be decided locally, None otherwise."""
+        if not isinstance(hotel_name, str) or not hotel_name.strip():
+            return False
+        brand, score = self.scan(hotel_name)
+        if score >= BLURB_SCORE:
+            return False
+        if brand is not None and score == 0:
+            return True
+        return None
+
+    def decide_many(self, hotel_names):
+        decisions = [self.decide(name) for name in hotel_names]
+        stats = {
+            "total": len(decisions),
+            "legit": sum(d is True for d in decisions),
+            "not_legit": sum(d is False for d in decisions),
+        }
+        stats["short_circuited"] = stats["legit"] + stats["not_legit"]
+        stats["sent_to_llm"] = stats["total"] - stats["short_circuited"]
+        return decisions, stats
@@ -0,0 +1,236 @@
+"""Client-side rate limiting for the external APIs.
+
+TokenBucket is a fixed rate. AdaptiveLimiter paces one upstream quota (an
+OpenAI model, the SerpAPI key) AIMD-style: it runs at a share of the
+quota's per-minute ceilings, every success adds a little of the share back
+and every rate-limited response halves it (at most once per cooldown, a
+burst of 429s is one signal) and pauses all callers for the server's
+retry-after. Ceilings come from configuration or from the x-ratelimit-*
+response headers; until one is known calls are not paced. A rejected call
+raises RateLimited and is requeued by its caller instead of failing.
+"""
+
+import asyncio
+import collections
+import math
+import os
+import re
+import threading
+import time
+
+# times one call may be rejected with a rate limit before it counts as failed
+DEFAULT_MAX_REQUEUES = int(os.getenv("RATE_LIMIT_MAX_REQUEUES", "50"))
+# pause after a 429 that came without a retry-after header
+DEFAULT_PAUSE = 1.0
+DURATION_PATTERN = re.compile(r"([\d.]+)(ms|s|m|h)")
+DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+class RateLimited(RuntimeError):
+    """The upstream rejected the call for rate, not for the call itself.
+    `delay` is how long the caller should still wait before requeueing it
+    (0 when a limiter already paces the next try)."""
+
+    def __init__(self, message, delay=0.0):
+        super().__init__(message)
+        self.delay = delay
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to
+    `capacity`. acquire() blocks until enough tokens are available,
+    aacquire() awaits them without blocking the event loop."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated_at) * self.rate
+        )
+        self.updated_at = now
+
+    def set_rate(self, rate, capacity=None):
+        with self.lock:
+            self._refill()
+            self.rate = rate
+            self.capacity = capacity if capacity is not None else max(1.0, rate)
+            self.tokens = min(self.tokens, self.capacity)
+
+    def try_acquire(self, tokens=1):
+        with self.lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return True
+            return False
+
+    def refund(self, tokens=1):
+        with self.lock:
+            self.tokens = min(self.capacity, self.tokens + tokens)
+
+    def wait_time(self, tokens=1):
+        """Take the tokens and return 0, or return the seconds until they
+        could be there. A request larger than the bucket takes it whole."""
+        with self.lock:
+            self._refill()
+            tokens = min(tokens, self.capacity)
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+    def acquire(self, tokens=1):
+        while wait := self.wait_time(tokens):
+            time.sleep(wait)
+
+    async def aacquire(self, tokens=1):
+        while wait := self.wait_time(tokens):
+            await asyncio.sleep(wait)
+
+
+def parse_duration(text):
+    # "1s", "6m0s", "120ms", "17.28s" -> seconds
+    return sum(
+        float(amount) * DURATION_UNITS[unit]
+        for amount, unit in DURATION_PATTERN.findall(text or "")
+    )
+
+
+def retry_after(headers):
+    if "retry-after-ms" in headers:
+        return float(headers["retry-after-ms"]) / 1000
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    def __init__(
+        self,
+        rpm=None,
+        tpm=None,
+        increase=0.02,
+        decrease=0.5,
+        min_share=0.05,
+        cooldown=1.0,
+        window=60.0,
+    ):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.increase = increase
+        self.decrease = decrease
+        self.min_share = min_share
+        self.cooldown = cooldown
+        self.window = window
+        self.share = 1.0
+        self.paused_until = 0.0
+        self.last_decrease = -math.inf
+        self.rate_limited = 0
+        self.requests = None
+        self.tokens = None
+        # (time, tokens) of the calls that succeeded within the window
+        self.calls = collections.deque()
+        self.lock = threading.Lock()
+        self._apply()
+
+    def _apply(self):
+        # point the buckets at share * ceiling, per second
+        for name, ceiling in (("requests", self.rpm), ("tokens", self.tpm)):
+            if not ceiling:
+                continue
+            rate = self.share * ceiling / 60
+            bucket = getattr(self, name)
+            if bucket is None:
+                setattr(self, name, TokenBucket(rate))
+            else:
+                bucket.set_rate(rate)
+
+    def wait_time(self, tokens=1):
+        now = time.monotonic()
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.requests is not None and (wait := self.requests.wait_time(1)):
+            return wait
+        if self.tokens is not None and (wait := self.tokens.wait_time(tokens)):
+            if self.requests is not None:
+                self.requests.refund(1)
+            return wait
+        return 0.0
+
+    def acquire(self, tokens=1):
+        while wait := self.wait_time(tokens):
+            time.sleep(wait)
+
+    async def aacquire(self, tokens=1):
+        while wait := self.wait_time(tokens):
+            await asyncio.sleep(wait)
+
+    def _trim(self, now):
+        while self.calls and self.calls[0][0] < now - self.window:
+            self.calls.popleft()
+
+    def on_success(self, tokens=0):
+        now = time.monotonic()
+        with self.lock:
+            self.calls.append((now, tokens or 0))
+            self._trim(now)
+            if self.share < 1.0:
+                self.share = min(1.0, self.share + self.increase)
+                self._apply()
+
+    def on_rate_limited(self, delay=None):
+        now = time.monotonic()
+        with self.lock:
+            self.rate_limited += 1
+            pause = DEFAULT_PAUSE if delay is None else delay
+            self.paused_until = max(self.paused_until, now + pause)
+            if now - self.last_decrease < self.cooldown:
+                return
+            if not self.rpm:
+                # no ceiling known yet: start from the rate that got through
+                # lately, or only pause while there is too little to go by
+                self._trim(now)
+                if len(self.calls) < 2:
+                    return
+                span = max(1.0, now - self.calls[0][0])
+                self.rpm = len(self.calls) * 60 / span
+                self.share = 1.0
+            self.last_decrease = now
+            self.share = max(self.min_share, self.share * self.decrease)
+            self._apply()
+
+    def update_from_headers(self, headers, status=200):
+        """Learn the ceilings from x-ratelimit-* headers; pause until the
+        reset when a quota is used up; treat a 429 as a rate limit signal."""
+        with self.lock:
+            for name, attribute in (("requests", "rpm"), ("tokens", "tpm")):
+                limit = headers.get(f"x-ratelimit-limit-{name}")
+                if limit and float(limit) != getattr(self, attribute):
+                    setattr(self, attribute, float(limit))
+                    self._apply()
+                remaining = headers.get(f"x-ratelimit-remaining-{name}")
+                if remaining is not None and float(remaining) <= 0:
+                    reset = parse_duration(headers.get(f"x-ratelimit-reset-{name}"))
+                    self.paused_until = max(self.paused_until, time.monotonic() + reset)
+        if status == 429:
+            self.on_rate_limited(retry_after(headers))
+
+    def stats(self):
+        now = time.monotonic()
+        with self.lock:
+            self._trim(now)
+            return {
+                "rpm": len(self.calls) * 60 / self.window,
+                "tpm": sum(tokens for _, tokens in self.calls) * 60 / self.window,
+                "ceiling_rpm": self.rpm,
+                "ceiling_tpm": self.tpm,
+                "share": round(self.share, 3),
+                "rate_limited": self.rate_limited,
+            }
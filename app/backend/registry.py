@@ -0,0 +1,139 @@
+"""Persistent registry of hotel properties and their per-stage results.
+
+Properties are keyed by a stable identity (SerpAPI's property token, else
+normalized name + coordinates, see sweep.property_keys). Every stage stores
+its result next to a fingerprint of the inputs it used, so a later run can
+reuse the result as long as the fingerprint still matches. A renamed
+property, a changed prompt or a new model all change the fingerprint.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+from app.backend.sqlite_store import SQLiteStore
+
+DEFAULT_REGISTRY_PATH = os.getenv("HOTEL_REGISTRY_PATH", "data/hotel_registry.sqlite")
+LISTING_FIELDS = ["name", "latitude", "longitude", "link", "hotel_class"]
+# keys per "IN (...)" lookup, well under SQLite's bound parameter limit
+LOOKUP_CHUNK = 500
+
+
+def fingerprint(*parts):
+    return hashlib.sha256(
+        "\x1f".join(
+            json.dumps(part, sort_keys=True, default=str) for part in parts
+        ).encode()
+    ).hexdigest()
+
+
+def listing_fingerprints(hotel_df):
+    return [
+        fingerprint(*record)
+        for record in hotel_df[LISTING_FIELDS].itertuples(index=False, name=None)
+    ]
+
+
+class HotelRegistry(SQLiteStore):
+    schema = """
+        CREATE TABLE IF NOT EXISTS hotel_properties (
+            property_key TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            record TEXT NOT NULL,
+            first_seen REAL NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS hotel_stages (
+            property_key TEXT NOT NULL,
+            stage TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            result TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (property_key, stage)
+        );
+    """
+
+    def _lookup(self, sql, keys, *params):
+        conn = self.connect()
+        keys = list(dict.fromkeys(keys))
+        for start in range(0, len(keys), LOOKUP_CHUNK):
+            chunk = keys[start : start + LOOKUP_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            yield from conn.execute(sql.format(placeholders), (*params, *chunk))
+
+    def listing_fingerprints(self, keys):
+        # {property_key: fingerprint} for the keys already registered
+        return dict(
+            self._lookup(
+                "SELECT property_key, fingerprint FROM hotel_properties "
+                "WHERE property_key IN ({})",
+                keys,
+            )
+        )
+
+    def save_listings(self, keys, fingerprints, records):
+        now = time.time()
+        conn = self.connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                """
+                INSERT INTO hotel_properties VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (property_key) DO UPDATE SET
+                    fingerprint = excluded.fingerprint,
+                    record = excluded.record,
+                    updated_at = excluded.updated_at
+                """,
+                [
+                    (key, digest, json.dumps(record, default=str), now, now)
+                    for key, digest, record in zip(keys, fingerprints, records)
+                ],
+            )
+
+    def stage_results(self, stage, keys, fingerprints):
+        """{property_key: result} for the keys whose stored result was computed
+        from the same inputs."""
+        wanted = dict(zip(keys, fingerprints))
+        return {
+            key: json.loads(result)
+            for key, stored, result in self._lookup(
+                "SELECT property_key, fingerprint, result FROM hotel_stages "
+                "WHERE stage = ? AND property_key IN ({})",
+                keys,
+                stage,
+            )
+            if wanted[key] == stored
+        }
+
+    def save_stage(self, stage, keys, fingerprints, results):
+        now = time.time()
+        conn = self.connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT OR REPLACE INTO hotel_stages VALUES (?, ?, ?, ?, ?)",
+                [
+                    (key, stage, digest, json.dumps(result), now)
+                    for key, digest, result in zip(keys, fingerprints, results)
+                ],
+            )
+
+    def counts(self):
+        conn = self.connect()
+        (properties,) = conn.execute("SELECT COUNT(*) FROM hotel_properties").fetchone()
+        stages = dict(
+            conn.execute("SELECT stage, COUNT(*) FROM hotel_stages GROUP BY stage")
+        )
+        return {"properties": properties, **stages}
+
+
+_default_registry = None
+
+
+def get_hotel_registry():
+    # one shared registry per process, created lazily so importing is free
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = HotelRegistry(DEFAULT_REGISTRY_PATH)
+    return _default_registry
@@ -0,0 +1,307 @@
+"""Room counts from local sources, so the details LLM call is only a fallback.
+
+The RoomCountStore indexes room counts by normalized hotel name, one row
+per source. In priority order, the sources are:
+
+- override: manual corrections, a CSV of name,total_num_of_rooms (and
+  optionally brand,subbrand) at ROOM_OVERRIDES_PATH
+- cvent: the total guest rooms scrape_cvent.py wrote to
+  CVENT_ROOM_INFO_PATH
+- llm: every earlier details answer, remembered as it comes back with the
+  version of the DetailsCascade that gave it; answers from another version
+  (other tiers, prompt or thresholds) are ignored, like stale stage results
+
+Both files are re-imported whenever they change on disk. A hotel whose room
+count and brand are both known locally never reaches the LLM; the brand may
+also come from a brand or sub-brand in the name, per the catalog in
+gpt4_prompt. Every details record says where its room count came from in
+rooms_source: override, cvent, earlier_llm or llm (asked this time).
+
+    resolver = get_room_count_resolver()
+    records = resolver.details_records(names, get_details_cascade().details_records)
+    records = resolver.overlay(records, names)
+"""
+
+import logging
+import os
+import time
+from collections import Counter
+from pathlib import Path
+
+import pandas as pd
+
+from app.backend.cascade import get_details_cascade
+from app.backend.entity_resolution import normalize_name
+from app.backend.search import get_name_prefilter
+from app.backend.sqlite_store import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STORE_PATH = os.getenv("ROOM_COUNTS_PATH", "data/room_counts.sqlite")
+DEFAULT_CVENT_PATH = os.getenv("CVENT_ROOM_INFO_PATH", "data/cvent_room_info.parquet")
+DEFAULT_OVERRIDES_PATH = os.getenv("ROOM_OVERRIDES_PATH", "data/room_overrides.csv")
+SOURCES = ("override", "cvent", "llm")
+# what a stored llm row is called in rooms_source, to tell it from a new answer
+SOURCE_LABELS = {"override": "override", "cvent": "cvent", "llm": "earlier_llm"}
+# every rooms_source, in priority order
+ROOMS_SOURCES = (*SOURCE_LABELS.values(), "llm")
+# keys per "IN (...)" lookup, well under SQLite's bound parameter limit
+LOOKUP_CHUNK = 500
+
+
+class RoomCountStore(SQLiteStore):
+    schema = """
+        CREATE TABLE IF NOT EXISTS room_counts (
+            name_key TEXT NOT NULL,
+            source TEXT NOT NULL,
+            hotel TEXT NOT NULL,
+            total_num_of_rooms INTEGER,
+            brand TEXT,
+            subbrand TEXT,
+            model TEXT,
+            version TEXT,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (name_key, source)
+        );
+        CREATE TABLE IF NOT EXISTS room_count_imports (
+            source TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            mtime REAL NOT NULL
+        );
+    """
+
+    def _insert(self, conn, source, rows):
+        # rows: (hotel, total_num_of_rooms, brand, subbrand, model, version)
+        now = time.time()
+        conn.executemany(
+            "INSERT OR REPLACE INTO room_counts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (normalize_name(hotel), source, hotel, *values, now)
+                for hotel, *values in rows
+            ],
+        )
+
+    def save(self, source, rows):
+        conn = self.connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._insert(conn, source, rows)
+
+    def replace_source(self, source, path, rows):
+        """Swap every row of a file-backed source for `rows`, read from
+        `path` as it was at its current mtime."""
+        conn = self.connect()
+        mtime = Path(path).stat().st_mtime
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM room_counts WHERE source = ?", (source,))
+            self._insert(conn, source, rows)
+            conn.execute(
+                "INSERT OR REPLACE INTO room_count_imports VALUES (?, ?, ?)",
+                (source, str(path), mtime),
+            )
+
+    def imported(self, source):
+        # (path, mtime) of the last import of a file-backed source
+        return (
+            self.connect()
+            .execute(
+                "SELECT path, mtime FROM room_count_imports WHERE source = ?", (source,)
+            )
+            .fetchone()
+        )
+
+    def lookup(self, name_keys, llm_version):
+        """{name_key: {source: (total_num_of_rooms, brand, subbrand)}}, with
+        llm rows only where they were saved under `llm_version`."""
+        conn = self.connect()
+        name_keys = list(dict.fromkeys(name_keys))
+        found = {}
+        for start in range(0, len(name_keys), LOOKUP_CHUNK):
+            chunk = name_keys[start : start + LOOKUP_CHUNK]
+            rows = conn.execute(
+                "SELECT name_key, source, total_num_of_rooms, brand, subbrand "
+                "FROM room_counts WHERE name_key IN ({}) "
+                "AND (source != 'llm' OR version = ?)".format(
+                    ",".join("?" * len(chunk))
+                ),
+                [*chunk, llm_version],
+            )
+            for name_key, source, *values in rows:
+                found.setdefault(name_key, {})[source] = tuple(values)
+        return found
+
+    def counts(self):
+        return dict(
+            self.connect().execute(
+                "SELECT source, COUNT(*) FROM room_counts GROUP BY source"
+            )
+        )
+
+
+def read_cvent_rows(path):
+    room_info = pd.read_parquet(path, columns=["hotel", "total_num_rooms"])
+    room_info = room_info.dropna(subset=["hotel", "total_num_rooms"])
+    return [
+        (hotel, int(rooms), None, None, None, None)
+        for hotel, rooms in room_info.itertuples(index=False, name=None)
+    ]
+
+
+def read_override_rows(path):
+    overrides = pd.read_csv(path, dtype={"name": str})
+    overrides = overrides.astype(object).where(overrides.notna(), None)
+    return [
+        (
+            record["name"],
+            None
+            if record["total_num_of_rooms"] is None
+            else int(record["total_num_of_rooms"]),
+            record.get("brand"),
+            record.get("subbrand"),
+            None,
+            None,
+        )
+        for record in overrides.to_dict(orient="records")
+    ]
+
+
+class RoomCountResolver:
+    def __init__(
+        self,
+        store=None,
+        cvent_path=DEFAULT_CVENT_PATH,
+        overrides_path=DEFAULT_OVERRIDES_PATH,
+        llm_version=None,
+    ):
+        self.store = store or RoomCountStore(DEFAULT_STORE_PATH)
+        # the details answers this run would give, see DetailsCascade.version
+        self.llm_version = llm_version or get_details_cascade().version()
+        self.files = {
+            "override": (overrides_path, read_override_rows),
+            "cvent": (cvent_path, read_cvent_rows),
+        }
+
+    def refresh(self):
+        # re-import the files that changed since they were last imported
+        for source, (path, read_rows) in self.files.items():
+            if not path or not Path(path).exists():
+                continue
+            if self.store.imported(source) == (str(path), Path(path).stat().st_mtime):
+                continue
+            rows = read_rows(path)
+            self.store.replace_source(source, path, rows)
+            logger.info(f"Imported {len(rows)} {source} room counts from {path}")
+
+    def lookup_many(self, hotel_names):
+        """One entry per name: {"total_num_of_rooms", "rooms_source", "brand",
+        "subbrand"}, each taken from the first source that has it (brands
+        last from the name's catalog match); None where nothing is known."""
+        self.refresh()
+        found = self.store.lookup(
+            (normalize_name(name) for name in hotel_names), self.llm_version
+        )
+        entries = []
+        for hotel_name in hotel_names:
+            by_source = found.get(normalize_name(hotel_name), {})
+            entry = dict.fromkeys(
+                ["total_num_of_rooms", "rooms_source", "brand", "subbrand"]
+            )
+            for source in SOURCES:
+                if source not in by_source:
+                    continue
+                rooms, brand, subbrand = by_source[source]
+                if entry["total_num_of_rooms"] is None and rooms is not None:
+                    entry["total_num_of_rooms"] = rooms
+                    entry["rooms_source"] = SOURCE_LABELS[source]
+                if entry["brand"] is None and brand is not None:
+                    entry["brand"], entry["subbrand"] = brand, subbrand
+            if entry["brand"] is None:
+                match, _ = get_name_prefilter().scan(hotel_name)
+                if match is not None:
+                    brand, level = match
+                    entry["brand"] = brand.value
+                    entry["subbrand"] = level
+            entries.append(entry)
+        return entries
+
+    def local_record(self, hotel_name, entry):
+        """The details record of a hotel known well enough to skip the LLM,
+        else None."""
+        if entry["total_num_of_rooms"] is None or entry["brand"] is None:
+            return None
+        return {"name": hotel_name, **entry, "details_model": None}
+
+    def remember(self, hotel_names, records):
+        # the LLM's own answers, kept as the "llm" source for later runs
+        self.store.save(
+            "llm",
+            [
+                (
+                    hotel_name,
+                    record["total_num_of_rooms"],
+                    record["brand"],
+                    record["subbrand"],
+                    record.get("details_model"),
+                    self.llm_version,
+                )
+                for hotel_name, record in zip(hotel_names, records)
+                if record is not None
+            ],
+        )
+
+    def details_records(self, hotel_names, fetch):
+        """Details records for the names: local where possible, `fetch(names)`
+        (e.g. DetailsCascade.details_records) for the rest, which are then
+        remembered. None where the fetch failed."""
+        entries = self.lookup_many(hotel_names)
+        records = [
+            self.local_record(hotel_name, entry)
+            for hotel_name, entry in zip(hotel_names, entries)
+        ]
+        misses = [i for i, record in enumerate(records) if record is None]
+        if misses:
+            fetched = fetch([hotel_names[i] for i in misses])
+            for i, record in zip(misses, fetched):
+                records[i] = record
+            self.remember([hotel_names[i] for i in misses], fetched)
+        logger.info(
+            f"Room counts: {len(hotel_names) - len(misses)} of {len(hotel_names)} "
+            f"resolved locally, {len(misses)} sent to the LLM"
+        )
+        return records
+
+    def overlay(self, records, hotel_names):
+        """The records with override and Cvent room counts in place of the
+        LLM's, and rooms_source set on every one. Applied on top of stored
+        stage results too, so newly scraped counts take effect right away."""
+        entries = self.lookup_many(hotel_names)
+        overlaid = []
+        for record, entry in zip(records, entries):
+            if record is not None:
+                record = {**record}
+                record.setdefault("rooms_source", "llm")
+                if entry["rooms_source"] in ("override", "cvent"):
+                    record["total_num_of_rooms"] = entry["total_num_of_rooms"]
+                    record["rooms_source"] = entry["rooms_source"]
+            overlaid.append(record)
+        return overlaid
+
+
+def rooms_report(records=()):
+    # {"total", <rooms_source>: count} over the details records
+    counts = Counter(record["rooms_source"] for record in records if record)
+    return {
+        "total": sum(counts.values()),
+        **{source: counts[source] for source in ROOMS_SOURCES},
+    }
+
+
+_default_resolver = None
+
+
+def get_room_count_resolver():
+    global _default_resolver
+    if _default_resolver is None:
+        _default_resolver = RoomCountResolver()
+    return _default_resolver
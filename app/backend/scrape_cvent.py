@@ -1,29 +1,37 @@
+import argparse
+import json
 import os
 import re
-from typing import List, Tuple
+import time
 
 import pandas as pd
 from dotenv import find_dotenv, load_dotenv
-from googleapiclient.discovery import build
-from playwright.sync_api import sync_playwright
-from thefuzz import fuzz
+
+from app.backend.browser_pool import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_MAX_RETRIES,
+    BrowserPool,
+    get_shared_browser_pool,
+)
+from app.backend.cse_links import get_link_resolver
+from app.backend.llm_async import call_with_retries, gather_in_order, run_sync
+from app.backend.room_counts import DEFAULT_CVENT_PATH
+from app.backend.sqlite_store import SQLiteStore
 
 load_dotenv(find_dotenv())
-LOCATION = "Time square New York CITY, NY"
+# appended to hotel names in the Cvent link search
+LOCATION = os.getenv("CVENT_LOCATION", "Time square New York CITY, NY")
+DEFAULT_CHECKPOINT_PATH = os.getenv("CVENT_CHECKPOINT_PATH", "data/cvent_crawl.sqlite")
+CRAWL_STATUSES = ("found_link", "no_link", "scraped", "parse_failure", "error")
+FAILED_STATUSES = ("parse_failure", "error")
+
 
+async def scrape_guest_room_info(page) -> list[str]:
+    return await page.get_by_text("Guest RoomsTotal guest").all_inner_texts()
 
-def get_guest_room_info_cvent(url) -> None:
-    with sync_playwright() as playwright:
-        browser = playwright.chromium.launch(headless=True)
-        context = browser.new_context()
-        page = context.new_page()
-        page.goto(url)
 
-        guest_room_info = page.get_by_text("Guest RoomsTotal guest").all_inner_texts()
-        # ---------------------
-        context.close()
-        browser.close()
-        return guest_room_info
+def get_guest_room_info_cvent(url) -> list[str]:
+    return get_shared_browser_pool().run(url, scrape_guest_room_info)
 
 
 def parse_total_guest_rooms(text):
@@ -38,21 +46,11 @@ def parse_total_guest_rooms(text):
 
 
 def get_cvent_link(hotel_name, api_key, cse_id):
-    # google search for cvent links
-    search_term = f"cvent {hotel_name}"
-    service = build("customsearch", "v1", developerKey=api_key)
-    results = service.cse().list(q=search_term, cx=cse_id).execute()
+    # google search for cvent links, cached and quota-limited
+    return get_link_resolver(api_key, cse_id).resolve(hotel_name)
 
-    for item in results["items"]:
-        if (
-            fuzz.partial_ratio(hotel_name.lower(), item["title"].lower()) > 70
-            and "cvent" in item["link"]
-        ):
-            return item["link"]
-    return None
 
-
-def get_room_info_for_hotel(hotel_name) -> Tuple[List[str], int]:
+def get_room_info_for_hotel(hotel_name) -> tuple[list[str], int]:
     hotel_name = f"{hotel_name} {LOCATION}"
     cvent_link = get_cvent_link(
         hotel_name, os.getenv("GOOGLE_CSE_API_KEY"), os.getenv("GOOGLE_CSE_ID")
@@ -67,38 +65,215 @@ def get_room_info_for_hotel(hotel_name) -> Tuple[List[str], int]:
     return (room_info, total_room_info)
 
 
-def main():
-    hotel_df = pd.read_parquet("data/legit_time_square_nyc_hotel_names.parquet")
-    hotel_list = hotel_df["name"].to_list()
-    room_info = []
-    error_list = []
-    for hotel in hotel_list:
+class CventCheckpoint(SQLiteStore):
+    """Per-hotel crawl state, written as soon as each hotel is processed.
+
+    status is one of CRAWL_STATUSES; `stage` says whether an error happened
+    while looking up the link or while scraping the page."""
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS cvent_hotels (
+            hotel TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            stage TEXT,
+            cvent_link TEXT,
+            all_info TEXT,
+            total_num_rooms INTEGER,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 1,
+            updated_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS cvent_hotels_status ON cvent_hotels (status);
+    """
+
+    def record(
+        self,
+        hotel,
+        status,
+        stage=None,
+        cvent_link=None,
+        all_info=None,
+        total_num_rooms=None,
+        error=None,
+    ):
+        assert status in CRAWL_STATUSES, status
+        self.connect().execute(
+            """
+            INSERT INTO cvent_hotels
+                (hotel, status, stage, cvent_link, all_info, total_num_rooms,
+                 error, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (hotel) DO UPDATE SET
+                status = excluded.status,
+                stage = excluded.stage,
+                cvent_link = excluded.cvent_link,
+                all_info = excluded.all_info,
+                total_num_rooms = excluded.total_num_rooms,
+                error = excluded.error,
+                attempts = attempts + 1,
+                updated_at = excluded.updated_at
+            """,
+            (
+                hotel,
+                status,
+                stage,
+                cvent_link,
+                None if all_info is None else json.dumps(all_info),
+                total_num_rooms,
+                None if error is None else repr(error),
+                time.time(),
+            ),
+        )
+
+    def states(self):
+        # {hotel: (status, cvent_link)}
+        rows = self.connect().execute(
+            "SELECT hotel, status, cvent_link FROM cvent_hotels"
+        )
+        return {hotel: (status, link) for hotel, status, link in rows}
+
+    def query(self, where="1", params=()):
+        df = pd.read_sql_query(
+            f"SELECT * FROM cvent_hotels WHERE {where} ORDER BY updated_at",
+            self.connect(),
+            params=params,
+        )
+        df["all_info"] = df["all_info"].map(
+            lambda info: None if info is None else json.loads(info)
+        )
+        return df
+
+    def room_info(self):
+        # same columns as the parquet main() has always written
+        scraped = self.query("status IN ('scraped', 'parse_failure')")
+        return scraped[["hotel", "all_info", "total_num_rooms"]]
+
+    def failures(self):
+        return self.query(
+            "status IN ({})".format(", ".join("?" * len(FAILED_STATUSES))),
+            FAILED_STATUSES,
+        )
+
+    def progress(self):
+        return dict(
+            self.connect().execute(
+                "SELECT status, COUNT(*) FROM cvent_hotels GROUP BY status"
+            )
+        )
+
+
+def resolve_cvent_links(hotels, checkpoint, location=LOCATION):
+    resolver = get_link_resolver(
+        os.getenv("GOOGLE_CSE_API_KEY"), os.getenv("GOOGLE_CSE_ID")
+    )
+    queries = {f"{hotel} {location}": hotel for hotel in hotels}
+    for query, cvent_link in resolver.iter_resolve(list(queries)):
+        hotel = queries[query]
         print(hotel)
-        try:
-            result = get_room_info_for_hotel(hotel)
-            if not result:
-                continue
-        except Exception as e:
-            print(f"Error: {e}")
-            error_list.append(hotel)
-            continue
-        all_info, total_num_rooms = result
-        room_info.append((hotel, all_info, total_num_rooms))
-        print(f"Updated room_info list with {hotel}")
-        print("\n\n")
-        print("---------------------------------------------------")
-        print("\n\n")
-    # convert the room_info list to a pandas DataFrame
-    room_info_df = pd.DataFrame(
-        room_info, columns=["hotel", "all_info", "total_num_rooms"]
+        if isinstance(cvent_link, Exception):
+            print(f"Error: {cvent_link}")
+            checkpoint.record(hotel, "error", stage="link", error=cvent_link)
+        elif cvent_link:
+            print(f"Found cvent link: {cvent_link}")
+            checkpoint.record(hotel, "found_link", cvent_link=cvent_link)
+        else:
+            checkpoint.record(hotel, "no_link")
+    print(
+        f"CSE queries sent: {resolver.requests}, served from cache: "
+        f"{resolver.cache_hits}"
     )
-    # save the DataFrame to a parquet file
-    room_info_df.to_parquet("data/cvent_room_info.parquet")
-    # save the error list to a text file
-    with open("data/error_list_cvent_room_info_hotels.txt", "w") as f:
-        for item in error_list:
-            f.write(f"{item}\n")
+
+
+async def scrape_cvent_pages(cvent_links, checkpoint, concurrency=DEFAULT_CONCURRENCY):
+    # every page is checkpointed when it finishes, not at the end of the batch
+    async with BrowserPool(concurrency=concurrency) as pool:
+
+        async def scrape_and_record(hotel):
+            cvent_link = cvent_links[hotel]
+            try:
+                all_info = await call_with_retries(
+                    pool.run,
+                    cvent_link,
+                    scrape_guest_room_info,
+                    timeout=pool.timeout,
+                    max_retries=DEFAULT_MAX_RETRIES,
+                )
+            except Exception as e:
+                print(f"Error scraping {hotel}: {e}")
+                checkpoint.record(
+                    hotel, "error", stage="scrape", cvent_link=cvent_link, error=e
+                )
+                return
+            total_num_rooms = parse_total_guest_rooms("\n".join(all_info))
+            print(f"{hotel}: total guest rooms {total_num_rooms}")
+            checkpoint.record(
+                hotel,
+                "scraped" if total_num_rooms is not None else "parse_failure",
+                cvent_link=cvent_link,
+                all_info=all_info,
+                total_num_rooms=total_num_rooms,
+            )
+
+        await gather_in_order(
+            scrape_and_record,
+            list(cvent_links),
+            concurrency=pool.concurrency,
+            timeout=None,
+            max_retries=0,
+        )
+        print(
+            f"Scraped {pool.pages_loaded} Cvent pages ({pool.failures} failures) "
+            f"at {pool.pages_per_minute():.1f} pages/min"
+        )
+
+
+def main(
+    concurrency=DEFAULT_CONCURRENCY,
+    checkpoint_path=DEFAULT_CHECKPOINT_PATH,
+    location=LOCATION,
+):
+    hotel_df = pd.read_parquet("data/legit_time_square_nyc_hotel_names.parquet")
+    hotel_list = hotel_df["name"].to_list()
+    checkpoint = CventCheckpoint(checkpoint_path)
+
+    # hotels that finished (scraped / no_link) are skipped; link lookups that
+    # failed are redone, pages that failed are re-scraped from the saved link
+    states = checkpoint.states()
+    to_resolve = [
+        hotel
+        for hotel in hotel_list
+        if hotel not in states or states[hotel] == ("error", None)
+    ]
+    print(f"{len(hotel_list) - len(to_resolve)} hotels already have a link result")
+    resolve_cvent_links(to_resolve, checkpoint, location)
+
+    states = checkpoint.states()
+    cvent_links = {
+        hotel: states[hotel][1]
+        for hotel in hotel_list
+        if hotel in states
+        and states[hotel][1]
+        and states[hotel][0] in ("found_link", *FAILED_STATUSES)
+    }
+    if cvent_links:
+        run_sync(scrape_cvent_pages(cvent_links, checkpoint, concurrency))
+
+    print(f"Crawl status: {checkpoint.progress()}")
+    # read by the pipeline's room count resolver, see room_counts.py
+    checkpoint.room_info().to_parquet(DEFAULT_CVENT_PATH)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT_PATH)
+    parser.add_argument("--location", default=LOCATION)
+    parser.add_argument(
+        "--failures", action="store_true", help="print the failure table and exit"
+    )
+    args = parser.parse_args()
+    if args.failures:
+        failures = CventCheckpoint(args.checkpoint).failures()
+        print(failures[["hotel", "status", "stage", "cvent_link", "error"]])
+    else:
+        main(args.concurrency, args.checkpoint, args.location)
@@ -1,18 +1,32 @@
+import functools
 import logging
 import os
 import re
+from datetime import date, timedelta
 from enum import Enum
 from pathlib import Path
 
-import instructor
 import pandas as pd
 import streamlit as st
 from dotenv import find_dotenv, load_dotenv
-from openai import OpenAI
 from pydantic import BaseModel, Field
-from serpapi import GoogleSearch
 from tqdm import tqdm
 
+from app.backend.entity_resolution import match_names
+from app.backend.llm_async import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_TIMEOUT,
+    gather_in_order,
+    run_sync,
+)
+from app.backend.llm_batch import DEFAULT_TOKEN_BUDGET, estimate_tokens, run_batched
+from app.backend.llm_cache import acached_call, cached_call, get_llm_cache
+from app.backend.llm_gateway import get_llm_gateway, model_for
+from app.backend.prefilter import NamePrefilter, parse_brand_catalog
+from app.backend.serp_fetch import iter_result_pages
+from app.backend.telemetry import response_usage, span
+
 load_dotenv(find_dotenv())
 logger = logging.getLogger(__name__)
 
@@ -31,34 +45,43 @@ def slugify(text):
     return re.sub(pattern, "-", text.lower().strip())
 
 
-@st.cache_data
-def fetch_all_hotels(query, api_key):
-    all_hotels = []
-    params = {
+def default_stay_dates():
+    # one night, starting tomorrow
+    check_in = date.today() + timedelta(days=1)
+    return check_in.isoformat(), (check_in + timedelta(days=1)).isoformat()
+
+
+def hotel_search_params(query, api_key, check_in_date=None, check_out_date=None):
+    if check_in_date is None or check_out_date is None:
+        check_in_date, check_out_date = default_stay_dates()
+    return {
         "api_key": api_key,
         "engine": "google_hotels",
         "q": query,
         "hl": "en",
         "gl": "us",
-        "check_in_date": "2024-05-21",
-        "check_out_date": "2024-05-22",
+        "check_in_date": check_in_date,
+        "check_out_date": check_out_date,
         "currency": "USD",
         "num": "20",
     }
 
-    while True:
-        search = GoogleSearch(params)
-        results = search.get_dict()
-        all_hotels += results.get("properties", [])
 
-        # Check if there are more pages
-        if "serpapi_pagination" in results and "next" in results["serpapi_pagination"]:
-            params["next_page_token"] = results["serpapi_pagination"]["next_page_token"]
-        else:
-            break
-    # return a new list of hotels with only the name, description, gps_coordinates, link, hotel_class
+HOTEL_COLUMNS = [
+    "name",
+    "description",
+    "latitude",
+    "longitude",
+    "link",
+    "hotel_class",
+    "property_token",
+]
+
 
-    result_df = pd.DataFrame(
+def parse_hotel_properties(results):
+    # keep only the name, description, gps_coordinates, link, hotel_class and
+    # the property token SerpAPI uses to identify the property
+    return pd.DataFrame(
         [
             {
                 "name": hotel.get("name"),
@@ -67,11 +90,36 @@ def fetch_all_hotels(query, api_key):
                 "longitude": hotel.get("gps_coordinates", {}).get("longitude"),
                 "link": hotel.get("link"),
                 "hotel_class": hotel.get("hotel_class"),
+                "property_token": hotel.get("property_token"),
             }
-            for hotel in all_hotels
-        ]
+            for hotel in results.get("properties", [])
+        ],
+        columns=HOTEL_COLUMNS,
     )
-    return result_df
+
+
+def iter_hotel_pages(
+    query, api_key, check_in_date=None, check_out_date=None, limiter=None
+):
+    # one DataFrame per SerpAPI page, the next page is fetched in the background
+    # while the caller works on the current one
+    params = hotel_search_params(query, api_key, check_in_date, check_out_date)
+    for results in iter_result_pages(params, limiter=limiter):
+        yield parse_hotel_properties(results)
+
+
+def concat_hotel_pages(pages):
+    # a query SerpAPI has no results for yields no pages at all
+    pages = list(pages)
+    if not pages:
+        return pd.DataFrame(columns=HOTEL_COLUMNS)
+    return pd.concat(pages, ignore_index=True)
+
+
+@st.cache_data
+def fetch_all_hotels(query, api_key, check_in_date=None, check_out_date=None):
+    pages = iter_hotel_pages(query, api_key, check_in_date, check_out_date)
+    return concat_hotel_pages(pages)
 
 
 class LegitHotel(BaseModel):
@@ -79,42 +127,174 @@ class LegitHotel(BaseModel):
     is_legit_name: bool = Field("True if the name of the hotel is legit.")
 
 
+LEGIT_MODEL = model_for("legitimacy")
+LEGIT_PROMPT = "Is the <name> {hotel_name} </name> a real hotel name. Examples of real hotel names: New York Hilton Midtown, Hotel Edison New York City, ROW NYC. Example of fake hotel name: Located In Midtown! Trendy Bars, Pet-friendly, Close To Broadway!,A Trip To The Most Vibrant City! Onsite Dining, Pet-friendly, Near Central Park!, Spacious Room in The Heart of Manhattan"
+# what a verdict is cached under instead of the prompt text, so single and
+# batched calls share answers; bump it when the question itself changes
+LEGIT_CACHE_KEY = "is it a real hotel name, v1"
+
+
 def get_hotel_name_legitimacy(hotel_name):
-    client = instructor.patch(OpenAI(api_key=os.getenv("OPENAI_API_KEY")))
-    resp = client.chat.completions.create(
-        model="gpt-3.5-turbo",
-        messages=[
-            {
-                "role": "user",
-                "content": f"Is the <name> {hotel_name} </name> a real hotel name. Examples of real hotel names: New York Hilton Midtown, Hotel Edison New York City, ROW NYC. Example of fake hotel name: Located In Midtown! Trendy Bars, Pet-friendly, Close To Broadway!,A Trip To The Most Vibrant City! Onsite Dining, Pet-friendly, Near Central Park!, Spacious Room in The Heart of Manhattan",
-            }
-        ],
-        response_model=LegitHotel,
+    def call():
+        return get_llm_gateway().create(
+            LEGIT_MODEL, LEGIT_PROMPT.format(hotel_name=hotel_name), LegitHotel
+        )
+
+    return cached_call(
+        LEGIT_MODEL, LEGIT_CACHE_KEY, LegitHotel, hotel_name, call, stage="legitimacy"
     )
-    # parse the content to get the number of room
-    return resp
 
 
-@st.cache_data
-def filter_legit_hotels(hotel_df):
-    legitamacy_results = []
+async def aget_hotel_name_legitimacy(hotel_name):
+    async def call():
+        return await get_llm_gateway().acreate(
+            LEGIT_MODEL, LEGIT_PROMPT.format(hotel_name=hotel_name), LegitHotel
+        )
 
-    all_pages_results = hotel_df.to_dict(orient="records")
-    for hotel in tqdm(all_pages_results):
-        try:
-            legit_hotel = get_hotel_name_legitimacy(hotel["name"])
-        except Exception as e:
-            print(f"Error processing {hotel['name']}: {e}")
+    return await acached_call(
+        LEGIT_MODEL, LEGIT_CACHE_KEY, LegitHotel, hotel_name, call, stage="legitimacy"
+    )
+
+
+async def aclassify_hotel_names(
+    hotel_names,
+    concurrency=DEFAULT_CONCURRENCY,
+    timeout=DEFAULT_TIMEOUT,
+    max_retries=DEFAULT_MAX_RETRIES,
+):
+    return await gather_in_order(
+        aget_hotel_name_legitimacy,
+        hotel_names,
+        concurrency=concurrency,
+        timeout=timeout,
+        max_retries=max_retries,
+    )
+
+
+class LegitHotelBatch(BaseModel):
+    hotels: list[LegitHotel]
+
+
+LEGIT_BATCH_PROMPT = """For every name listed below, tell whether it is a real hotel name. Return exactly one entry per listed name, with the name copied exactly as given. Examples of real hotel names: New York Hilton Midtown, Hotel Edison New York City, ROW NYC. Example of fake hotel name: Located In Midtown! Trendy Bars, Pet-friendly, Close To Broadway!,A Trip To The Most Vibrant City! Onsite Dining, Pet-friendly, Near Central Park!, Spacious Room in The Heart of Manhattan
+
+{hotel_names}"""
+
+
+async def aget_hotel_names_legitimacy_batch(hotel_names):
+    with span(
+        "legitimacy_batch", hotel=f"{len(hotel_names)} names", model=LEGIT_MODEL
+    ) as event:
+        resp = await get_llm_gateway().acreate(
+            LEGIT_MODEL,
+            LEGIT_BATCH_PROMPT.format(
+                hotel_names="\n".join(f"<name>{name}</name>" for name in hotel_names)
+            ),
+            LegitHotelBatch,
+        )
+        event["usage"] = response_usage(resp)
+    return resp.hotels
+
+
+async def aclassify_hotel_names_batched(
+    hotel_names,
+    concurrency=DEFAULT_CONCURRENCY,
+    timeout=DEFAULT_TIMEOUT,
+    max_retries=DEFAULT_MAX_RETRIES,
+    token_budget=DEFAULT_TOKEN_BUDGET,
+):
+    cache = get_llm_cache()
+    keys = {
+        name: cache.make_key(LEGIT_MODEL, LEGIT_CACHE_KEY, LegitHotel, name)
+        for name in dict.fromkeys(hotel_names)
+    }
+    results = {}
+    for name, key in keys.items():
+        cached = None if key is None else cache.get(key, LegitHotel)
+        if cached is not None:
+            results[name] = cached
+    misses = [name for name in keys if name not in results]
+
+    answers, requests = await run_batched(
+        aget_hotel_names_legitimacy_batch,
+        misses,
+        prompt_tokens=estimate_tokens(LEGIT_BATCH_PROMPT),
+        # the name goes out in the prompt and comes back inside the answer
+        item_tokens=lambda name: 2 * estimate_tokens(name) + 12,
+        token_budget=token_budget,
+        concurrency=concurrency,
+        timeout=timeout,
+        max_retries=max_retries,
+    )
+    for name, answer in answers.items():
+        if not isinstance(answer, Exception) and keys[name] is not None:
+            cache.set(keys[name], answer, model=LEGIT_MODEL, hotel_name=name)
+    results.update(answers)
+    logger.info(
+        f"Classified {len(keys)} unique names: {len(keys) - len(misses)} cached, "
+        f"{len(misses)} sent in {requests} requests"
+    )
+    return [results[name] for name in hotel_names]
+
+
+@functools.cache
+def get_name_prefilter():
+    return NamePrefilter(parse_brand_catalog(gpt4_prompt, HotelBrand), HotelBrand)
+
+
+def classify_legitimacy(
+    hotel_names, concurrency=DEFAULT_CONCURRENCY, batched=False, prefilter=True
+):
+    """One is_legit_name per name (None where the LLM call failed), plus the
+    pre-filter stats."""
+    if prefilter:
+        decisions, stats = get_name_prefilter().decide_many(hotel_names)
+    else:
+        decisions = [None] * len(hotel_names)
+        stats = {
+            "total": len(hotel_names),
+            "short_circuited": 0,
+            "sent_to_llm": len(hotel_names),
+        }
+    logger.info(
+        f"Pre-filter decided {stats['short_circuited']} of {stats['total']} names, "
+        f"sending {stats['sent_to_llm']} to the LLM"
+    )
+
+    ambiguous = [
+        name for name, decision in zip(hotel_names, decisions) if decision is None
+    ]
+    if batched:
+        classify = aclassify_hotel_names_batched(ambiguous, concurrency=concurrency)
+    else:
+        classify = aclassify_hotel_names(ambiguous, concurrency=concurrency)
+    results = iter(run_sync(classify))
+
+    # results come back in input order, so line them up with the rows directly
+    # instead of merging on the (possibly rewritten) name the LLM echoes back
+    is_legit_name = []
+    for hotel_name, decision in zip(hotel_names, decisions):
+        if decision is not None:
+            is_legit_name.append(decision)
             continue
-        legitamacy_results.append(legit_hotel)
+        result = next(results)
+        if isinstance(result, Exception):
+            print(f"Error processing {hotel_name}: {result}")
+            is_legit_name.append(None)
+            continue
+        is_legit_name.append(result.is_legit_name)
+    return is_legit_name, stats
+
 
-    # filter hotel_df based on the legitamacy_results
-    legitamacy_results_df = pd.DataFrame(
-        [result.dict() for result in legitamacy_results]
+@st.cache_data
+def filter_legit_hotels(
+    hotel_df, concurrency=DEFAULT_CONCURRENCY, batched=False, prefilter=True
+):
+    is_legit_name, stats = classify_legitimacy(
+        hotel_df["name"].to_list(), concurrency, batched, prefilter
     )
-    print(legitamacy_results_df)
-    filtered_hotel_df = hotel_df.merge(legitamacy_results_df, on="name")
+    filtered_hotel_df = hotel_df.assign(is_legit_name=is_legit_name)
     filtered_hotel_df = filtered_hotel_df[filtered_hotel_df["is_legit_name"] == True]
+    filtered_hotel_df.attrs["prefilter"] = stats
     return filtered_hotel_df
 
 
@@ -216,20 +396,43 @@ Economy: OYO Life, OYO Flagship
 """
 
 
+DETAILS_MODEL = model_for("details")
+DETAILS_PROMPT = "How many rooms are there in hotel <hotel_name>{hotel_name} </hotel_name>. Give answer with citations."
+
+
 def get_hotel_details_from_md_gpt4(hotel_name):
-    client = instructor.patch(OpenAI(api_key=os.getenv("OPENAI_API_KEY")))
-    resp = client.chat.completions.create(
-        model="gpt-4",
-        messages=[
-            {
-                "role": "user",
-                "content": f"How many rooms are there in hotel <hotel_name>{hotel_name} </hotel_name>. Give answer with citations.",
-            }
-        ],
-        response_model=Hotel,
+    def call():
+        return get_llm_gateway().create(
+            DETAILS_MODEL, DETAILS_PROMPT.format(hotel_name=hotel_name), Hotel
+        )
+
+    # previously classified names are served from the disk cache
+    return cached_call(
+        DETAILS_MODEL, DETAILS_PROMPT, Hotel, hotel_name, call, stage="details"
+    )
+
+
+async def aget_hotel_details_from_md_gpt4(hotel_name):
+    return await aget_hotel_details_from_model(hotel_name, DETAILS_MODEL)
+
+
+class RatedHotel(Hotel):
+    confidence: float = Field(
+        ...,
+        description="How sure you are of the number of rooms, from 0 (a guess) to 1 (certain).",
+    )
+
+
+async def aget_hotel_details_from_model(hotel_name, model, response_model=Hotel):
+    # the details prompt on any model, see cascade.DetailsCascade
+    async def call():
+        return await get_llm_gateway().acreate(
+            model, DETAILS_PROMPT.format(hotel_name=hotel_name), response_model
+        )
+
+    return await acached_call(
+        model, DETAILS_PROMPT, response_model, hotel_name, call, stage="details"
     )
-    # parse the content to get the number of rooms
-    return resp
 
 
 def parse_hotel_pydantic_object(obj):
@@ -241,47 +444,175 @@ def parse_hotel_pydantic_object(obj):
     }
 
 
-def get_hotel_details(hotel_df):
-    results = []
-
-    all_pages_results = hotel_df.to_dict(orient="records")
-    for hotel in tqdm(all_pages_results):
+def hotel_details_records(hotel_names):
+    # one parsed record per name, None where the lookup failed
+    records = []
+    for hotel_name in tqdm(hotel_names):
         try:
-            gpt_hotel = get_hotel_details_from_md_gpt4(hotel["name"])
+            gpt_hotel = get_hotel_details_from_md_gpt4(hotel_name)
         except Exception as e:
-            print(f"Error processing {hotel['name']}: {e}")
+            print(f"Error processing {hotel_name}: {e}")
+            records.append(None)
             continue
-        results.append(gpt_hotel)
-    return pd.DataFrame([parse_hotel_pydantic_object(obj) for obj in results])
+        records.append(parse_hotel_pydantic_object(gpt_hotel))
+    return records
 
 
-@st.cache_data
-def combine_hotel_data(hotel_df, hotel_details_df):
-    all_names = hotel_df.name.to_list()
-    output = []
-    for index, row in hotel_details_df.iterrows():
-        hotel_name = [name for name in all_names if row["name"] == name]
-        if len(hotel_name) == 0:
-            continue
+def get_hotel_details(hotel_df):
+    records = hotel_details_records(hotel_df["name"].to_list())
+    return pd.DataFrame([record for record in records if record is not None])
 
-        # get the row with the saved_hotel_name
-        matched_row = hotel_df[hotel_df["name"] == hotel_name].iloc[0]
-        output.append(
-            {
-                "name": matched_row["name"],
-                "latitude": matched_row["latitude"],
-                "longitude": matched_row["longitude"],
-                "link": matched_row["link"],
-                "star_rating": matched_row["hotel_class"],
-                "brand": row["brand"],
-                "scale": row["subbrand"],
-                "total_num_of_rooms": row["total_num_of_rooms"],
-            }
+
+class HotelEnrichment(BaseModel):
+    name: str
+    is_legit_name: bool = Field(
+        ..., description="True if the name of the hotel is legit."
+    )
+    brand: HotelBrand | None = Field(
+        None,
+        description="Brand of the hotel based on the name. If the name is not a hotel, return None. If not a recognized brand, return Independent.",
+    )
+    subbrand: HotelSubbrandLevel | None = Field(
+        None,
+        description="Subbrand of the hotel based on the name. If the name is not a hotel, return None.",
+    )
+    total_num_of_rooms: int | None = Field(
+        None,
+        description="Total Number of rooms in the hotel. If the name is not a hotel, return None.",
+    )
+
+
+# legitimacy and details in one round trip, see hotel_enrichment_records
+ENRICHMENT_MODEL = model_for("enrichment")
+ENRICHMENT_PROMPT = """Is the <hotel_name>{hotel_name} </hotel_name> a real hotel name. Examples of real hotel names: New York Hilton Midtown, Hotel Edison New York City, ROW NYC. Example of fake hotel name: Located In Midtown! Trendy Bars, Pet-friendly, Close To Broadway!,A Trip To The Most Vibrant City! Onsite Dining, Pet-friendly, Near Central Park!, Spacious Room in The Heart of Manhattan
+
+If it is a real hotel, how many rooms are there in it. Give answer with citations. If it is not, leave the brand, subbrand and number of rooms empty."""
+
+
+def get_hotel_enrichment(hotel_name):
+    def call():
+        return get_llm_gateway().create(
+            ENRICHMENT_MODEL,
+            ENRICHMENT_PROMPT.format(hotel_name=hotel_name),
+            HotelEnrichment,
+        )
+
+    return cached_call(
+        ENRICHMENT_MODEL,
+        ENRICHMENT_PROMPT,
+        HotelEnrichment,
+        hotel_name,
+        call,
+        stage="enrichment",
+    )
+
+
+async def aget_hotel_enrichment(hotel_name):
+    async def call():
+        return await get_llm_gateway().acreate(
+            ENRICHMENT_MODEL,
+            ENRICHMENT_PROMPT.format(hotel_name=hotel_name),
+            HotelEnrichment,
+        )
+
+    return await acached_call(
+        ENRICHMENT_MODEL,
+        ENRICHMENT_PROMPT,
+        HotelEnrichment,
+        hotel_name,
+        call,
+        stage="enrichment",
+    )
+
+
+def parse_hotel_enrichment(obj, is_legit_name=None):
+    """{"is_legit_name", "details"} of a HotelEnrichment answer, details being
+    a parse_hotel_pydantic_object record or None for names that aren't
+    hotels. A pre-filter decision passed as is_legit_name wins over the LLM's."""
+    if is_legit_name is None:
+        is_legit_name = obj.is_legit_name
+    return {
+        "is_legit_name": is_legit_name,
+        "details": parse_hotel_pydantic_object(obj) if is_legit_name else None,
+    }
+
+
+def hotel_enrichment_records(
+    hotel_names, concurrency=DEFAULT_CONCURRENCY, prefilter=True
+):
+    """The fused counterpart of classify_legitimacy + hotel_details_records:
+    one parse_hotel_enrichment record per name, None where the call failed.
+    Names the pre-filter rejects cost no call at all."""
+    if prefilter:
+        decisions, _ = get_name_prefilter().decide_many(hotel_names)
+    else:
+        decisions = [None] * len(hotel_names)
+    asked = [
+        name for name, decision in zip(hotel_names, decisions) if decision is not False
+    ]
+    results = iter(
+        run_sync(gather_in_order(aget_hotel_enrichment, asked, concurrency=concurrency))
+    )
+    records = []
+    for hotel_name, decision in zip(hotel_names, decisions):
+        if decision is False:
+            records.append({"is_legit_name": False, "details": None})
+            continue
+        result = next(results)
+        if isinstance(result, Exception):
+            print(f"Error processing {hotel_name}: {result}")
+            records.append(None)
+            continue
+        records.append(parse_hotel_enrichment(result, decision))
+    return records
+
+
+COMBINED_COLUMNS = [
+    "name",
+    "latitude",
+    "longitude",
+    "link",
+    "star_rating",
+    "brand",
+    "scale",
+    "total_num_of_rooms",
+]
+
+
+def merge_hotel_data(hotel_df, hotel_details_df, fuzzy_threshold=None):
+    # hash join on name: every details row picks up the first listing with the
+    # same name, keeping the order of hotel_details_df
+    listings = hotel_df.drop_duplicates(subset=["name"], keep="first")[
+        ["name", "latitude", "longitude", "link", "hotel_class"]
+    ]
+    details = hotel_details_df[["name", "brand", "subbrand", "total_num_of_rooms"]]
+    columns = COMBINED_COLUMNS
+    if fuzzy_threshold is not None:
+        # the LLM may have rewritten the name, so resolve each details row to
+        # the closest listing name and carry that name into the join
+        listings = listings.dropna(subset=["name"])
+        details_pos, listing_pos, confidence = match_names(
+            details["name"].to_list(),
+            listings["name"].to_list(),
+            threshold=fuzzy_threshold,
+        )
+        details = details.iloc[details_pos].assign(
+            name=listings["name"].to_numpy()[listing_pos],
+            match_confidence=confidence,
         )
-    # return a new DataFrame with the combined data and remove any duplicates on names
+        columns = COMBINED_COLUMNS + ["match_confidence"]
+    details = details.drop_duplicates(subset=["name"], keep="first")
+    combined = details.merge(listings, on="name", how="inner", sort=False)
+    return combined.rename(columns={"hotel_class": "star_rating", "subbrand": "scale"})[
+        columns
+    ]
+
+
+@st.cache_data
+def combine_hotel_data(hotel_df, hotel_details_df, fuzzy_threshold=None):
+    # return a new DataFrame with the combined data, deduplicated on names
     # also remove any rows with missing values for latitude, longitude, name
-    return (
-        pd.DataFrame(output)
-        .drop_duplicates(subset=["name"], keep="first")
-        .dropna(subset=["latitude", "longitude", "name"])
+    # with fuzzy_threshold set (0-100), names the LLM rewrote are matched too
+    return merge_hotel_data(hotel_df, hotel_details_df, fuzzy_threshold).dropna(
+        subset=["latitude", "longitude", "name"]
     )
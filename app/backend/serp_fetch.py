@@ -0,0 +1,257 @@
+"""Cached, streaming fetcher for paginated SerpAPI results.
+
+Every page response is stored in SQLite, keyed by its normalized request
+params (without the api key). Once a page is older than the TTL it is
+fetched again and the fresh response replaces the cached one, since its
+next_page_token is the one SerpAPI will still accept; if the contents did
+not change, only the validation time moves and fetched_at keeps the time
+they were first seen.
+
+A page that comes back with an "error" is never cached and ends the
+iteration with a SerpAPIError, rather than passing for an empty page and
+silently cutting the listings short. The one exception is SerpAPI's "no
+results" answer, which just means there are no (more) listings.
+
+Pages are fetched on a background thread one step ahead of the consumer:
+while the caller works on page 1, page 2 is already in flight. Requests go
+through an AdaptiveLimiter (one per process unless the caller brings its
+own); a 429 slows it down and the page is asked for again.
+"""
+
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from serpapi import GoogleSearch
+
+from app.backend.ratelimit import (
+    DEFAULT_MAX_REQUEUES,
+    AdaptiveLimiter,
+    RateLimited,
+    retry_after,
+)
+from app.backend.sqlite_store import SQLiteStore
+from app.backend.telemetry import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.getenv("SERP_CACHE_PATH", "data/serp_cache.sqlite")
+DEFAULT_TTL = float(os.getenv("SERP_CACHE_TTL", str(24 * 3600)))
+# params that don't change the results
+IGNORED_PARAMS = {"api_key", "source", "output"}
+# SerpAPI's error text for a search with nothing (left) to list
+NO_RESULTS_ERROR = "hasn't returned any results"
+
+
+class SerpAPIError(Exception):
+    pass
+
+
+def normalize_params(params):
+    normalized = {}
+    for key, value in params.items():
+        if key in IGNORED_PARAMS or value is None:
+            continue
+        value = " ".join(str(value).split())
+        normalized[key] = value.lower() if key == "q" else value
+    return normalized
+
+
+def params_key(params):
+    normalized = json.dumps(normalize_params(params), sort_keys=True)
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def page_fingerprint(results):
+    properties = [
+        hotel.get("property_token") or hotel.get("name")
+        for hotel in results.get("properties", [])
+    ]
+    has_next = "next" in results.get("serpapi_pagination", {})
+    return hashlib.sha256(json.dumps([properties, has_next]).encode()).hexdigest()
+
+
+class SerpCache(SQLiteStore):
+    schema = """
+        CREATE TABLE IF NOT EXISTS serp_pages (
+            key TEXT PRIMARY KEY,
+            params TEXT NOT NULL,
+            response TEXT NOT NULL,
+            fingerprint TEXT NOT NULL,
+            fetched_at REAL NOT NULL,
+            validated_at REAL NOT NULL
+        );
+    """
+
+    def get(self, key):
+        row = (
+            self.connect()
+            .execute(
+                "SELECT response, fingerprint, validated_at FROM serp_pages WHERE key = ?",
+                (key,),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        response, fingerprint, validated_at = row
+        return json.loads(response), fingerprint, validated_at
+
+    def put(self, key, params, response, fingerprint):
+        now = time.time()
+        self.connect().execute(
+            "INSERT OR REPLACE INTO serp_pages VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                key,
+                json.dumps(normalize_params(params), sort_keys=True),
+                json.dumps(response),
+                fingerprint,
+                now,
+                now,
+            ),
+        )
+
+    def refresh(self, key, response):
+        # same contents, newer response (and next_page_token)
+        self.connect().execute(
+            "UPDATE serp_pages SET response = ?, validated_at = ? WHERE key = ?",
+            (json.dumps(response), time.time(), key),
+        )
+
+
+_default_cache = None
+
+
+def get_serp_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = SerpCache(DEFAULT_CACHE_PATH)
+    return _default_cache
+
+
+_default_limiter = None
+
+
+def get_serpapi_limiter():
+    # not paced until SerpAPI first answers 429
+    global _default_limiter
+    if _default_limiter is None:
+        _default_limiter = AdaptiveLimiter()
+    return _default_limiter
+
+
+def request_page(params):
+    # GoogleSearch adds source/output to the dict it is given, hand it a copy
+    search = GoogleSearch(dict(params))
+    # SERPAPI_BASE_URL points the client at a replay server, see
+    # benchmarks/fake_serpapi.py
+    if os.getenv("SERPAPI_BASE_URL"):
+        search.BACKEND = os.getenv("SERPAPI_BASE_URL")
+    response = search.get_response()
+    if response.status_code == 429:
+        raise RateLimited(
+            f"SerpAPI: {response.text[:200]}", delay=retry_after(response.headers)
+        )
+    return response.json()
+
+
+def request_page_paced(params, limiter):
+    requeues = 0
+    while True:
+        limiter.acquire()
+        try:
+            with span("serpapi", hotel=params.get("q")) as event:
+                results = request_page(params)
+                if "error" in results:
+                    event["outcome"] = "error"
+                    event["error"] = results["error"]
+        except RateLimited as e:
+            limiter.on_rate_limited(e.delay)
+            requeues += 1
+            if requeues > DEFAULT_MAX_REQUEUES:
+                raise
+            continue
+        limiter.on_success()
+        return results
+
+
+def fetch_page(params, ttl=DEFAULT_TTL, cache=None, limiter=None):
+    cache = cache or get_serp_cache()
+    key = params_key(params)
+    cached = cache.get(key)
+    if cached is not None and time.time() - cached[2] < ttl:
+        with span("serpapi", hotel=params.get("q"), outcome="cache_hit"):
+            return cached[0]
+
+    # only real requests count against the rate limit, cache hits are free
+    results = request_page_paced(params, limiter or get_serpapi_limiter())
+    if "error" in results:
+        # don't remember failures, the next run should try again
+        return results
+    fingerprint = page_fingerprint(results)
+    if cached is not None and cached[1] == fingerprint:
+        cache.refresh(key, results)
+        return results
+    cache.put(key, params, results, fingerprint)
+    return results
+
+
+def iter_result_pages(params, ttl=DEFAULT_TTL, cache=None, limiter=None, prefetch=1):
+    """Yield each result page dict, following serpapi_pagination."""
+    pages = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        # give up if the consumer went away instead of blocking forever
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        page_params = dict(params)
+        try:
+            while True:
+                results = fetch_page(page_params, ttl=ttl, cache=cache, limiter=limiter)
+                if "error" in results:
+                    if NO_RESULTS_ERROR not in results["error"]:
+                        raise SerpAPIError(results["error"])
+                    logger.info(f"No more results for {params.get('q')!r}")
+                    break
+                if not put(results):
+                    return
+                pagination = results.get("serpapi_pagination", {})
+                if "next" not in pagination:
+                    break
+                page_params = {
+                    **page_params,
+                    "next_page_token": pagination["next_page_token"],
+                }
+        except Exception as e:
+            # raised again on the consumer's side
+            logger.debug("Fetching SerpAPI pages failed", exc_info=True)
+            put(e)
+        put(done)
+
+    # the copied context keeps the producer's spans in the caller's run
+    context = contextvars.copy_context()
+    threading.Thread(target=context.run, args=(produce,), daemon=True).start()
+    try:
+        while True:
+            item = pages.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
@@ -0,0 +1,30 @@
+import sqlite3
+import threading
+from pathlib import Path
+
+
+class SQLiteStore:
+    """Base for the small SQLite-backed stores under data/.
+
+    Subclasses set `schema`. Each thread gets its own connection in WAL mode
+    with a generous busy timeout, so several Streamlit workers and batch jobs
+    can share one file."""
+
+    schema = ""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self.connect().executescript(self.schema)
+
+    def connect(self):
+        # sqlite connections can't be shared across threads, keep one per thread
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,141 @@
+"""Competitive hotel supply around candidate development sites.
+
+For every site and radius: the total hotels and rooms within the radius,
+and the same broken down by brand, scale (HotelSubbrandLevel) and star
+class. All sites are handled in one pass: the spatial index returns every
+(site, hotel) pair within the largest radius, each pair is tagged with the
+smallest radius ring it falls in, and np.bincount sums rooms per
+(site, ring, category) segment. A cumulative sum over the rings turns ring
+totals into "within radius" totals.
+
+    supply = competitive_supply(combined_hotel_df, sites_df, radii_m=(400, 800))
+    supply.query("dimension == 'brand' and radius_m == 800")
+"""
+
+import numpy as np
+import pandas as pd
+
+from app.backend.spatial import HotelIndex
+
+DEFAULT_RADII_M = (400, 800, 1600)
+DEFAULT_DIMENSIONS = ("brand", "scale", "stars")
+# sites per pass, bounds the memory taken by the (site, hotel) pairs
+DEFAULT_CHUNK_SIZE = 2000
+SUPPLY_COLUMNS = [
+    "site",
+    "radius_m",
+    "dimension",
+    "value",
+    "hotels",
+    "rooms",
+    "room_share",
+]
+
+
+def star_class(star_rating):
+    # SerpAPI's hotel_class ("4-star hotel") as a number, NaN when missing
+    return pd.to_numeric(
+        star_rating.astype("string").str.extract(r"(\d)", expand=False),
+        errors="coerce",
+    )
+
+
+def supply_categories(hotel_df, dimensions=DEFAULT_DIMENSIONS):
+    """{dimension: (codes per hotel, category labels)}; "total" has a single
+    category that every hotel belongs to."""
+    categories = {"total": (np.zeros(len(hotel_df), dtype=np.intp), np.array(["All"]))}
+    for dimension in dimensions:
+        if dimension == "stars":
+            values = star_class(hotel_df["star_rating"]).astype("Int64").astype(str)
+            values = values.replace("<NA>", "Unknown")
+        else:
+            values = hotel_df[dimension].fillna("Unknown").astype(str)
+        codes, labels = pd.factorize(values, sort=True)
+        categories[dimension] = (codes, np.asarray(labels))
+    return categories
+
+
+def segment_totals(site, ring, codes, rooms, num_sites, num_rings, num_codes):
+    # hotels and rooms per (site, ring, category), then summed over the rings
+    # so each radius includes every smaller one
+    key = (site * num_rings + ring) * num_codes + codes
+    size = num_sites * num_rings * num_codes
+    shape = (num_sites, num_rings, num_codes)
+    hotels = np.bincount(key, minlength=size).reshape(shape).cumsum(axis=1)
+    room_totals = (
+        np.bincount(key, weights=rooms, minlength=size).reshape(shape).cumsum(axis=1)
+    )
+    return hotels, room_totals
+
+
+def competitive_supply(
+    hotel_df,
+    sites_df,
+    radii_m=DEFAULT_RADII_M,
+    dimensions=DEFAULT_DIMENSIONS,
+    index=None,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+):
+    """Tidy supply table: one row per site, radius, dimension and value.
+
+    `sites_df` needs latitude/longitude columns; its index identifies the
+    sites in the `site` column. The "total" dimension has a row for every
+    site and radius, even with no hotels; the breakdowns only list values
+    that are present. room_share is the value's share of the rooms within
+    that radius. Pass a prebuilt HotelIndex over hotel_df to reuse it."""
+    hotel_df = hotel_df.reset_index(drop=True)
+    if index is None:
+        index = HotelIndex(hotel_df)
+    radii = np.sort(np.asarray(radii_m, dtype=float))
+    rooms = hotel_df["total_num_of_rooms"].fillna(0).to_numpy(dtype=float)
+    categories = supply_categories(hotel_df, dimensions)
+    site_lat = sites_df["latitude"].to_numpy(dtype=float)
+    site_lon = sites_df["longitude"].to_numpy(dtype=float)
+
+    frames = []
+    for start in range(0, len(sites_df), chunk_size):
+        stop = min(start + chunk_size, len(sites_df))
+        site, hotel, meters = index.within_radius_pairs(
+            site_lat[start:stop], site_lon[start:stop], radii[-1], ordered=False
+        )
+        ring = np.searchsorted(radii, meters, side="left")
+        pair_rooms = rooms[hotel]
+        totals = None
+        for dimension, (codes, labels) in categories.items():
+            hotels, room_totals = segment_totals(
+                site,
+                ring,
+                codes[hotel],
+                pair_rooms,
+                stop - start,
+                len(radii),
+                len(labels),
+            )
+            if totals is None:
+                # the "total" dimension comes first and keeps its zero rows
+                totals = room_totals[:, :, 0]
+                s, r, c = np.indices(hotels.shape).reshape(3, -1)
+            else:
+                s, r, c = np.nonzero(hotels)
+            site_rooms = totals[s, r]
+            frames.append(
+                pd.DataFrame(
+                    {
+                        "site": sites_df.index.to_numpy()[start + s],
+                        "radius_m": radii[r],
+                        "dimension": dimension,
+                        "value": labels[c],
+                        "hotels": hotels[s, r, c],
+                        "rooms": room_totals[s, r, c],
+                        "room_share": np.divide(
+                            room_totals[s, r, c],
+                            site_rooms,
+                            out=np.zeros(len(s)),
+                            where=site_rooms > 0,
+                        ),
+                    }
+                )
+            )
+    if not frames:
+        return pd.DataFrame(columns=SUPPLY_COLUMNS)
+    return pd.concat(frames, ignore_index=True)[SUPPLY_COLUMNS]
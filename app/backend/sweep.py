@@ -0,0 +1,283 @@
+"""Multi-area hotel discovery sweeps.
+
+A sweep runs one SerpAPI hotel search per (area, stay dates) task on a
+worker pool that shares a global rate limit. Areas are free-text queries,
+or the tile centres of a bounding box. Properties found by overlapping
+queries are deduplicated by SerpAPI property token, falling back to name
+plus rounded coordinates.
+
+Progress is checkpointed in SQLite: a task's hotels and its "done" status
+are written in one transaction, so re-running a sweep with the same id
+after a crash only runs the tasks that had not finished.
+
+    python -m app.backend.sweep --sweep-id midtown \\
+        --areas "Times Square New York" "Chelsea New York" \\
+        --start 2024-06-01 --end 2024-06-03
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+from dotenv import find_dotenv, load_dotenv
+
+from app.backend.entity_resolution import normalize_name
+from app.backend.ratelimit import AdaptiveLimiter
+from app.backend.search import concat_hotel_pages, get_output_path, iter_hotel_pages
+from app.backend.sqlite_store import SQLiteStore
+
+load_dotenv(find_dotenv())
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHECKPOINT_PATH = os.getenv("SWEEP_CHECKPOINT_PATH", "data/sweeps.sqlite")
+# SerpAPI requests per second across all workers
+DEFAULT_RATE = float(os.getenv("SERPAPI_RATE", "2"))
+
+
+def stay_dates(start, end, nights=1, every_days=1):
+    """(check_in, check_out) ISO date pairs for check-ins from start to end."""
+    start, end = date.fromisoformat(str(start)), date.fromisoformat(str(end))
+    stays = []
+    check_in = start
+    while check_in <= end:
+        check_out = check_in + timedelta(days=nights)
+        stays.append((check_in.isoformat(), check_out.isoformat()))
+        check_in += timedelta(days=every_days)
+    return stays
+
+
+def tile_bbox(south, west, north, east, rows, cols):
+    # centres of a rows x cols grid over the bounding box
+    lat_step, lon_step = (north - south) / rows, (east - west) / cols
+    return [
+        (south + (row + 0.5) * lat_step, west + (col + 0.5) * lon_step)
+        for row in range(rows)
+        for col in range(cols)
+    ]
+
+
+def tile_queries(south, west, north, east, rows, cols):
+    return [
+        f"Hotels near {lat:.5f}, {lon:.5f}"
+        for lat, lon in tile_bbox(south, west, north, east, rows, cols)
+    ]
+
+
+def sweep_tasks(queries, stays):
+    tasks = []
+    for query in queries:
+        for check_in_date, check_out_date in stays:
+            task_id = hashlib.sha1(
+                f"{query}|{check_in_date}|{check_out_date}".encode()
+            ).hexdigest()[:16]
+            tasks.append(
+                {
+                    "task_id": task_id,
+                    "query": query,
+                    "check_in_date": check_in_date,
+                    "check_out_date": check_out_date,
+                }
+            )
+    return tasks
+
+
+def property_keys(hotel_df):
+    # SerpAPI's property token when there is one, else name + ~10m coordinates
+    fallback = (
+        hotel_df["name"].fillna("").map(normalize_name)
+        + "@"
+        + hotel_df["latitude"].round(4).astype(str)
+        + ","
+        + hotel_df["longitude"].round(4).astype(str)
+    )
+    tokens = hotel_df["property_token"]
+    return np.where(tokens.notna(), "token:" + tokens.astype(str), "name:" + fallback)
+
+
+class SweepCheckpoint(SQLiteStore):
+    schema = """
+        CREATE TABLE IF NOT EXISTS sweep_tasks (
+            sweep_id TEXT NOT NULL,
+            task_id TEXT NOT NULL,
+            query TEXT NOT NULL,
+            check_in_date TEXT NOT NULL,
+            check_out_date TEXT NOT NULL,
+            status TEXT NOT NULL,
+            num_hotels INTEGER,
+            error TEXT,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (sweep_id, task_id)
+        );
+        CREATE TABLE IF NOT EXISTS sweep_hotels (
+            sweep_id TEXT NOT NULL,
+            property_key TEXT NOT NULL,
+            task_id TEXT NOT NULL,
+            record TEXT NOT NULL,
+            PRIMARY KEY (sweep_id, property_key)
+        );
+    """
+
+    def add_tasks(self, sweep_id, tasks):
+        self.connect().executemany(
+            "INSERT OR IGNORE INTO sweep_tasks VALUES (?, ?, ?, ?, ?, 'pending', NULL, NULL, ?)",
+            [
+                (
+                    sweep_id,
+                    task["task_id"],
+                    task["query"],
+                    task["check_in_date"],
+                    task["check_out_date"],
+                    time.time(),
+                )
+                for task in tasks
+            ],
+        )
+
+    def pending_tasks(self, sweep_id):
+        rows = self.connect().execute(
+            "SELECT task_id, query, check_in_date, check_out_date FROM sweep_tasks "
+            "WHERE sweep_id = ? AND status != 'done'",
+            (sweep_id,),
+        )
+        columns = ["task_id", "query", "check_in_date", "check_out_date"]
+        return [dict(zip(columns, row)) for row in rows]
+
+    def complete_task(self, sweep_id, task_id, hotel_df):
+        records = hotel_df.assign(property_key=property_keys(hotel_df))
+        conn = self.connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # first task to see a property wins, later duplicates are ignored
+            conn.executemany(
+                "INSERT OR IGNORE INTO sweep_hotels VALUES (?, ?, ?, ?)",
+                [
+                    (sweep_id, record["property_key"], task_id, json.dumps(record))
+                    for record in records.to_dict(orient="records")
+                ],
+            )
+            conn.execute(
+                "UPDATE sweep_tasks SET status = 'done', num_hotels = ?, error = NULL, "
+                "updated_at = ? WHERE sweep_id = ? AND task_id = ?",
+                (len(hotel_df), time.time(), sweep_id, task_id),
+            )
+
+    def fail_task(self, sweep_id, task_id, error):
+        self.connect().execute(
+            "UPDATE sweep_tasks SET status = 'error', error = ?, updated_at = ? "
+            "WHERE sweep_id = ? AND task_id = ?",
+            (str(error), time.time(), sweep_id, task_id),
+        )
+
+    def hotels(self, sweep_id):
+        rows = self.connect().execute(
+            "SELECT record FROM sweep_hotels WHERE sweep_id = ? ORDER BY rowid",
+            (sweep_id,),
+        )
+        return pd.DataFrame([json.loads(record) for (record,) in rows])
+
+    def progress(self, sweep_id):
+        return dict(
+            self.connect().execute(
+                "SELECT status, COUNT(*) FROM sweep_tasks WHERE sweep_id = ? "
+                "GROUP BY status",
+                (sweep_id,),
+            )
+        )
+
+
+def run_task(task, api_key, limiter):
+    pages = iter_hotel_pages(
+        task["query"],
+        api_key,
+        task["check_in_date"],
+        task["check_out_date"],
+        limiter=limiter,
+    )
+    # an area without hotels is done too, with 0 of them
+    hotel_df = concat_hotel_pages(pages)
+    return hotel_df.assign(
+        sweep_query=task["query"],
+        check_in_date=task["check_in_date"],
+        check_out_date=task["check_out_date"],
+    )
+
+
+def run_sweep(
+    sweep_id,
+    queries,
+    stays,
+    api_key,
+    workers=4,
+    rate=DEFAULT_RATE,
+    checkpoint=None,
+):
+    """Run (or resume) a sweep and return its deduplicated hotels."""
+    checkpoint = checkpoint or SweepCheckpoint(DEFAULT_CHECKPOINT_PATH)
+    checkpoint.add_tasks(sweep_id, sweep_tasks(queries, stays))
+    pending = checkpoint.pending_tasks(sweep_id)
+    logger.info(f"Sweep {sweep_id}: {len(pending)} tasks to run")
+
+    # starts at `rate` per second and backs off when SerpAPI answers 429
+    limiter = AdaptiveLimiter(rpm=rate * 60)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(run_task, task, api_key, limiter): task for task in pending
+        }
+        for future in as_completed(futures):
+            task = futures[future]
+            try:
+                checkpoint.complete_task(sweep_id, task["task_id"], future.result())
+            except Exception as e:
+                logger.warning(f"Error sweeping {task['query']}: {e}", exc_info=True)
+                checkpoint.fail_task(sweep_id, task["task_id"], e)
+
+    print(f"Sweep {sweep_id} task status: {checkpoint.progress(sweep_id)}")
+    return checkpoint.hotels(sweep_id)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sweep-id", required=True)
+    parser.add_argument("--areas", nargs="*", default=[])
+    parser.add_argument(
+        "--bbox",
+        nargs=4,
+        type=float,
+        metavar=("SOUTH", "WEST", "NORTH", "EAST"),
+    )
+    parser.add_argument("--tiles", nargs=2, type=int, default=[3, 3])
+    parser.add_argument("--start", default=None)
+    parser.add_argument("--end", default=None)
+    parser.add_argument("--nights", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE)
+    args = parser.parse_args()
+
+    queries = [f"Hotels in {area}" for area in args.areas]
+    if args.bbox:
+        queries += tile_queries(*args.bbox, *args.tiles)
+    start = args.start or (date.today() + timedelta(days=1)).isoformat()
+    stays = stay_dates(start, args.end or start, nights=args.nights)
+
+    hotel_df = run_sweep(
+        args.sweep_id,
+        queries,
+        stays,
+        os.getenv("SERP_API_KEY"),
+        workers=args.workers,
+        rate=args.rate,
+    )
+    output = get_output_path(f"sweep_{args.sweep_id}.parquet")
+    hotel_df.to_parquet(output, index=False)
+    print(f"Saved {len(hotel_df)} unique hotels to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""Spans around the external calls: SerpAPI, OpenAI, Google CSE, Playwright.
+
+Every span records stage, hotel, duration, outcome (ok, error, cache_hit),
+tokens and cost. It is appended as one JSON line to the event log
+(TELEMETRY_LOG_PATH, empty to disable), added to the Recorder of the
+current run if there is one, and mirrored to OpenTelemetry when the
+opentelemetry package is installed. With no tracer provider configured the
+OpenTelemetry side is a no-op.
+
+    with record_run() as recorder:
+        combined_hotel_df, report = enrich_hotels(hotel_df)
+    recorder.summary()  # calls, errors, p50/p95/p99 ms, tokens, cost per stage
+
+    python -m app.backend.telemetry data/events.jsonl --run <run_id>
+"""
+
+import argparse
+import contextlib
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    from opentelemetry import trace
+except ImportError:
+    trace = None
+
+DEFAULT_LOG_PATH = os.getenv("TELEMETRY_LOG_PATH", "data/events.jsonl")
+# completion tokens expected of one structured answer, before it comes back
+DEFAULT_COMPLETION_TOKENS = int(os.getenv("LLM_COMPLETION_TOKENS", "60"))
+# USD per 1k (prompt, completion) tokens
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4o": (0.005, 0.015),
+    "gpt-4o-mini": (0.00015, 0.0006),
+}
+PERCENTILES = (50, 95, 99)
+
+_current_recorder = contextvars.ContextVar("telemetry_recorder", default=None)
+_log_lock = threading.Lock()
+_tracer = trace.get_tracer(__name__) if trace is not None else None
+
+
+def call_cost(model, prompt_tokens, completion_tokens):
+    prompt_price, completion_price = MODEL_PRICES.get(model, MODEL_PRICES["gpt-4"])
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+
+def response_usage(response):
+    """(prompt, completion) tokens of an instructor response, None when it
+    came from the LLM cache and cost nothing."""
+    usage = getattr(getattr(response, "_raw_response", None), "usage", None)
+    if usage is None:
+        return None
+    return usage.prompt_tokens, usage.completion_tokens
+
+
+class Recorder:
+    """The spans of one run, kept in memory for the run summary."""
+
+    def __init__(self, run_id=None):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.events = []
+        self._lock = threading.Lock()
+
+    def add(self, event):
+        with self._lock:
+            self.events.append(event)
+
+    def summary(self):
+        with self._lock:
+            events = list(self.events)
+        return summarize(events)
+
+
+def summarize(events):
+    """Per stage: calls, errors, cache hits, p50/p95/p99 latency in ms of the
+    calls that went out, tokens and cost."""
+    columns = ["calls", "errors", "cache_hits"]
+    columns += [f"p{p}_ms" for p in PERCENTILES] + ["tokens", "cost"]
+    if not events:
+        return pd.DataFrame(columns=columns)
+    df = pd.DataFrame(events)
+    rows = {}
+    for stage, group in df.groupby("stage", sort=True):
+        sent = group[group["outcome"] != "cache_hit"]
+        latency = (
+            np.percentile(sent["duration"], PERCENTILES) * 1000
+            if len(sent)
+            else [np.nan] * len(PERCENTILES)
+        )
+        rows[stage] = [
+            len(group),
+            int((group["outcome"] == "error").sum()),
+            int((group["outcome"] == "cache_hit").sum()),
+            *np.round(latency, 1),
+            int(group.get("tokens", pd.Series(dtype=float)).fillna(0).sum()),
+            round(float(group.get("cost", pd.Series(dtype=float)).fillna(0).sum()), 4),
+        ]
+    return pd.DataFrame.from_dict(rows, orient="index", columns=columns)
+
+
+@contextlib.contextmanager
+def record_run(run_id=None, recorder=None):
+    # spans in this context (and threads/tasks started from it with a copy of
+    # the context) are collected on the yielded Recorder
+    recorder = recorder or Recorder(run_id)
+    token = _current_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current_recorder.reset(token)
+
+
+def write_event(event, path=None):
+    path = DEFAULT_LOG_PATH if path is None else path
+    if not path:
+        return
+    line = json.dumps(event, default=str)
+    with _log_lock:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a") as f:
+            f.write(line + "\n")
+
+
+@contextlib.contextmanager
+def span(stage, hotel=None, **attributes):
+    """Time the block as one call. The yielded dict can be updated inside it:
+    outcome="cache_hit", usage=(prompt, completion) tokens, model=..., etc.
+    An exception marks the span as an error and is re-raised."""
+    recorder = _current_recorder.get()
+    event = {"stage": stage, "hotel": hotel, **attributes}
+    otel = (
+        _tracer.start_as_current_span(stage)
+        if _tracer is not None
+        else contextlib.nullcontext()
+    )
+    started = time.time()
+    start = time.perf_counter()
+    with otel as otel_span:
+        try:
+            yield event
+        except BaseException as e:
+            # cancellation is how wait_for times a call out
+            event["outcome"] = "error"
+            event["error"] = repr(e) if str(e) else type(e).__name__
+            raise
+        finally:
+            event["duration"] = time.perf_counter() - start
+            event.setdefault("outcome", "ok")
+            usage = event.pop("usage", None)
+            if usage is not None:
+                event["prompt_tokens"], event["completion_tokens"] = usage
+                event["tokens"] = sum(usage)
+                event["cost"] = call_cost(event.get("model"), *usage)
+            event["ts"] = started
+            event["run_id"] = recorder.run_id if recorder is not None else None
+            if recorder is not None:
+                recorder.add(event)
+            write_event(event)
+            if otel_span is not None:
+                otel_span.set_attributes(
+                    {
+                        key: value
+                        for key, value in event.items()
+                        if isinstance(value, (str, bool, int, float))
+                    }
+                )
+
+
+def read_events(path=DEFAULT_LOG_PATH, run_id=None):
+    events = []
+    with open(path) as f:
+        for line in f:
+            event = json.loads(line)
+            if run_id is None or event.get("run_id") == run_id:
+                events.append(event)
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-stage latency summary")
+    parser.add_argument("path", nargs="?", default=DEFAULT_LOG_PATH)
+    parser.add_argument("--run", help="only this run_id (default: every event)")
+    args = parser.parse_args()
+    with pd.option_context("display.width", 200):
+        print(summarize(read_events(args.path, args.run)))
+
+
+if __name__ == "__main__":
+    main()
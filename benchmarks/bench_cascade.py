@@ -0,0 +1,128 @@
+"""Details on DETAILS_MODEL alone vs the cheap-first DetailsCascade.
+
+Both run over the same fixture set against the fake OpenAI server: the
+recorded Times Square hotels plus synthetic branded and independent names.
+The cheap model answers faster (--cheap-latency) and the stand-in makes it
+wrong or unsure for about one name in four. Per mode it reports the wall
+time, p50/p95 per-hotel latency, requests, cost, which tier each hotel
+ended on, and how many answers match the DETAILS_MODEL-only ones.
+
+python -m benchmarks.bench_cascade --latency 0.6 --cheap-latency 0.2
+"""
+
+import argparse
+import functools
+import itertools
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_prefilter import BRANDED, INDEPENDENT, NEIGHBORHOODS, WORDS
+from benchmarks.fake_openai import RECORDED, start_server
+
+
+def fixture_names():
+    names = list(RECORDED["Hotel"])
+    names += [
+        template.format(n=neighborhood)
+        for template, neighborhood in itertools.product(BRANDED, NEIGHBORHOODS)
+    ]
+    names += [
+        template.format(w=word, n=neighborhood)
+        for template, word, neighborhood in zip(
+            itertools.cycle(INDEPENDENT),
+            itertools.cycle(WORDS),
+            NEIGHBORHOODS * 5,
+        )
+    ]
+    return list(dict.fromkeys(names))
+
+
+async def timed(func, latencies, hotel_name):
+    start = time.perf_counter()
+    result = await func(hotel_name)
+    latencies[hotel_name] = time.perf_counter() - start
+    return result
+
+
+def answer(record):
+    if isinstance(record, Exception):
+        return None
+    return record["brand"], record["subbrand"], record["total_num_of_rooms"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.6)
+    parser.add_argument("--cheap-model", default="gpt-3.5-turbo")
+    parser.add_argument("--cheap-latency", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    server, base_url = start_server(
+        latency=args.latency, model_latency={args.cheap_model: args.cheap_latency}
+    )
+    scratch = tempfile.mkdtemp(prefix="bench-cascade-")
+    os.environ.update(
+        {
+            "OPENAI_BASE_URL": base_url,
+            "OPENAI_API_KEY": "fake",
+            "LLM_CACHE_PATH": os.path.join(scratch, "llm_cache.sqlite"),
+            "TELEMETRY_LOG_PATH": "",
+        }
+    )
+
+    from app.backend.cascade import DetailsCascade
+    from app.backend.llm_async import gather_in_order, run_sync
+    from app.backend.llm_cache import get_llm_cache
+    from app.backend.search import DETAILS_MODEL
+    from app.backend.telemetry import record_run
+
+    names = fixture_names()
+    reference = None
+    for mode, tiers in (
+        ("single", [DETAILS_MODEL]),
+        ("cascade", [args.cheap_model, DETAILS_MODEL]),
+    ):
+        # escalated hotels would otherwise hit the single-model answers
+        get_llm_cache().clear()
+        cascade = DetailsCascade(tiers=tiers, overrides={})
+        latencies = {}
+        server.requests = 0
+        start = time.perf_counter()
+        with record_run() as recorder:
+            records = run_sync(
+                gather_in_order(
+                    functools.partial(timed, cascade.adetails_record, latencies),
+                    names,
+                    concurrency=args.concurrency,
+                    timeout=None,
+                    max_retries=0,
+                    progress=False,
+                )
+            )
+        elapsed = time.perf_counter() - start
+        answers = [answer(record) for record in records]
+        if reference is None:
+            reference = answers
+        p50, p95 = np.percentile(list(latencies.values()), [50, 95]) * 1000
+        failed = sum(a is None for a in answers)
+        both = [(a, r) for a, r in zip(answers, reference) if r is not None]
+        correct = sum(a == r for a, r in both)
+        tiers_used = {
+            model: counts.get("accepted", 0)
+            for model, counts in cascade.stats().items()
+        }
+        print(
+            f"{mode:<8} names={len(names)} wall={elapsed:6.2f}s "
+            f"p50={p50:6.1f}ms p95={p95:6.1f}ms requests={server.requests} "
+            f"cost=${recorder.summary()['cost'].sum():.4f} failed={failed} "
+            f"match={correct}/{len(both)} accepted_by={tiers_used}"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
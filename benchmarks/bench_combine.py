@@ -0,0 +1,107 @@
+"""Scaling of combine_hotel_data on synthetic listings x details frames.
+
+python -m benchmarks.bench_combine --sizes 1000 10000 100000 1000000
+
+The original row-by-row implementation is kept here as a reference: its
+output is compared with the merge-based one on the small sizes, and its
+timing is reported up to --legacy-max rows.
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+
+def legacy_combine_hotel_data(hotel_df, hotel_details_df):
+    all_names = hotel_df.name.to_list()
+    output = []
+    for index, row in hotel_details_df.iterrows():
+        hotel_name = [name for name in all_names if row["name"] == name]
+        if len(hotel_name) == 0:
+            continue
+        matched_row = hotel_df[hotel_df["name"] == hotel_name[0]].iloc[0]
+        output.append(
+            {
+                "name": matched_row["name"],
+                "latitude": matched_row["latitude"],
+                "longitude": matched_row["longitude"],
+                "link": matched_row["link"],
+                "star_rating": matched_row["hotel_class"],
+                "brand": row["brand"],
+                "scale": row["subbrand"],
+                "total_num_of_rooms": row["total_num_of_rooms"],
+            }
+        )
+    return (
+        pd.DataFrame(output)
+        .drop_duplicates(subset=["name"], keep="first")
+        .dropna(subset=["latitude", "longitude", "name"])
+    )
+
+
+def synthetic_frames(size, seed=0):
+    rng = np.random.default_rng(seed)
+    # ~10% of names repeat and ~10% of details have no listing
+    listing_ids = rng.integers(0, int(size * 0.9), size)
+    latitude = 40.7 + rng.random(size) * 0.1
+    latitude[rng.random(size) < 0.02] = np.nan
+    hotel_df = pd.DataFrame(
+        {
+            "name": [f"Hotel {i}" for i in listing_ids],
+            "description": None,
+            "latitude": latitude,
+            "longitude": -74.0 + rng.random(size) * 0.1,
+            "link": [f"https://example.com/{i}" for i in range(size)],
+            "hotel_class": rng.choice(["3-star hotel", "4-star hotel", None], size),
+        }
+    )
+    detail_ids = rng.integers(0, size, size)
+    hotel_details_df = pd.DataFrame(
+        {
+            "name": [f"Hotel {i}" for i in detail_ids],
+            "brand": rng.choice(["Hilton Worldwide", "Independent", None], size),
+            "subbrand": rng.choice(["Luxury", "Midscale", None], size),
+            "total_num_of_rooms": rng.integers(10, 2000, size),
+        }
+    )
+    return hotel_df, hotel_details_df
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1000, 10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--legacy-max", type=int, default=2000)
+    args = parser.parse_args()
+
+    from app.backend.search import combine_hotel_data
+
+    # bypass st.cache_data so every run is timed
+    combine = combine_hotel_data.__wrapped__
+
+    for size in args.sizes:
+        hotel_df, hotel_details_df = synthetic_frames(size)
+        start = time.perf_counter()
+        combined = combine(hotel_df, hotel_details_df)
+        elapsed = time.perf_counter() - start
+        line = (
+            f"rows={size:>9,} merge={elapsed:8.3f}s "
+            f"({elapsed / size * 1e6:6.2f}us/row) out={len(combined):,}"
+        )
+        if size <= args.legacy_max:
+            start = time.perf_counter()
+            expected = legacy_combine_hotel_data(hotel_df, hotel_details_df)
+            line += f" legacy={time.perf_counter() - start:8.3f}s"
+            pd.testing.assert_frame_equal(
+                combined.reset_index(drop=True),
+                expected.reset_index(drop=True),
+                check_dtype=False,
+            )
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
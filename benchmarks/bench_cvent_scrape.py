@@ -0,0 +1,72 @@
+"""Cvent scraping throughput against the static stand-in (needs Chromium:
+`playwright install chromium`).
+
+python -m benchmarks.bench_cvent_scrape --pages 100 --latency 0.3
+"""
+
+import argparse
+import time
+
+from benchmarks.fake_cvent import start_server, total_guest_rooms, venue_url
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 16])
+    parser.add_argument("--legacy-pages", type=int, default=10)
+    args = parser.parse_args()
+
+    from app.backend.browser_pool import BLOCKED_RESOURCE_TYPES, BrowserPool
+    from app.backend.llm_async import run_sync
+    from app.backend.scrape_cvent import (
+        get_guest_room_info_cvent,
+        parse_total_guest_rooms,
+        scrape_guest_room_info,
+    )
+
+    server, base_url = start_server(latency=args.latency)
+    slugs = [f"bench-hotel-{i}" for i in range(args.pages)]
+    urls = [venue_url(base_url, slug) for slug in slugs]
+
+    def check(slugs, results):
+        for slug, result in zip(slugs, results):
+            assert not isinstance(result, Exception), result
+            assert parse_total_guest_rooms("\n".join(result)) == total_guest_rooms(
+                slug
+            ), f"wrong room count for {slug}"
+
+    def report(label, pages, elapsed):
+        print(
+            f"{label:<28} pages={pages:>4} wall={elapsed:6.2f}s "
+            f"pages/min={60 * pages / elapsed:7.1f} "
+            f"page_requests={server.page_requests} "
+            f"asset_requests={server.asset_requests}"
+        )
+        server.page_requests = server.asset_requests = 0
+
+    # the per-url entry point: the shared browser, one url at a time
+    start = time.perf_counter()
+    results = [get_guest_room_info_cvent(url) for url in urls[: args.legacy_pages]]
+    check(slugs, results)
+    report("shared pool, one by one", len(results), time.perf_counter() - start)
+
+    async def scrape_all(concurrency, blocked):
+        async with BrowserPool(
+            concurrency=concurrency, blocked_resource_types=blocked
+        ) as pool:
+            return await pool.map(scrape_guest_room_info, urls, progress=False)
+
+    for blocked in (frozenset(), BLOCKED_RESOURCE_TYPES):
+        for concurrency in args.concurrency:
+            start = time.perf_counter()
+            results = run_sync(scrape_all(concurrency, blocked))
+            check(slugs, results)
+            label = f"pool c={concurrency} block={'on' if blocked else 'off'}"
+            report(label, len(results), time.perf_counter() - start)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
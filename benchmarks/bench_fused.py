@@ -0,0 +1,137 @@
+"""Two-stage (legitimacy, then details) vs fused enrichment on the fixture set.
+
+Every name goes through both modes against the fake OpenAI server: the
+recorded Times Square hotels plus listing blurbs that aren't hotels. Per
+mode it reports the wall time, p50/p95 latency of the names that needed the
+LLM (from the first call to the last), requests, tokens
+and how many answers agree with the two-stage ones. Like the pipeline,
+both modes skip the LLM for names the pre-filter decides (--no-prefilter
+sends everything).
+
+python -m benchmarks.bench_fused --latency 0.2 --copies 5
+"""
+
+import argparse
+import functools
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.bench_prefilter import BLURBS, NEIGHBORHOODS
+from benchmarks.fake_openai import RECORDED, start_server
+
+
+def fixture_names(copies):
+    # the recorded hotels first, then as many non-hotels as there are hotels
+    hotels = list(RECORDED["Hotel"])
+    blurbs = [
+        blurb.format(n=neighborhood)
+        for blurb in BLURBS
+        for neighborhood in NEIGHBORHOODS
+    ][: len(hotels)]
+    names = hotels + blurbs
+    # suffixed copies so each one misses the LLM cache
+    return names + [f"{name} #{i}" for i in range(1, copies) for name in names]
+
+
+async def timed(func, latencies, hotel_name):
+    start = time.perf_counter()
+    result = await func(hotel_name)
+    latencies[hotel_name] = time.perf_counter() - start
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--copies", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--no-prefilter", action="store_true")
+    args = parser.parse_args()
+
+    server, base_url = start_server(latency=args.latency)
+    scratch = tempfile.mkdtemp(prefix="bench-fused-")
+    os.environ.update(
+        {
+            "OPENAI_BASE_URL": base_url,
+            "OPENAI_API_KEY": "fake",
+            "LLM_CACHE_PATH": os.path.join(scratch, "llm_cache.sqlite"),
+            "TELEMETRY_LOG_PATH": "",
+        }
+    )
+
+    from app.backend.llm_async import gather_in_order, run_sync
+    from app.backend.search import (
+        aget_hotel_details_from_md_gpt4,
+        aget_hotel_enrichment,
+        aget_hotel_name_legitimacy,
+        get_name_prefilter,
+        parse_hotel_enrichment,
+        parse_hotel_pydantic_object,
+    )
+
+    names = fixture_names(args.copies)
+    if args.no_prefilter:
+        decisions = dict.fromkeys(names)
+    else:
+        decisions = dict(zip(names, get_name_prefilter().decide_many(names)[0]))
+
+    async def two_stage(hotel_name):
+        is_legit_name = decisions[hotel_name]
+        if is_legit_name is None:
+            legit = await aget_hotel_name_legitimacy(hotel_name)
+            is_legit_name = legit.is_legit_name
+        if not is_legit_name:
+            return {"is_legit_name": False, "details": None}
+        hotel = await aget_hotel_details_from_md_gpt4(hotel_name)
+        return {"is_legit_name": True, "details": parse_hotel_pydantic_object(hotel)}
+
+    async def fused(hotel_name):
+        if decisions[hotel_name] is False:
+            return {"is_legit_name": False, "details": None}
+        answer = await aget_hotel_enrichment(hotel_name)
+        return parse_hotel_enrichment(answer, decisions[hotel_name])
+
+    answers = {}
+    for mode, func in (("two-stage", two_stage), ("fused", fused)):
+        latencies = {}
+        server.requests = server.prompt_tokens = server.completion_tokens = 0
+        start = time.perf_counter()
+        results = run_sync(
+            gather_in_order(
+                functools.partial(timed, func, latencies),
+                names,
+                concurrency=args.concurrency,
+            )
+        )
+        elapsed = time.perf_counter() - start
+        answers[mode] = results
+        asked = [
+            latencies[name]
+            for name in names
+            if decisions[name] is not False and name in latencies
+        ]
+        p50, p95 = np.percentile(asked, [50, 95]) * 1000
+        failed = sum(isinstance(result, Exception) for result in results)
+        # over the names both modes answered
+        both = [
+            (result, reference)
+            for result, reference in zip(results, answers["two-stage"])
+            if not isinstance(result, Exception)
+            and not isinstance(reference, Exception)
+        ]
+        agree = sum(result == reference for result, reference in both)
+        print(
+            f"{mode:<9} names={len(names)} wall={elapsed:6.2f}s "
+            f"p50={p50:6.1f}ms p95={p95:6.1f}ms requests={server.requests} "
+            f"prompt_tokens={server.prompt_tokens} "
+            f"completion_tokens={server.completion_tokens} "
+            f"failed={failed} agree={agree}/{len(both)}"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
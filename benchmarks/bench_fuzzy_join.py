@@ -0,0 +1,71 @@
+"""Fuzzy name join of N listings against N rewritten detail records.
+
+python -m benchmarks.bench_fuzzy_join --sizes 1000 10000 50000
+"""
+
+import argparse
+import random
+import time
+
+SYLLABLES = ["ka", "lo", "mi", "ser", "ton", "vil", "ra", "ne", "dor", "ash", "bel"]
+PREFIXES = ["Hilton", "Hampton Inn", "Hotel", "The", "Courtyard", "Holiday Inn"]
+SUFFIXES = ["New York", "NYC", "Midtown", "Times Square", "Suites", "Hotel"]
+
+
+def word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(3)).title()
+
+
+def rewrite(name, rng):
+    # the kinds of edits the LLM makes: reorder, abbreviate, drop a word, typo
+    tokens = name.split()
+    edit = rng.random()
+    if edit < 0.3:
+        rng.shuffle(tokens)
+    elif edit < 0.5:
+        tokens = ["NY" if t == "York" else t for t in tokens if t != "New"]
+    elif edit < 0.7 and len(tokens) > 3:
+        tokens.pop(rng.randrange(len(tokens)))
+    elif edit < 0.85:
+        i = rng.randrange(len(tokens))
+        tokens[i] = tokens[i][:-1] or tokens[i]
+    return " ".join(tokens)
+
+
+def synthetic_names(size, seed=0):
+    rng = random.Random(seed)
+    listings = [
+        f"{rng.choice(PREFIXES)} {word(rng)} {word(rng)} {rng.choice(SUFFIXES)}"
+        for _ in range(size)
+    ]
+    details = [rewrite(name, rng) for name in listings]
+    order = list(range(size))
+    rng.shuffle(order)
+    return listings, [details[i] for i in order], order
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10_000, 50_000])
+    parser.add_argument("--threshold", type=int, default=85)
+    args = parser.parse_args()
+
+    from app.backend.entity_resolution import match_names
+
+    for size in args.sizes:
+        listings, details, truth = synthetic_names(size)
+        start = time.perf_counter()
+        details_pos, listing_pos, _ = match_names(
+            details, listings, threshold=args.threshold
+        )
+        elapsed = time.perf_counter() - start
+        correct = sum(truth[d] == l for d, l in zip(details_pos, listing_pos))
+        print(
+            f"listings={size:>7,} details={size:>7,} time={elapsed:6.2f}s "
+            f"matched={len(details_pos) / size:.1%} "
+            f"precision={correct / max(len(details_pos), 1):.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
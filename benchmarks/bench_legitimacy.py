@@ -0,0 +1,72 @@
+"""Wall-clock time of the legitimacy stage against the fake OpenAI server.
+
+python -m benchmarks.bench_legitimacy --rows 200 --latency 0.2
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.fake_openai import start_server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--batched", action="store_true")
+    args = parser.parse_args()
+
+    server, base_url = start_server(latency=args.latency)
+    # a scratch cache, so clearing it between runs leaves data/ alone
+    scratch = tempfile.mkdtemp(prefix="bench-legitimacy-")
+    os.environ.update(
+        {
+            "OPENAI_BASE_URL": base_url,
+            "OPENAI_API_KEY": "fake",
+            "LLM_CACHE_PATH": os.path.join(scratch, "llm_cache.sqlite"),
+            "SERP_CACHE_PATH": os.path.join(scratch, "serp_cache.sqlite"),
+            "TELEMETRY_LOG_PATH": "",
+        }
+    )
+
+    from app.backend.llm_cache import get_llm_cache
+    from app.backend.search import (
+        aclassify_hotel_names,
+        aclassify_hotel_names_batched,
+        run_sync,
+    )
+
+    classify = aclassify_hotel_names_batched if args.batched else aclassify_hotel_names
+
+    names = [f"Hotel Number {i}" for i in range(args.rows)]
+    names[::7] = [
+        f"Located In Midtown! Trendy Bars, Pet-friendly #{i}"
+        for i in range(len(names[::7]))
+    ]
+    hotel_df = pd.DataFrame({"name": names})
+
+    for concurrency in args.concurrency:
+        # measure the API path, not the disk cache
+        get_llm_cache().clear()
+        start = time.perf_counter()
+        results = run_sync(
+            classify(hotel_df["name"].to_list(), concurrency=concurrency)
+        )
+        elapsed = time.perf_counter() - start
+        assert [r.name for r in results] == names, "results out of order"
+        print(
+            f"rows={args.rows} concurrency={concurrency:>3} batched={args.batched} "
+            f"wall={elapsed:6.2f}s requests={server.requests} "
+            f"prompt_tokens={server.prompt_tokens}"
+        )
+        server.requests = server.prompt_tokens = 0
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
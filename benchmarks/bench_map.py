@@ -0,0 +1,92 @@
+"""Build time and html size of the hotel map: one CircleMarker per hotel,
+the single GeoJSON layer, city-wide clusters, and a zoomed-in viewport.
+
+python -m benchmarks.bench_map --rows 1000 10000 100000
+"""
+
+import argparse
+import time
+
+import folium
+import numpy as np
+import pandas as pd
+
+from app.backend.maps import colors, get_map
+
+# roughly what st_folium reports around Times Square at zoom 17
+VIEWPORT = {
+    "_southWest": {"lat": 40.7545, "lng": -73.9915},
+    "_northEast": {"lat": 40.7615, "lng": -73.9795},
+}
+
+
+def synthetic_hotels(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    brands = np.array(list(colors))
+    brand = rng.choice(brands, rows)
+    return pd.DataFrame(
+        {
+            "name": [f"Synthetic Hotel {i}" for i in range(rows)],
+            "latitude": 40.70 + rng.random(rows) * 0.12,
+            "longitude": -74.02 + rng.random(rows) * 0.08,
+            "brand": brand,
+            "color": pd.Series(brand).map(colors),
+            "total_num_of_rooms": rng.integers(20, 2000, rows),
+        }
+    )
+
+
+def legacy_get_map(hotels_df):
+    # the per-row loop get_map used before the GeoJSON layer
+    hotels_df = hotels_df[hotels_df["total_num_of_rooms"] > 0].copy()
+    hotels_df["total_num_of_rooms_normalized"] = (
+        hotels_df["total_num_of_rooms"] - hotels_df["total_num_of_rooms"].min()
+    ) / (
+        hotels_df["total_num_of_rooms"].max() - hotels_df["total_num_of_rooms"].min()
+    ) * 9 + 1
+    map_obj = folium.Map(
+        location=[40.7580, -73.9855], zoom_start=15, tiles="CartoDB positron"
+    )
+    for idx, row in hotels_df.iterrows():
+        folium.CircleMarker(
+            location=[row["latitude"], row["longitude"]],
+            radius=row["total_num_of_rooms_normalized"],
+            popup=f"{row['name']}<br>Rooms: {row['total_num_of_rooms']}",
+            color=row["color"],
+            fill=True,
+        ).add_to(map_obj)
+    return map_obj
+
+
+def measure(build, hotel_df):
+    start = time.perf_counter()
+    html = build(hotel_df).get_root().render()
+    return time.perf_counter() - start, len(html.encode())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    # the per-marker path takes minutes at 100k
+    parser.add_argument("--legacy-max-rows", type=int, default=10000)
+    args = parser.parse_args()
+
+    for rows in args.rows:
+        hotel_df = synthetic_hotels(rows)
+        builds = {
+            "geojson": lambda df: get_map(df, mode="markers"),
+            "clusters z=13": lambda df: get_map(df, zoom=13, mode="clusters"),
+            "viewport z=17": lambda df: get_map(df, bounds=VIEWPORT, zoom=17),
+        }
+        if rows <= args.legacy_max_rows:
+            builds["circle markers"] = legacy_get_map
+        for label, build in builds.items():
+            elapsed, size = measure(build, hotel_df)
+            print(
+                f"rows={rows:>7} {label:<15} build+render={elapsed:7.2f}s "
+                f"html={size / 1e6:7.2f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
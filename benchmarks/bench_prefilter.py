@@ -0,0 +1,103 @@
+"""Throughput and short-circuit rate of the name pre-filter on a synthetic corpus.
+
+python -m benchmarks.bench_prefilter --names 100000
+"""
+
+import argparse
+import random
+import time
+
+NEIGHBORHOODS = [
+    "Times Square",
+    "Midtown",
+    "Chelsea",
+    "SoHo",
+    "Central Park",
+    "Brooklyn",
+    "Financial District",
+    "Hell's Kitchen",
+    "Union Square",
+    "Downtown",
+]
+BRANDED = [
+    "Hilton Garden Inn {n}",
+    "Hampton Inn Manhattan {n}",
+    "Courtyard by Marriott {n}",
+    "The Westin {n}",
+    "Holiday Inn Express {n}",
+    "Hyatt Place New York {n}",
+    "Best Western Plus {n}",
+    "Sheraton New York {n} Hotel",
+    "Fairfield Inn & Suites {n}",
+    "Moxy NYC {n}",
+]
+INDEPENDENT = [
+    "Hotel {w} {n}",
+    "The {w} House",
+    "{w} Hotel New York",
+    "The {w}",
+    "{w} & Co. {n}",
+]
+WORDS = ["Edison", "Knickerbocker", "Pearl", "Iroquois", "Lexington", "Gotham", "Muse"]
+BLURBS = [
+    "Located In {n}! Trendy Bars, Pet-friendly, Close To Broadway!",
+    "A Trip To The Most Vibrant City! Onsite Dining, Pet-friendly, Near {n}!",
+    "Cozy 2 Bedroom Apt w/ Views, Steps to {n}",
+    "Spacious Private Room near {n}, Free Wifi, Sleeps 4!",
+    "Stunning Studio Apartment in the heart of {n}! Great location",
+]
+
+
+def synthetic_corpus(size, seed=0):
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(size):
+        n = rng.choice(NEIGHBORHOODS)
+        kind = rng.random()
+        if kind < 0.35:
+            corpus.append((rng.choice(BRANDED).format(n=n), True))
+        elif kind < 0.65:
+            corpus.append(
+                (rng.choice(INDEPENDENT).format(w=rng.choice(WORDS), n=n), True)
+            )
+        else:
+            corpus.append((rng.choice(BLURBS).format(n=n) + f" #{i}", False))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--names", type=int, default=100_000)
+    args = parser.parse_args()
+
+    from app.backend.search import get_name_prefilter
+
+    start = time.perf_counter()
+    prefilter = get_name_prefilter()
+    build = time.perf_counter() - start
+
+    corpus = synthetic_corpus(args.names)
+    names = [name for name, _ in corpus]
+    start = time.perf_counter()
+    decisions, stats = prefilter.decide_many(names)
+    elapsed = time.perf_counter() - start
+
+    wrong = sum(
+        decision is not None and decision != label
+        for decision, (_, label) in zip(decisions, corpus)
+    )
+    print(f"automaton build: {build * 1000:.1f}ms")
+    print(
+        f"names={stats['total']} time={elapsed:.2f}s "
+        f"({stats['total'] / elapsed:,.0f} names/s)"
+    )
+    print(
+        f"short-circuited={stats['short_circuited']} "
+        f"({stats['short_circuited'] / stats['total']:.1%}) "
+        f"legit={stats['legit']} not_legit={stats['not_legit']} "
+        f"sent_to_llm={stats['sent_to_llm']} wrong_local_decisions={wrong}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Legitimacy stage against a fake OpenAI quota that answers 429s.
+
+"unpaced" is the old path, where a 429 that outlasts the client's retries
+drops the row. "gateway" goes through the LLM gateway, which learns the
+quota from the x-ratelimit-* headers, paces the workers AIMD-style and
+requeues rate-limited rows.
+
+python -m benchmarks.bench_rate_limit --rows 400 --rpm 600 --concurrency 32
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.fake_openai import start_server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--rpm", type=float, default=600)
+    parser.add_argument("--tpm", type=float)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    server, base_url = start_server(latency=args.latency, rpm=args.rpm, tpm=args.tpm)
+    # a scratch cache, so clearing it between runs leaves data/ alone
+    scratch = tempfile.mkdtemp(prefix="bench-rate-limit-")
+    os.environ.update(
+        {
+            "OPENAI_BASE_URL": base_url,
+            "OPENAI_API_KEY": "fake",
+            "LLM_CACHE_PATH": os.path.join(scratch, "llm_cache.sqlite"),
+            "SERP_CACHE_PATH": os.path.join(scratch, "serp_cache.sqlite"),
+            "TELEMETRY_LOG_PATH": "",
+        }
+    )
+
+    import instructor
+    from openai import AsyncOpenAI
+
+    from app.backend.llm_async import gather_in_order, run_sync
+    from app.backend.llm_cache import get_llm_cache
+    from app.backend.llm_gateway import get_llm_gateway
+    from app.backend.search import (
+        LEGIT_MODEL,
+        LEGIT_PROMPT,
+        LegitHotel,
+        aclassify_hotel_names,
+    )
+
+    names = [f"Hotel Number {i}" for i in range(args.rows)]
+
+    async def unpaced(names):
+        client = instructor.patch(AsyncOpenAI())
+
+        async def classify(name):
+            return await client.chat.completions.create(
+                model=LEGIT_MODEL,
+                messages=[
+                    {"role": "user", "content": LEGIT_PROMPT.format(hotel_name=name)}
+                ],
+                response_model=LegitHotel,
+            )
+
+        return await gather_in_order(
+            classify, names, concurrency=args.concurrency, progress=False
+        )
+
+    async def gateway(names):
+        return await aclassify_hotel_names(names, concurrency=args.concurrency)
+
+    for label, classify in (("unpaced", unpaced), ("gateway", gateway)):
+        get_llm_cache().clear()
+        server.requests = server.rate_limited = 0
+        start = time.perf_counter()
+        results = run_sync(classify(names))
+        elapsed = time.perf_counter() - start
+        dropped = sum(isinstance(result, Exception) for result in results)
+        print(
+            f"{label:<8} rows={args.rows} wall={elapsed:6.2f}s "
+            f"ok_rps={server.requests / elapsed:6.2f} "
+            f"quota_rps={args.rpm / 60:6.2f} 429s={server.rate_limited:>5} "
+            f"dropped={dropped}"
+        )
+    print(get_llm_gateway().stats())
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Details through the RoomCountResolver vs the DetailsCascade alone.
+
+A scratch Cvent scrape (--cvent-share of the fixture names) and a few
+manual overrides are written next to a fresh room count store, then the
+fixture names go through the cascade alone, the resolver on the empty
+store and the resolver again on what the first pass remembered. The LLM
+cache is cleared before every pass, so only the resolver can spare a call.
+Per pass it reports the wall time, requests, cost, names sent to the LLM
+and where the room counts came from.
+
+python -m benchmarks.bench_room_counts --latency 0.6 --cvent-share 0.4
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.bench_cascade import fixture_names
+from benchmarks.fake_openai import stable_int, start_server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.6)
+    parser.add_argument("--cvent-share", type=float, default=0.4)
+    parser.add_argument("--overrides", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    server, base_url = start_server(latency=args.latency)
+    scratch = tempfile.mkdtemp(prefix="bench-room-counts-")
+    os.environ.update(
+        {
+            "OPENAI_BASE_URL": base_url,
+            "OPENAI_API_KEY": "fake",
+            "LLM_CACHE_PATH": os.path.join(scratch, "llm_cache.sqlite"),
+            "TELEMETRY_LOG_PATH": "",
+        }
+    )
+
+    from app.backend.cascade import DetailsCascade
+    from app.backend.llm_cache import get_llm_cache
+    from app.backend.room_counts import RoomCountResolver, RoomCountStore, rooms_report
+    from app.backend.search import DETAILS_MODEL
+    from app.backend.telemetry import record_run
+
+    names = fixture_names()
+    scraped = names[: int(len(names) * args.cvent_share)]
+    cvent_path = os.path.join(scratch, "cvent_room_info.parquet")
+    pd.DataFrame(
+        {
+            "hotel": scraped,
+            "total_num_rooms": [20 + stable_int(f"cvent {n}", 980) for n in scraped],
+        }
+    ).to_parquet(cvent_path)
+    overrides_path = os.path.join(scratch, "room_overrides.csv")
+    pd.DataFrame({"name": names[-args.overrides :], "total_num_of_rooms": 100}).to_csv(
+        overrides_path, index=False
+    )
+
+    cascade = DetailsCascade(tiers=[DETAILS_MODEL], overrides={})
+    resolver = RoomCountResolver(
+        RoomCountStore(os.path.join(scratch, "room_counts.sqlite")),
+        cvent_path,
+        overrides_path,
+        cascade.version(),
+    )
+    for mode in ("cascade", "resolver", "repeat"):
+        get_llm_cache().clear()
+        server.requests = 0
+        asked = []
+
+        def fetch(misses, asked=asked):
+            asked.extend(misses)
+            return cascade.details_records(misses, args.concurrency)
+
+        start = time.perf_counter()
+        with record_run() as recorder:
+            if mode == "cascade":
+                records = fetch(names)
+            else:
+                records = resolver.details_records(names, fetch)
+                records = resolver.overlay(records, names)
+        elapsed = time.perf_counter() - start
+        sources = "-"
+        if mode != "cascade":
+            sources = {
+                source: count
+                for source, count in rooms_report(records).items()
+                if count and source != "total"
+            }
+        print(
+            f"{mode:<8} names={len(names)} wall={elapsed:6.2f}s "
+            f"requests={server.requests} cost=${recorder.summary()['cost'].sum():.4f} "
+            f"asked={len(asked)} failed={sum(r is None for r in records)} "
+            f"rooms_source={sources}"
+        )
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
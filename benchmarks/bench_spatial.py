@@ -0,0 +1,90 @@
+"""Spatial index vs brute-force NumPy haversine for radius and k-nearest
+queries, many sites at once.
+
+python -m benchmarks.bench_spatial --hotels 100000 --sites 1000 --radius 800
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.backend.spatial import HotelIndex, haversine
+
+# keep the brute-force distance matrix chunks around 100 MB
+CHUNK_CELLS = 12_000_000
+
+
+def city_hotels(rows, seed=0):
+    # New York-ish spread, dense in the middle like real hotel supply
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(
+        {
+            "latitude": 40.7580 + rng.normal(0, 0.04, rows),
+            "longitude": -73.9855 + rng.normal(0, 0.05, rows),
+        }
+    )
+
+
+def brute_force(hotel_df, site_lat, site_lon, radius_m, k):
+    lat = hotel_df["latitude"].to_numpy()
+    lon = hotel_df["longitude"].to_numpy()
+    chunk = max(1, CHUNK_CELLS // len(lat))
+    within, nearest = [], []
+    for start in range(0, len(site_lat), chunk):
+        distance = haversine(
+            site_lat[start : start + chunk, None],
+            site_lon[start : start + chunk, None],
+            lat[None, :],
+            lon[None, :],
+        )
+        within += [np.flatnonzero(row <= radius_m) for row in distance]
+        top = np.argpartition(distance, k, axis=1)[:, :k]
+        order = np.argsort(np.take_along_axis(distance, top, axis=1), axis=1)
+        nearest.append(np.take_along_axis(top, order, axis=1))
+    return within, np.vstack(nearest)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hotels", type=int, default=100_000)
+    parser.add_argument("--sites", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--radius", type=float, default=800)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    hotel_df = city_hotels(args.hotels)
+    start = time.perf_counter()
+    index = HotelIndex(hotel_df)
+    print(f"hotels={args.hotels} build={time.perf_counter() - start:.3f}s")
+
+    for sites in args.sites:
+        site_df = city_hotels(sites, seed=1)
+        site_lat = site_df["latitude"].to_numpy()
+        site_lon = site_df["longitude"].to_numpy()
+
+        start = time.perf_counter()
+        within = index.within_radius(site_lat, site_lon, args.radius)
+        radius_time = time.perf_counter() - start
+        start = time.perf_counter()
+        _, nearest = index.nearest(site_lat, site_lon, k=args.k)
+        knn_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        expected_within, expected_nearest = brute_force(
+            hotel_df, site_lat, site_lon, args.radius, args.k
+        )
+        brute_time = time.perf_counter() - start
+
+        assert all(map(np.array_equal, within, expected_within)), "radius mismatch"
+        assert np.array_equal(nearest, expected_nearest), "knn mismatch"
+        print(
+            f"sites={sites:>6} radius={radius_time:7.3f}s knn(k={args.k})="
+            f"{knn_time:7.3f}s brute force (both)={brute_time:7.2f}s "
+            f"hotels in radius={sum(map(len, within)) / sites:.0f}/site"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""competitive_supply against the per-site pandas loop it replaces.
+
+python -m benchmarks.bench_supply --hotels 100000 --sites 100 1000 10000
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from app.backend.spatial import haversine
+from app.backend.supply import DEFAULT_RADII_M, competitive_supply, star_class
+from benchmarks.bench_spatial import city_hotels
+
+BRANDS = ["Hilton Worldwide", "Marriott International", "Hyatt Hotels Corporation"]
+SCALES = ["Luxury", "Premium", "Midscale", "Economy", None]
+
+
+def synthetic_supply(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    return city_hotels(rows, seed).assign(
+        name=[f"Hotel {i}" for i in range(rows)],
+        brand=rng.choice(BRANDS + ["Independent"], rows),
+        scale=rng.choice(np.array(SCALES, dtype=object), rows),
+        star_rating=rng.choice(
+            ["2-star hotel", "3-star hotel", "4-star hotel", None], rows
+        ),
+        total_num_of_rooms=rng.integers(10, 1500, rows),
+    )
+
+
+def loop_supply(hotel_df, sites_df, radii_m):
+    # the hand-written version: filter by distance per site and radius
+    hotel_df = hotel_df.assign(stars=star_class(hotel_df["star_rating"]))
+    rows = []
+    for site, site_row in sites_df.iterrows():
+        distance = haversine(
+            site_row["latitude"],
+            site_row["longitude"],
+            hotel_df["latitude"],
+            hotel_df["longitude"],
+        )
+        for radius in radii_m:
+            nearby = hotel_df[distance <= radius]
+            rows.append(
+                (site, radius, "total", "All", nearby["total_num_of_rooms"].sum())
+            )
+            for brand, rooms in (
+                nearby.groupby("brand")["total_num_of_rooms"].sum().items()
+            ):
+                rows.append((site, radius, "brand", brand, rooms))
+    return pd.DataFrame(
+        rows, columns=["site", "radius_m", "dimension", "value", "rooms"]
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hotels", type=int, default=100_000)
+    parser.add_argument("--sites", type=int, nargs="+", default=[100, 1000, 10000])
+    # the loop takes minutes beyond a few hundred sites
+    parser.add_argument("--loop-max-sites", type=int, default=100)
+    args = parser.parse_args()
+
+    hotel_df = synthetic_supply(args.hotels)
+    for sites in args.sites:
+        sites_df = city_hotels(sites, seed=1)
+        start = time.perf_counter()
+        supply = competitive_supply(hotel_df, sites_df)
+        elapsed = time.perf_counter() - start
+        line = f"sites={sites:>6} vectorized={elapsed:7.2f}s rows={len(supply):>8}"
+
+        if sites <= args.loop_max_sites:
+            start = time.perf_counter()
+            expected = loop_supply(hotel_df, sites_df, DEFAULT_RADII_M)
+            line += f" loop={time.perf_counter() - start:7.2f}s"
+            got = supply[supply["dimension"].isin(["total", "brand"])]
+            key = ["site", "radius_m", "dimension", "value"]
+            merged = expected.merge(got, on=key, how="outer", suffixes=("", "_got"))
+            assert np.allclose(merged["rooms"], merged["rooms_got"]), "mismatch"
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
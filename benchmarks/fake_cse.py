@@ -0,0 +1,134 @@
+"""Stand-in for the Google Custom Search JSON API (/customsearch/v1).
+
+Queries with a recorded fixture under benchmarks/fixtures/cse/ (named after
+the slugified `q`) are answered from it. Any other "cvent <hotel>" query
+gets one synthetic result pointing at the fake Cvent venue page for that
+hotel, except for roughly one in five hotels, which have no Cvent page:
+
+    python -m benchmarks.fake_cse --port 8768 --cvent-base-url http://cvent.localhost:8767
+    GOOGLE_CSE_BASE_URL=http://127.0.0.1:8768 GOOGLE_CSE_API_KEY=fake GOOGLE_CSE_ID=bench python ...
+
+    # record a real query into a fixture (uses GOOGLE_CSE_API_KEY/GOOGLE_CSE_ID)
+    python -m benchmarks.fake_cse --record "cvent Paramount Hotel Times Square"
+
+pick_cvent_link only accepts links containing "cvent", so serve the fake
+Cvent pages under a cvent.localhost name; Chromium resolves any *.localhost
+host to the loopback address.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.fake_cvent import venue_url
+from benchmarks.fake_serpapi import slugify
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures" / "cse"
+# share of hotels without a Cvent page
+NO_PAGE_SHARE = 0.2
+
+
+def synthetic_results(query, cvent_base_url):
+    hotel_name = query.removeprefix("cvent ").strip()
+    slug = slugify(hotel_name)
+    results = {
+        "kind": "customsearch#search",
+        "queries": {"request": [{"searchTerms": query}]},
+    }
+    if int(hashlib.sha1(slug.encode()).hexdigest(), 16) % 100 < NO_PAGE_SHARE * 100:
+        return results
+    results["items"] = [
+        {
+            "kind": "customsearch#result",
+            "title": f"{hotel_name} - Venue Details | Cvent",
+            "link": venue_url(cvent_base_url, slug),
+            "displayLink": "www.cvent.com",
+            "snippet": f"Meeting space and guest rooms at {hotel_name}.",
+        }
+    ]
+    return results
+
+
+def load_results(query, cvent_base_url):
+    fixture = FIXTURES_DIR / f"{slugify(query)}.json"
+    if fixture.exists():
+        return json.loads(fixture.read_text())
+    return synthetic_results(query, cvent_base_url)
+
+
+class FakeCSEHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0
+    cvent_base_url = "http://cvent.localhost:8767"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if not url.path.endswith("/customsearch/v1"):
+            self.send_error(404)
+            return
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        time.sleep(self.latency)
+        with self.server.stats_lock:
+            self.server.requests += 1
+        payload = json.dumps(
+            load_results(params.get("q", ""), self.cvent_base_url)
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=0, latency=0.0, cvent_base_url=None):
+    # returns (server, base_url) for GOOGLE_CSE_BASE_URL
+    attributes = {"latency": latency}
+    if cvent_base_url is not None:
+        attributes["cvent_base_url"] = cvent_base_url
+    handler = type("Handler", (FakeCSEHandler,), attributes)
+    ThreadingHTTPServer.request_queue_size = 256
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.stats_lock = threading.Lock()
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def record(query):
+    from app.backend.cse_links import get_cse_service
+
+    service = get_cse_service(os.environ["GOOGLE_CSE_API_KEY"])
+    results = service.cse().list(q=query, cx=os.environ["GOOGLE_CSE_ID"]).execute()
+    FIXTURES_DIR.mkdir(parents=True, exist_ok=True)
+    fixture = FIXTURES_DIR / f"{slugify(query)}.json"
+    fixture.write_text(json.dumps(results, indent=2))
+    print(f"Recorded {len(results.get('items', []))} results into {fixture}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8768)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--cvent-base-url", default=FakeCSEHandler.cvent_base_url)
+    parser.add_argument("--record", metavar="QUERY")
+    args = parser.parse_args()
+    if args.record:
+        record(args.record)
+    else:
+        server, base_url = start_server(args.port, args.latency, args.cvent_base_url)
+        print(f"Fake CSE listening on {base_url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
@@ -0,0 +1,108 @@
+"""Static stand-in for Cvent venue pages.
+
+/venues/<slug>/venue returns a small HTML page with the same "Guest Rooms /
+Total guest rooms N" block the scraper reads, plus a stylesheet, a web font
+and images, so resource blocking shows up in the asset counters. The room
+count is derived from the slug, so results can be checked:
+
+    python -m benchmarks.fake_cvent --port 8767 --latency 0.3
+"""
+
+import argparse
+import hashlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+VENUE_PAGE = """<!doctype html>
+<html>
+<head>
+<title>{name} | Cvent Venue</title>
+<link rel="stylesheet" href="/static/venue.css">
+</head>
+<body>
+<h1>{name}</h1>
+<img src="/static/hero-{slug}.jpg" alt="">
+<img src="/static/gallery-{slug}.jpg" alt="">
+<section id="meeting-space"><h2>Meeting Space</h2><p>Total meeting space 12,000 sq ft</p></section>
+<section id="guest-rooms"><h2>Guest Rooms</h2><div>Total guest rooms<span> {rooms}</span></div></section>
+</body>
+</html>
+"""
+STYLESHEET = b"""@font-face { font-family: Venue; src: url(/static/venue.woff2); }
+body { font-family: Venue, sans-serif; }
+"""
+ASSETS = {
+    ".css": ("text/css", STYLESHEET),
+    ".woff2": ("font/woff2", b"\0" * 20_000),
+    ".jpg": ("image/jpeg", b"\0" * 200_000),
+}
+
+
+def total_guest_rooms(slug):
+    return 50 + int(hashlib.sha1(slug.encode()).hexdigest(), 16) % 950
+
+
+def venue_url(base_url, slug):
+    return f"{base_url}/venues/{slug}/venue"
+
+
+class FakeCventHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        suffix = "." + path.rsplit(".", 1)[-1] if "." in path else ""
+        if suffix in ASSETS:
+            content_type, payload = ASSETS[suffix]
+            counter = "asset_requests"
+        elif path.startswith("/venues/"):
+            time.sleep(self.latency)
+            slug = path.split("/")[2]
+            name = slug.replace("-", " ").title()
+            payload = VENUE_PAGE.format(
+                name=name, slug=slug, rooms=total_guest_rooms(slug)
+            ).encode()
+            content_type = "text/html"
+            counter = "page_requests"
+        else:
+            self.send_error(404)
+            return
+        with self.server.stats_lock:
+            setattr(self.server, counter, getattr(self.server, counter) + 1)
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=0, latency=0.0):
+    # returns (server, base_url)
+    handler = type("Handler", (FakeCventHandler,), {"latency": latency})
+    ThreadingHTTPServer.request_queue_size = 256
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.stats_lock = threading.Lock()
+    server.page_requests = 0
+    server.asset_requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--latency", type=float, default=0.3)
+    args = parser.parse_args()
+    server, base_url = start_server(args.port, args.latency)
+    print(f"Fake Cvent listening on {venue_url(base_url, '<slug>')}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
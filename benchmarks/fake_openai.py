@@ -0,0 +1,326 @@
+"""A tiny local stand-in for the OpenAI chat completions API.
+
+It answers instructor tool calls for the response models used in
+app/backend/search.py with deterministic, made-up payloads after a
+configurable delay, so the LLM stages can be exercised offline. Names with
+a recorded answer in benchmarks/fixtures/openai/*.json (real responses,
+keyed by response model and hotel name) get that answer instead. With
+--rpm/--tpm it enforces a quota like OpenAI's: every response carries
+x-ratelimit-* headers and calls over the quota get a 429 with retry-after.
+--model-latency gives cheaper models their own, shorter delay:
+
+    python -m benchmarks.fake_openai --port 8765 --latency 0.2 --rpm 600
+    python -m benchmarks.fake_openai --model-latency gpt-3.5-turbo=0.08
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake python ...
+"""
+
+import argparse
+import functools
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import ClassVar
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures" / "openai"
+NAME_PATTERN = re.compile(r"<(?:hotel_)?name>\s*(.*?)\s*</(?:hotel_)?name>", re.DOTALL)
+
+
+def stable_int(text, modulo):
+    return int(hashlib.sha1(text.encode()).hexdigest(), 16) % modulo
+
+
+def load_recorded():
+    # {response model: {hotel name: payload}} merged over every fixture file
+    recorded = {}
+    for fixture in sorted(FIXTURES_DIR.glob("*.json")):
+        for tool, answers in json.loads(fixture.read_text()).items():
+            recorded.setdefault(tool, {}).update(answers)
+    return recorded
+
+
+RECORDED = load_recorded()
+
+
+def looks_legit(hotel_name):
+    return "!" not in hotel_name and hotel_name.count(",") < 2
+
+
+def legit_hotel_payload(hotel_names):
+    hotel_name = hotel_names[0]
+    if hotel_name in RECORDED.get("LegitHotel", {}):
+        return RECORDED["LegitHotel"][hotel_name]
+    return {"name": hotel_name, "is_legit_name": looks_legit(hotel_name)}
+
+
+def legit_hotel_batch_payload(hotel_names):
+    return {"hotels": [legit_hotel_payload([hotel_name]) for hotel_name in hotel_names]}
+
+
+@functools.cache
+def catalog_brand(hotel_name):
+    # (brand, level) of a brand or sub-brand in the name, per the catalog the
+    # app itself uses, so synthetic branded names get consistent answers
+    from app.backend.search import get_name_prefilter
+
+    match, _ = get_name_prefilter().scan(hotel_name)
+    if match is None:
+        return "Independent", "Midscale"
+    brand, level = match
+    return brand.value, level or "Premium"
+
+
+def hotel_payload(hotel_names):
+    hotel_name = hotel_names[0]
+    if hotel_name in RECORDED.get("Hotel", {}):
+        return RECORDED["Hotel"][hotel_name]
+    brand, level = catalog_brand(hotel_name)
+    return {
+        "name": hotel_name,
+        "brand": brand,
+        "subbrand": level,
+        "total_num_of_rooms": 20 + stable_int(hotel_name, 980),
+    }
+
+
+def rated_hotel_payload(hotel_names):
+    # a cheaper model (the cascade's lower tiers): the Hotel answer with a
+    # confidence, except that one name in four gets an unsure guess or a
+    # confident mistake of the kinds the cascade checks for
+    payload = {**hotel_payload(hotel_names), "confidence": 0.9}
+    roll = stable_int(f"rated {hotel_names[0]}", 100)
+    if roll < 10:
+        payload["confidence"] = 0.4
+        payload["total_num_of_rooms"] = 20 + stable_int(f"guess {hotel_names[0]}", 980)
+    elif roll < 17:
+        payload["total_num_of_rooms"] = 0
+    elif roll < 25:
+        wrong = "Hilton Worldwide"
+        if payload["brand"] == wrong:
+            wrong = "Marriott International"
+        payload["brand"] = wrong
+    return payload
+
+
+def hotel_enrichment_payload(hotel_names):
+    # the fused call answers what LegitHotel and Hotel would have, together
+    legit = legit_hotel_payload(hotel_names)
+    if not legit["is_legit_name"]:
+        return {
+            "name": legit["name"],
+            "is_legit_name": False,
+            "brand": None,
+            "subbrand": None,
+            "total_num_of_rooms": None,
+        }
+    return {**hotel_payload(hotel_names), "is_legit_name": True}
+
+
+# response model name (the tool instructor asks for) -> payload builder that
+# takes every <name>/<hotel_name> found in the prompt
+RESPONDERS = {
+    "LegitHotel": legit_hotel_payload,
+    "LegitHotelBatch": legit_hotel_batch_payload,
+    "Hotel": hotel_payload,
+    "RatedHotel": rated_hotel_payload,
+    "HotelEnrichment": hotel_enrichment_payload,
+}
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def build_completion(request):
+    tool = request["tools"][0]["function"]["name"]
+    prompt = "\n".join(m["content"] for m in request["messages"])
+    hotel_names = NAME_PATTERN.findall(prompt) or [""]
+    arguments = json.dumps(RESPONDERS[tool](hotel_names))
+    # the function schema is billed as prompt tokens too
+    prompt_tokens = estimate_tokens(prompt + json.dumps(request["tools"]))
+    return {
+        "id": f"chatcmpl-{stable_int(prompt, 10**12)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request["model"],
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": [
+                        {
+                            "id": "call_0",
+                            "type": "function",
+                            "function": {"name": tool, "arguments": arguments},
+                        }
+                    ],
+                },
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": estimate_tokens(arguments),
+            "total_tokens": prompt_tokens + estimate_tokens(arguments),
+        },
+    }
+
+
+class Quota:
+    """Requests and tokens per minute, refilled continuously and enforced
+    over one second's worth (OpenAI quantizes its limits the same way)."""
+
+    def __init__(self, rpm=None, tpm=None):
+        self.limits = {"requests": rpm, "tokens": tpm}
+        self.levels = {name: limit / 60 for name, limit in self.limits.items() if limit}
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        for name in self.levels:
+            rate = self.limits[name] / 60
+            self.levels[name] = min(
+                rate, self.levels[name] + (now - self.updated_at) * rate
+            )
+        self.updated_at = now
+
+    def admit(self, tokens):
+        """Charge one request of `tokens`; returns 0, or the seconds until it
+        would fit when it is over the quota."""
+        cost = {"requests": 1, "tokens": tokens}
+        with self.lock:
+            self._refill()
+            wait = max(
+                [
+                    (min(cost[name], self.limits[name] / 60) - level)
+                    / (self.limits[name] / 60)
+                    for name, level in self.levels.items()
+                ],
+                default=0.0,
+            )
+            if wait > 0:
+                return wait
+            for name in self.levels:
+                self.levels[name] -= cost[name]
+            return 0.0
+
+    def headers(self):
+        with self.lock:
+            self._refill()
+            headers = {}
+            for name, level in self.levels.items():
+                rate = self.limits[name] / 60
+                headers[f"x-ratelimit-limit-{name}"] = str(int(self.limits[name]))
+                headers[f"x-ratelimit-remaining-{name}"] = str(max(0, int(level)))
+                headers[f"x-ratelimit-reset-{name}"] = f"{(rate - level) / rate:.3f}s"
+            return headers
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes; without this Nagle plus
+    # delayed ACKs add ~40ms to every keep-alive response
+    disable_nagle_algorithm = True
+    latency = 0.0
+    # {model: latency} for models that answer faster or slower than latency
+    model_latency: ClassVar[dict] = {}
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        completion = build_completion(json.loads(body))
+        usage = completion["usage"]
+        # like the real API, calls over the quota are turned away right away
+        wait = self.server.quota.admit(usage["total_tokens"])
+        if wait:
+            with self.server.stats_lock:
+                self.server.rate_limited += 1
+            self.respond(
+                429,
+                {
+                    "error": {
+                        "message": "Rate limit reached, please try again later.",
+                        "type": "requests",
+                        "code": "rate_limit_exceeded",
+                    }
+                },
+                {"retry-after-ms": str(int(wait * 1000))},
+            )
+            return
+        time.sleep(self.model_latency.get(completion["model"], self.latency))
+        with self.server.stats_lock:
+            self.server.requests += 1
+            self.server.prompt_tokens += usage["prompt_tokens"]
+            self.server.completion_tokens += usage["completion_tokens"]
+        self.respond(200, completion)
+
+    def respond(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in {**self.server.quota.headers(), **(headers or {})}.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def parse_model_latency(items):
+    # ["gpt-3.5-turbo=0.08", ...] -> {"gpt-3.5-turbo": 0.08}
+    return {
+        model: float(latency)
+        for model, _, latency in (item.partition("=") for item in items)
+    }
+
+
+def start_server(port=0, latency=0.0, rpm=None, tpm=None, model_latency=None):
+    # returns (server, base_url); the server runs on a daemon thread
+    handler = type(
+        "Handler",
+        (FakeOpenAIHandler,),
+        {"latency": latency, "model_latency": model_latency or {}},
+    )
+    # the default listen backlog of 5 makes concurrent clients see refused
+    # connections, which the openai client then quietly retries
+    ThreadingHTTPServer.request_queue_size = 256
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    # running totals so benchmarks can report request and token counts
+    server.stats_lock = threading.Lock()
+    server.requests = server.prompt_tokens = server.completion_tokens = 0
+    server.rate_limited = 0
+    server.quota = Quota(rpm, tpm)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--rpm", type=float, help="requests per minute quota")
+    parser.add_argument("--tpm", type=float, help="tokens per minute quota")
+    parser.add_argument(
+        "--model-latency", nargs="*", default=[], metavar="MODEL=SECONDS"
+    )
+    args = parser.parse_args()
+    server, base_url = start_server(
+        args.port,
+        args.latency,
+        args.rpm,
+        args.tpm,
+        parse_model_latency(args.model_latency),
+    )
+    print(f"Fake OpenAI listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
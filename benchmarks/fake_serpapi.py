@@ -0,0 +1,157 @@
+"""Replay server standing in for SerpAPI's /search endpoint.
+
+Queries with a recorded fixture directory under benchmarks/fixtures/serpapi/
+(named after the slugified `q`) are answered page by page from it, with
+next_page_token values "page-1", "page-2", ... Any other query gets
+synthetic pages, so stages can be exercised at arbitrary scale:
+
+    python -m benchmarks.fake_serpapi --port 8766 --latency 0.5
+    SERPAPI_BASE_URL=http://127.0.0.1:8766 streamlit run Bot.py
+
+    # record a real query into a fixture directory (uses SERP_API_KEY)
+    python -m benchmarks.fake_serpapi --record "Hotels in Times Square New York"
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures" / "serpapi"
+DEFAULT_PER_PAGE = 20
+
+
+def slugify(text):
+    return re.sub(r"[^\w]+", "-", text.lower().strip()).strip("-")
+
+
+def synthetic_property(rng, index):
+    if rng.random() < 0.2:
+        name = f"Spacious Room near Times Square! Pet-friendly, Sleeps 4 #{index}"
+    else:
+        name = f"Synthetic Hotel {index}"
+    return {
+        "type": "hotel",
+        "name": name,
+        "description": "Synthetic property",
+        "link": f"https://example.com/hotel/{index}",
+        "property_token": f"synthetic-{index}",
+        "gps_coordinates": {
+            "latitude": 40.70 + rng.random() * 0.12,
+            "longitude": -74.02 + rng.random() * 0.08,
+        },
+        "hotel_class": f"{rng.randint(2, 5)}-star hotel",
+        "extracted_hotel_class": rng.randint(2, 5),
+    }
+
+
+def synthetic_page(query, page, pages, per_page=DEFAULT_PER_PAGE):
+    rng = random.Random(f"{query}-{page}")
+    start = page * per_page
+    results = {
+        "search_parameters": {"engine": "google_hotels", "q": query},
+        "properties": [
+            synthetic_property(rng, index) for index in range(start, start + per_page)
+        ],
+    }
+    if page + 1 < pages:
+        results["serpapi_pagination"] = {
+            "current_from": start + 1,
+            "current_to": start + per_page,
+            "next_page_token": f"page-{page + 1}",
+            "next": "https://serpapi.com/search.json?...",
+        }
+    return results
+
+
+def load_page(query, page, pages):
+    fixture = FIXTURES_DIR / slugify(query) / f"page-{page}.json"
+    if fixture.exists():
+        return json.loads(fixture.read_text())
+    return synthetic_page(query, page, pages)
+
+
+class FakeSerpApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0
+    pages = 5
+
+    def do_GET(self):
+        params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        token = params.get("next_page_token", "page-0")
+        page = int(token.rsplit("-", 1)[-1])
+        time.sleep(self.latency)
+        with self.server.stats_lock:
+            self.server.requests += 1
+        payload = json.dumps(load_page(params.get("q", ""), page, self.pages)).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=0, latency=0.0, pages=5):
+    # returns (server, base_url); pages only applies to synthetic queries
+    handler = type(
+        "Handler", (FakeSerpApiHandler,), {"latency": latency, "pages": pages}
+    )
+    ThreadingHTTPServer.request_queue_size = 256
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.stats_lock = threading.Lock()
+    server.requests = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def record(query):
+    from app.backend.search import hotel_search_params
+    from app.backend.serp_fetch import request_page
+
+    params = hotel_search_params(query, os.environ["SERP_API_KEY"])
+    directory = FIXTURES_DIR / slugify(query)
+    directory.mkdir(parents=True, exist_ok=True)
+    page = 0
+    while True:
+        results = request_page(params)
+        results.pop("search_metadata", None)
+        pagination = results.get("serpapi_pagination", {})
+        next_token = pagination.get("next_page_token") if "next" in pagination else None
+        if next_token:
+            # rewrite the token so the replay server can route on it
+            pagination["next_page_token"] = f"page-{page + 1}"
+        (directory / f"page-{page}.json").write_text(json.dumps(results, indent=2))
+        if not next_token:
+            break
+        params = {**params, "next_page_token": next_token}
+        page += 1
+    print(f"Recorded {page + 1} pages into {directory}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--record", metavar="QUERY")
+    args = parser.parse_args()
+    if args.record:
+        record(args.record)
+    else:
+        server, base_url = start_server(args.port, args.latency, args.pages)
+        print(f"Fake SerpAPI listening on {base_url}")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
@@ -0,0 +1,390 @@
+"""End-to-end benchmark of the enrichment chain against the local stand-ins.
+
+Starts the fake SerpAPI, OpenAI, Custom Search and Cvent servers with the
+given latency, points the app at them and every cache at a scratch
+directory, then runs the Bot.py chain at each scale:
+
+    fetch_all_hotels -> filter_legit_hotels -> get_hotel_details
+    -> combine_hotel_data -> get_map -> Cvent links -> Cvent scrape
+
+Each stage records wall time, rows in/out, rows/s and the requests every
+stand-in received, and each scale keeps the telemetry summary of its spans
+(p50/p95/p99 per call type). Scales up to the size of the recorded Times
+Square fixtures replay them; larger scales use synthetic listings.
+
+The LLM stages run on at most --max-llm-rows rows and the Cvent stages on at
+most --max-cvent-rows; the remaining rows get the stand-ins' deterministic
+answers without a request, so combine and the map still see the full
+scale. Capped stages also report projected_seconds for all their rows.
+
+    python -m benchmarks.suite --scales 10 1000 100000 --latency 0.05
+    python -m benchmarks.suite --compare benchmarks/results/OLD.json benchmarks/results/NEW.json
+
+Results go to benchmarks/results/<time>-<commit>.json.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import UTC, datetime
+from pathlib import Path
+
+from benchmarks import fake_cse, fake_cvent, fake_openai, fake_serpapi
+
+RESULTS_DIR = Path(__file__).parent / "results"
+FIXTURE_QUERY = "Hotels in Times Square New York"
+DEFAULT_SCALES = (10, 1000, 100_000)
+# cache and checkpoint files the app reads from the environment
+SCRATCH_FILES = {
+    "LLM_CACHE_PATH": "llm_cache.sqlite",
+    "SERP_CACHE_PATH": "serp_cache.sqlite",
+    "CSE_CACHE_PATH": "cse_cache.sqlite",
+    "HOTEL_REGISTRY_PATH": "hotel_registry.sqlite",
+    "SWEEP_CHECKPOINT_PATH": "sweeps.sqlite",
+    "CVENT_CHECKPOINT_PATH": "cvent_crawl.sqlite",
+    "TELEMETRY_LOG_PATH": "events.jsonl",
+}
+
+
+def git_commit():
+    def git(*args):
+        return subprocess.run(
+            ["git", *args], capture_output=True, text=True, check=False
+        ).stdout.strip()
+
+    return git("rev-parse", "--short", "HEAD") or "unknown", bool(
+        git("status", "--porcelain", "--untracked-files=no")
+    )
+
+
+def start_stand_ins(latency):
+    serpapi, serpapi_url = fake_serpapi.start_server(latency=latency)
+    openai, openai_url = fake_openai.start_server(latency=latency)
+    cvent, cvent_url = fake_cvent.start_server(latency=latency)
+    cse, cse_url = fake_cse.start_server(
+        latency=latency,
+        cvent_base_url=cvent_url.replace("127.0.0.1", "cvent.localhost"),
+    )
+    os.environ.update(
+        {
+            "SERPAPI_BASE_URL": serpapi_url,
+            "OPENAI_BASE_URL": openai_url,
+            "GOOGLE_CSE_BASE_URL": cse_url,
+            "OPENAI_API_KEY": "fake",
+            "GOOGLE_CSE_API_KEY": "fake",
+            "GOOGLE_CSE_ID": "bench",
+            "CSE_DAILY_QUOTA": str(10**9),
+        }
+    )
+    return {"serpapi": serpapi, "openai": openai, "cse": cse, "cvent": cvent}
+
+
+def request_counts(servers):
+    return {
+        "serpapi": servers["serpapi"].requests,
+        "openai": servers["openai"].requests,
+        "openai_prompt_tokens": servers["openai"].prompt_tokens,
+        "cse": servers["cse"].requests,
+        "cvent_pages": servers["cvent"].page_requests,
+    }
+
+
+def json_records(summary):
+    # telemetry summary -> JSON-safe rows (NaN percentiles become null)
+    summary = summary.astype(object).where(summary.notna(), None)
+    return summary.rename_axis("stage").reset_index().to_dict(orient="records")
+
+
+class ScaleRun:
+    def __init__(self, scale, servers, verbose=False):
+        self.scale = scale
+        self.servers = servers
+        self.verbose = verbose
+        self.stages = []
+
+    def run(self, stage, rows_in, func, total_rows=None):
+        """Time func() -> (value, rows_out) as one stage. total_rows is the
+        number of rows the stage would see uncapped."""
+        before = request_counts(self.servers)
+        start = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            if not self.verbose:
+                # the app's prints, progress bars and warnings
+                stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+                stack.enter_context(contextlib.redirect_stderr(io.StringIO()))
+            value, rows_out = func()
+        seconds = time.perf_counter() - start
+        after = request_counts(self.servers)
+        result = {
+            "stage": stage,
+            "rows_in": rows_in,
+            "rows_out": rows_out,
+            "seconds": round(seconds, 4),
+            "rows_per_s": round(rows_in / seconds, 2) if seconds > 0 else None,
+            "requests": {name: after[name] - before[name] for name in after},
+        }
+        if total_rows is not None and total_rows > rows_in and rows_in:
+            result["total_rows"] = total_rows
+            result["projected_seconds"] = round(seconds * total_rows / rows_in, 2)
+        self.stages.append(result)
+        print(
+            f"  {stage:<20} rows={rows_in:>7} out={rows_out!s:>7} "
+            f"{seconds:8.2f}s {result['rows_per_s'] or 0:>10.1f} rows/s",
+            flush=True,
+        )
+        return value
+
+    def skip(self, stage, reason):
+        self.stages.append({"stage": stage, "skipped": reason})
+        print(f"  {stage:<20} skipped: {reason}", flush=True)
+
+    def end_to_end(self):
+        timed = [stage for stage in self.stages if "seconds" in stage]
+        seconds = sum(stage["seconds"] for stage in timed)
+        projected = sum(
+            stage.get("projected_seconds", stage["seconds"]) for stage in timed
+        )
+        return {
+            "seconds": round(seconds, 4),
+            "projected_seconds": round(projected, 2),
+            "rows_per_s": round(self.scale / projected, 2) if projected else None,
+        }
+
+
+def stub_legit(hotel_df):
+    # the answer the stand-in would give, without the request
+    is_legit = [
+        fake_openai.legit_hotel_payload([name])["is_legit_name"]
+        for name in hotel_df["name"]
+    ]
+    hotel_df = hotel_df.assign(is_legit_name=is_legit)
+    return hotel_df[hotel_df["is_legit_name"].astype(bool)]
+
+
+def stub_details(hotel_df):
+    import pandas as pd
+
+    return pd.DataFrame(
+        [fake_openai.hotel_payload([name]) for name in hotel_df["name"]],
+        columns=["name", "brand", "subbrand", "total_num_of_rooms"],
+    )
+
+
+def run_scale(scale, servers, scratch, args):
+    import pandas as pd
+    from playwright.async_api import Error as PlaywrightError
+
+    from app.backend.llm_async import run_sync
+    from app.backend.maps import get_map
+    from app.backend.scrape_cvent import (
+        CventCheckpoint,
+        resolve_cvent_links,
+        scrape_cvent_pages,
+    )
+    from app.backend.search import (
+        combine_hotel_data,
+        fetch_all_hotels,
+        filter_legit_hotels,
+        get_hotel_details,
+    )
+    from app.backend.telemetry import record_run
+
+    fixture_rows = sum(
+        len(json.loads(page.read_text())["properties"])
+        for page in (
+            fake_serpapi.FIXTURES_DIR / fake_serpapi.slugify(FIXTURE_QUERY)
+        ).glob("page-*.json")
+    )
+    query = FIXTURE_QUERY if scale <= fixture_rows else f"Benchmark hotels {scale}"
+    servers["serpapi"].RequestHandlerClass.pages = math.ceil(
+        scale / fake_serpapi.DEFAULT_PER_PAGE
+    )
+    bench = ScaleRun(scale, servers, args.verbose)
+    print(f"scale {scale} ({query!r})", flush=True)
+
+    with record_run(f"bench-{scale}") as recorder:
+
+        def fetch():
+            hotel_df = fetch_all_hotels(query, "fake").head(scale)
+            return hotel_df, len(hotel_df)
+
+        hotel_df = bench.run("fetch_all_hotels", scale, fetch)
+
+        llm_df = hotel_df.head(args.max_llm_rows)
+
+        def legit():
+            filtered = filter_legit_hotels(llm_df)
+            return filtered, len(filtered)
+
+        filtered_df = bench.run(
+            "filter_legit_hotels", len(llm_df), legit, len(hotel_df)
+        )
+
+        def details():
+            details_df = get_hotel_details(filtered_df)
+            return details_df, len(details_df)
+
+        rest_df = stub_legit(hotel_df.iloc[len(llm_df) :])
+        details_df = bench.run(
+            "get_hotel_details",
+            len(filtered_df),
+            details,
+            len(filtered_df) + len(rest_df),
+        )
+
+        filtered_df = pd.concat([filtered_df, rest_df])
+        details_df = pd.concat([details_df, stub_details(rest_df)], ignore_index=True)
+
+        def combine():
+            combined = combine_hotel_data(filtered_df, details_df)
+            return combined, len(combined)
+
+        combined_df = bench.run(
+            "combine_hotel_data", len(filtered_df) + len(details_df), combine
+        )
+
+        def render_map():
+            html = get_map(combined_df).get_root().render()
+            return html, len(combined_df)
+
+        bench.run("get_map", len(combined_df), render_map)
+
+        cvent_hotels = combined_df["name"].head(args.max_cvent_rows).to_list()
+        checkpoint = CventCheckpoint(str(scratch / f"cvent-{scale}.sqlite"))
+
+        def resolve_links():
+            resolve_cvent_links(cvent_hotels, checkpoint)
+            return None, checkpoint.progress().get("found_link", 0)
+
+        bench.run("cvent_links", len(cvent_hotels), resolve_links, len(combined_df))
+
+        cvent_links = {
+            hotel: link
+            for hotel, (status, link) in checkpoint.states().items()
+            if status == "found_link"
+        }
+
+        def scrape():
+            run_sync(
+                scrape_cvent_pages(cvent_links, checkpoint, args.scrape_concurrency)
+            )
+            return None, checkpoint.progress().get("scraped", 0)
+
+        try:
+            bench.run("cvent_scrape", len(cvent_links), scrape)
+        except PlaywrightError as e:
+            # Playwright without a Chromium install, see bench_cvent_scrape.py
+            bench.skip("cvent_scrape", f"{type(e).__name__}: {str(e).splitlines()[0]}")
+
+    return {
+        "scale": scale,
+        "query": query,
+        "stages": bench.stages,
+        "end_to_end": bench.end_to_end(),
+        "telemetry": json_records(recorder.summary()),
+    }
+
+
+def compare(old_path, new_path, threshold):
+    """Print rows/s per (scale, stage) of two result files; returns the
+    number of stages that got slower by more than `threshold`."""
+    old, new = (json.loads(Path(path).read_text()) for path in (old_path, new_path))
+
+    def rates(results):
+        rows = {}
+        for scale in results["scales"]:
+            for stage in scale["stages"]:
+                rows[scale["scale"], stage["stage"]] = stage.get("rows_per_s")
+            rows[scale["scale"], "end_to_end"] = scale["end_to_end"]["rows_per_s"]
+        return rows
+
+    old_rates, new_rates = rates(old), rates(new)
+    print(f"{old['commit']} -> {new['commit']} (rows/s)")
+    regressions = 0
+    for key in [key for key in old_rates if key in new_rates]:
+        before, after = old_rates[key], new_rates[key]
+        if not before or not after:
+            continue
+        ratio = after / before
+        flag = ""
+        if ratio < 1 - threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        print(
+            f"{key[0]:>7} {key[1]:<20} {before:>10.1f} {after:>10.1f} "
+            f"{ratio:6.2f}x{flag}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=list(DEFAULT_SCALES))
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="seconds per stand-in request"
+    )
+    parser.add_argument("--max-llm-rows", type=int, default=1000)
+    parser.add_argument("--max-cvent-rows", type=int, default=200)
+    parser.add_argument("--scrape-concurrency", type=int, default=8)
+    parser.add_argument("--output", help="result file (default benchmarks/results/)")
+    parser.add_argument("--verbose", action="store_true", help="keep the app's prints")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="slowdown flagged by --compare"
+    )
+    args = parser.parse_args()
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+
+    scratch = Path(tempfile.mkdtemp(prefix="bench-suite-"))
+    # before the app modules read them at import time
+    os.environ.update(
+        {name: str(scratch / file) for name, file in SCRATCH_FILES.items()}
+    )
+    servers = start_stand_ins(args.latency)
+
+    commit, dirty = git_commit()
+    started = datetime.now(UTC)
+    results = {
+        "commit": commit,
+        "dirty": dirty,
+        "started_at": started.isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "latency": args.latency,
+            "max_llm_rows": args.max_llm_rows,
+            "max_cvent_rows": args.max_cvent_rows,
+            "scrape_concurrency": args.scrape_concurrency,
+        },
+        "scales": [run_scale(scale, servers, scratch, args) for scale in args.scales],
+    }
+    for server in servers.values():
+        server.shutdown()
+
+    output = Path(
+        args.output
+        or RESULTS_DIR
+        / f"{started:%Y%m%dT%H%M%S}-{commit}{'-dirty' if dirty else ''}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    for scale in results["scales"]:
+        end_to_end = scale["end_to_end"]
+        print(
+            f"scale {scale['scale']}: end to end {end_to_end['seconds']}s "
+            f"(projected {end_to_end['projected_seconds']}s uncapped)"
+        )
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import os
+import tempfile
+
+import pytest
+
+# the app modules read these at import time; keep every cache, checkpoint and
+# event log the tests write out of data/
+_scratch = tempfile.mkdtemp(prefix="tests-")
+for name, file_name in {
+    "LLM_CACHE_PATH": "llm_cache.sqlite",
+    "SERP_CACHE_PATH": "serp_cache.sqlite",
+    "CSE_CACHE_PATH": "cse_cache.sqlite",
+    "ROOM_COUNTS_PATH": "room_counts.sqlite",
+    "HOTEL_REGISTRY_PATH": "registry.sqlite",
+    "CVENT_CHECKPOINT_PATH": "cvent_crawl.sqlite",
+    "CVENT_ROOM_INFO_PATH": "cvent_room_info.parquet",
+    "ROOM_OVERRIDES_PATH": "room_overrides.csv",
+    "SWEEP_CHECKPOINT_PATH": "sweeps.sqlite",
+}.items():
+    os.environ[name] = os.path.join(_scratch, file_name)
+os.environ["OUTPUT_PATH"] = _scratch
+os.environ["TELEMETRY_LOG_PATH"] = ""
+os.environ.setdefault("OPENAI_API_KEY", "fake")
+
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    """start(**kwargs) runs benchmarks.fake_openai and points a fresh LLM
+    gateway at it; returns the server, for its request counters."""
+    from app.backend import llm_gateway
+    from benchmarks.fake_openai import start_server
+
+    servers = []
+
+    def start(**kwargs):
+        server, base_url = start_server(**kwargs)
+        servers.append(server)
+        monkeypatch.setenv("OPENAI_BASE_URL", base_url)
+        monkeypatch.setattr(llm_gateway, "_default_gateway", None)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
@@ -0,0 +1,238 @@
+import pytest
+
+async_api = pytest.importorskip("playwright.async_api")
+sync_api = pytest.importorskip("playwright.sync_api")
+
+from app.backend import browser_pool
+from app.backend.browser_pool import BrowserPool, SharedBrowserPool
+from app.backend.llm_async import run_sync
+from app.backend.scrape_cvent import (
+    CventCheckpoint,
+    get_guest_room_info_cvent,
+    parse_total_guest_rooms,
+    scrape_cvent_pages,
+    scrape_guest_room_info,
+)
+from benchmarks.fake_cvent import start_server, total_guest_rooms, venue_url
+
+# nothing listens on port 1, so loading it fails right away
+UNREACHABLE_URL = "http://127.0.0.1:1/venues/unreachable/venue"
+
+
+def chromium_error():
+    # why Chromium can't run here (not installed, missing system libraries),
+    # None when it can
+    try:
+        with sync_api.sync_playwright() as playwright:
+            playwright.chromium.launch().close()
+    except sync_api.Error as e:
+        return str(e).splitlines()[0]
+    return None
+
+
+CHROMIUM_ERROR = chromium_error()
+needs_chromium = pytest.mark.skipif(
+    CHROMIUM_ERROR is not None, reason=f"needs Chromium: {CHROMIUM_ERROR}"
+)
+
+
+@pytest.fixture
+def cvent():
+    server, base_url = start_server()
+    yield server, base_url
+    server.shutdown()
+
+
+def scrape_all(urls, concurrency=3, **kwargs):
+    async def scrape():
+        async with BrowserPool(concurrency=concurrency, **kwargs) as pool:
+            results = await pool.map(
+                scrape_guest_room_info, urls, max_retries=0, progress=False
+            )
+            return results, pool
+
+    return run_sync(scrape())
+
+
+@needs_chromium
+def test_map_returns_room_counts_in_input_order(cvent):
+    server, base_url = cvent
+    slugs = [f"test-hotel-{i}" for i in range(8)]
+    results, pool = scrape_all([venue_url(base_url, slug) for slug in slugs])
+    assert [parse_total_guest_rooms("\n".join(r)) for r in results] == [
+        total_guest_rooms(slug) for slug in slugs
+    ]
+    assert pool.pages_loaded == len(slugs)
+    assert server.page_requests == len(slugs)
+
+
+@needs_chromium
+def test_map_blocks_assets_by_default(cvent):
+    server, base_url = cvent
+    scrape_all([venue_url(base_url, "blocked")])
+    assert server.asset_requests == 0
+    scrape_all([venue_url(base_url, "unblocked")], blocked_resource_types=())
+    assert server.asset_requests > 0
+
+
+@needs_chromium
+def test_map_puts_failures_in_their_slot(cvent):
+    _, base_url = cvent
+    urls = [venue_url(base_url, "first"), UNREACHABLE_URL, venue_url(base_url, "last")]
+    results, pool = scrape_all(urls, timeout=5)
+    assert isinstance(results[1], Exception)
+    assert parse_total_guest_rooms("\n".join(results[0])) == total_guest_rooms("first")
+    assert parse_total_guest_rooms("\n".join(results[2])) == total_guest_rooms("last")
+    assert pool.failures == 1
+
+
+@needs_chromium
+def test_scrape_cvent_pages_checkpoints_every_hotel(cvent, tmp_path):
+    _, base_url = cvent
+    checkpoint = CventCheckpoint(tmp_path / "cvent_crawl.sqlite")
+    cvent_links = {
+        f"Test Hotel {i}": venue_url(base_url, f"test-hotel-{i}") for i in range(5)
+    }
+    cvent_links["Unreachable Hotel"] = UNREACHABLE_URL
+    run_sync(scrape_cvent_pages(cvent_links, checkpoint, concurrency=3))
+
+    room_info = checkpoint.room_info().set_index("hotel")
+    assert room_info["total_num_rooms"].to_dict() == {
+        f"Test Hotel {i}": total_guest_rooms(f"test-hotel-{i}") for i in range(5)
+    }
+    failures = checkpoint.failures()
+    assert failures["hotel"].to_list() == ["Unreachable Hotel"]
+    assert failures["stage"].to_list() == ["scrape"]
+
+
+class FakePage:
+    def __init__(self, context):
+        self.context = context
+
+    async def goto(self, url):
+        if url == UNREACHABLE_URL:
+            raise ConnectionError(url)
+        self.url = url
+        self.context.browser.visits.append(url)
+
+    def get_by_text(self, text):
+        return FakeLocator(self.url)
+
+
+class FakeLocator:
+    def __init__(self, url):
+        self.url = url
+
+    async def all_inner_texts(self):
+        return [f"Guest Rooms\nTotal guest rooms {len(self.url)}"]
+
+
+class FakeContext:
+    def __init__(self, browser):
+        self.browser = browser
+        self.routes = []
+        self.closed = False
+
+    def set_default_timeout(self, timeout):
+        self.timeout = timeout
+
+    async def route(self, pattern, handler):
+        self.routes.append(pattern)
+
+    async def new_page(self):
+        return FakePage(self)
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.contexts = []
+        self.visits = []
+        self.closed = False
+
+    async def new_context(self):
+        self.contexts.append(FakeContext(self))
+        return self.contexts[-1]
+
+    async def close(self):
+        self.closed = True
+
+
+class FakePlaywright:
+    def __init__(self):
+        self.browsers = []
+        self.chromium = self
+
+    async def start(self):
+        return self
+
+    async def launch(self, headless):
+        self.browsers.append(FakeBrowser())
+        return self.browsers[-1]
+
+    async def stop(self):
+        pass
+
+
+@pytest.fixture
+def playwright(monkeypatch):
+    # stands in for Chromium, so the pool logic runs without a browser
+    fake = FakePlaywright()
+    monkeypatch.setattr(browser_pool, "async_playwright", lambda: fake)
+    return fake
+
+
+async def page_url(page):
+    return page.url
+
+
+def test_map_reuses_pages_without_a_browser(playwright):
+    urls = [f"https://cvent.test/venues/{i}" for i in range(6)]
+    results, pool = scrape_all(urls, concurrency=2)
+    assert results == [[f"Guest Rooms\nTotal guest rooms {len(u)}"] for u in urls]
+    (browser,) = playwright.browsers
+    assert browser.visits == urls
+    assert browser.closed
+    assert len(browser.contexts) == 2
+    assert all(context.routes == ["**/*"] for context in browser.contexts)
+    assert pool.pages_loaded == 6
+
+
+def test_failed_page_is_replaced_without_a_browser(playwright):
+    urls = [
+        "https://cvent.test/venues/a",
+        UNREACHABLE_URL,
+        "https://cvent.test/venues/b",
+    ]
+    results, pool = scrape_all(urls, concurrency=1, blocked_resource_types=())
+    assert isinstance(results[1], ConnectionError)
+    (browser,) = playwright.browsers
+    assert browser.visits == [urls[0], urls[2]]
+    assert [context.closed for context in browser.contexts] == [True, False]
+    assert all(context.routes == [] for context in browser.contexts)
+    assert pool.failures == 1
+
+
+def test_shared_pool_launches_one_browser(playwright):
+    pool = SharedBrowserPool(concurrency=1)
+    urls = [f"https://cvent.test/venues/{i}" for i in range(3)]
+    try:
+        assert [pool.run(url, page_url) for url in urls] == urls
+    finally:
+        pool.close()
+    (browser,) = playwright.browsers
+    assert len(browser.contexts) == 1
+    assert browser.closed
+
+
+def test_legacy_entry_point_uses_the_shared_pool(playwright, monkeypatch):
+    monkeypatch.setattr(browser_pool, "_default_pool", None)
+    url = "https://cvent.test/venues/legacy"
+    try:
+        texts = [get_guest_room_info_cvent(url) for _ in range(3)]
+    finally:
+        browser_pool.get_shared_browser_pool().close()
+    assert {parse_total_guest_rooms("\n".join(t)) for t in texts} == {len(url)}
+    assert len(playwright.browsers) == 1
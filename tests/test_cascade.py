@@ -0,0 +1,116 @@
+import pytest
+
+from app.backend.cascade import DetailsCascade
+from app.backend.llm_async import run_sync
+from app.backend.registry import fingerprint
+from app.backend.search import DETAILS_MODEL, DETAILS_PROMPT, Hotel, RatedHotel
+
+CHEAP_MODEL = "cheap-model"
+
+
+def rated(name, brand="Independent", level="Midscale", rooms=300, confidence=0.9):
+    return RatedHotel(
+        name=name,
+        brand=brand,
+        subbrand=level,
+        total_num_of_rooms=rooms,
+        confidence=confidence,
+    )
+
+
+@pytest.mark.parametrize(
+    ("hotel", "problem"),
+    [
+        (rated("Hotel Edison"), None),
+        (rated("Hotel Edison", confidence=0.4), "confidence 0.40"),
+        (rated("Hotel Edison", rooms=0), "0 rooms"),
+        (rated("Hotel Edison", rooms=20000), "20000 rooms"),
+        (rated("Hotel Edison", brand="Hilton Worldwide"), "not in the name"),
+        (
+            rated("Hampton Inn Manhattan", brand="Hilton Worldwide", level="Midscale"),
+            None,
+        ),
+        (
+            rated("Hampton Inn Manhattan", brand="Marriott International"),
+            "brand HotelBrand.Marriott for a Hilton Worldwide name",
+        ),
+        (
+            rated("Hampton Inn Manhattan", brand="Hilton Worldwide", level="Luxury"),
+            "for a Midscale name",
+        ),
+    ],
+)
+def test_acceptance_checks(hotel, problem):
+    problems = DetailsCascade(
+        tiers=[CHEAP_MODEL, DETAILS_MODEL], overrides={}
+    ).problems(hotel.name, hotel)
+    if problem is None:
+        assert problems == []
+    else:
+        assert len(problems) == 1 and problem in problems[0]
+
+
+def answers(cheap_answers):
+    """A call() for DetailsCascade.aresolve: the cheap tier answers from
+    cheap_answers (raising when it holds an exception), the last tier always
+    answers with a plain Hotel."""
+    asked = []
+
+    async def call(func, model, prompt, hotel_name):
+        asked.append((hotel_name, model))
+        if model == CHEAP_MODEL:
+            answer = cheap_answers[hotel_name]
+            if isinstance(answer, Exception):
+                raise answer
+            return answer
+        return Hotel(name=hotel_name, brand="Independent", total_num_of_rooms=111)
+
+    return call, asked
+
+
+def test_escalates_only_what_fails_the_checks():
+    cascade = DetailsCascade(tiers=[CHEAP_MODEL, DETAILS_MODEL], overrides={})
+    call, asked = answers(
+        {
+            "Hotel Good": rated("Hotel Good"),
+            "Hotel Unsure": rated("Hotel Unsure", confidence=0.1),
+            "Hotel Broken": TimeoutError("cheap tier"),
+        }
+    )
+    results = {
+        name: run_sync(cascade.aresolve(name, call))
+        for name in ("Hotel Good", "Hotel Unsure", "Hotel Broken")
+    }
+    assert {name: model for name, (_, model) in results.items()} == {
+        "Hotel Good": CHEAP_MODEL,
+        "Hotel Unsure": DETAILS_MODEL,
+        "Hotel Broken": DETAILS_MODEL,
+    }
+    assert results["Hotel Unsure"][0].total_num_of_rooms == 111
+    assert cascade.stats() == {
+        CHEAP_MODEL: {"accepted": 1, "escalated": 2},
+        DETAILS_MODEL: {"accepted": 2},
+    }
+    assert len(asked) == 5
+
+
+def test_overrides_start_a_hotel_at_its_tier():
+    cascade = DetailsCascade(
+        tiers=[CHEAP_MODEL, DETAILS_MODEL],
+        overrides={"The Plaza": DETAILS_MODEL, "Hotel Elsewhere": "other-model"},
+    )
+    assert cascade.tiers_for("the plaza") == [DETAILS_MODEL]
+    assert cascade.tiers_for("Hotel Elsewhere") == ["other-model"]
+    assert cascade.tiers_for("Hotel Edison") == [CHEAP_MODEL, DETAILS_MODEL]
+
+    call, asked = answers({})
+    _, model = run_sync(cascade.aresolve("The Plaza", call))
+    assert model == DETAILS_MODEL and asked == [("The Plaza", DETAILS_MODEL)]
+
+
+def test_single_tier_keeps_the_plain_details_version():
+    single = DetailsCascade(tiers=[DETAILS_MODEL], overrides={})
+    tiered = DetailsCascade(tiers=[CHEAP_MODEL, DETAILS_MODEL], overrides={})
+    plain = fingerprint(1, DETAILS_MODEL, DETAILS_PROMPT, Hotel.model_json_schema())
+    assert single.version() == plain
+    assert tiered.version() != plain
@@ -0,0 +1,87 @@
+import pytest
+
+from app.backend import cse_links
+from app.backend.cse_links import CSECache, CSEQuotaExceeded, CventLinkResolver
+
+
+class FakeCSE:
+    """Stands in for the discovery client: service.cse().list(...).execute()."""
+
+    def __init__(self, items):
+        self.items = items
+        self.queries = []
+
+    def cse(self):
+        return self
+
+    def list(self, q, cx):
+        self.queries.append(q)
+        return self
+
+    def execute(self):
+        query = self.queries[-1]
+        return {"items": self.items[query]} if query in self.items else {}
+
+
+@pytest.fixture
+def service(monkeypatch):
+    service = FakeCSE(
+        {
+            "cvent The Hotel Edison": [
+                {
+                    "title": "Meetings at The Hotel Edison",
+                    "link": "https://www.cvent.com/edison",
+                },
+            ],
+            "cvent Hotel Elsewhere": [
+                {"title": "Hotel Elsewhere", "link": "https://example.com/elsewhere"},
+            ],
+        }
+    )
+    monkeypatch.setattr(cse_links, "get_cse_service", lambda api_key: service)
+    return service
+
+
+def test_results_are_cached_by_normalized_query(service, tmp_path):
+    cache = CSECache(str(tmp_path / "cse.sqlite"))
+    resolver = CventLinkResolver("key", "cx", cache=cache)
+    assert resolver.resolve("The Hotel Edison") == "https://www.cvent.com/edison"
+    # not a Cvent page, and nothing found at all
+    assert resolver.resolve("Hotel Elsewhere") is None
+    assert resolver.resolve("Hotel Nowhere") is None
+    assert resolver.requests == 3
+
+    # a later resolver on the same cache sends nothing
+    again = CventLinkResolver("key", "cx", cache=cache)
+    assert again.resolve("the hotel  edison") == "https://www.cvent.com/edison"
+    assert again.resolve("Hotel Nowhere") is None
+    assert (again.requests, again.cache_hits) == (0, 2)
+    assert len(service.queries) == 3
+
+
+def test_quota_is_shared_through_the_cache(service, tmp_path):
+    cache = CSECache(str(tmp_path / "cse.sqlite"))
+    CventLinkResolver("key", "cx", cache=cache, daily_quota=2).resolve("Hotel A")
+
+    resolver = CventLinkResolver("key", "cx", cache=cache, daily_quota=2)
+    resolver.resolve("Hotel B")
+    with pytest.raises(CSEQuotaExceeded):
+        resolver.resolve("Hotel C")
+    # cached answers don't need any quota
+    assert resolver.resolve("Hotel A") is None
+
+
+def test_iter_resolve_searches_each_query_once(service, tmp_path):
+    resolver = CventLinkResolver(
+        "key", "cx", cache=CSECache(str(tmp_path / "cse.sqlite")), daily_quota=1
+    )
+    results = list(
+        resolver.iter_resolve(["The Hotel Edison", "the hotel edison", "Hotel B"])
+    )
+    assert results[:2] == [
+        ("The Hotel Edison", "https://www.cvent.com/edison"),
+        ("the hotel edison", "https://www.cvent.com/edison"),
+    ]
+    # over the quota: the failure is handed back, not raised
+    assert isinstance(results[2][1], CSEQuotaExceeded)
+    assert service.queries == ["cvent The Hotel Edison"]
@@ -0,0 +1,67 @@
+import pandas as pd
+
+from app.backend.entity_resolution import match_names, normalize_name
+from app.backend.search import COMBINED_COLUMNS, merge_hotel_data
+
+LISTINGS = pd.DataFrame(
+    {
+        "name": [
+            "New York Hilton Midtown",
+            "Hotel Edison",
+            "Hampton Inn Manhattan Times Square North",
+            "Hampton Inn Manhattan Times Square South",
+            "Hotel Edison",
+        ],
+        "latitude": [40.762, 40.760, 40.763, 40.755, 0.0],
+        "longitude": [-73.979, -73.986, -73.987, -73.989, 0.0],
+        "link": ["a", "b", "c", "d", "e"],
+        "hotel_class": ["4-star hotel", "3-star hotel", "3-star hotel", None, None],
+    }
+)
+
+
+def details(*names):
+    return pd.DataFrame(
+        {
+            "name": list(names),
+            "brand": "Hilton Worldwide",
+            "subbrand": "Premium",
+            "total_num_of_rooms": range(100, 100 + len(names)),
+        }
+    )
+
+
+def test_normalize_name_expands_abbreviations():
+    assert (
+        normalize_name("Hilton NY Midtown & Spa") == "hilton new york midtown and spa"
+    )
+    assert normalize_name("Café Ste. Intl") == "cafe suites international"
+
+
+def test_match_names_prefers_exact_then_best_fuzzy():
+    left, right, confidence = match_names(
+        ["hotel edison", "Hilton NY Midtown", "Hampton Inn Times Sq South", "ROW NYC"],
+        LISTINGS["name"].to_list(),
+    )
+    assert left.tolist() == [0, 1, 2]
+    assert right.tolist() == [1, 0, 3]
+    assert confidence[0] == 100
+    assert min(confidence) >= 85
+
+
+def test_exact_join_keeps_details_order_and_first_listing():
+    combined = merge_hotel_data(LISTINGS, details("Hotel Edison", "Hilton NY Midtown"))
+    assert list(combined.columns) == COMBINED_COLUMNS
+    # the rewritten name doesn't join exactly, the duplicate listing is ignored
+    assert combined[["name", "latitude"]].values.tolist() == [["Hotel Edison", 40.760]]
+
+
+def test_fuzzy_join_carries_the_listing_name():
+    combined = merge_hotel_data(
+        LISTINGS,
+        details("Hotel Edison", "Hilton NY Midtown", "Some Other Place"),
+        fuzzy_threshold=85,
+    )
+    assert list(combined.columns) == COMBINED_COLUMNS + ["match_confidence"]
+    assert combined["name"].to_list() == ["Hotel Edison", "New York Hilton Midtown"]
+    assert combined["total_num_of_rooms"].to_list() == [100, 101]
@@ -0,0 +1,67 @@
+import pandas as pd
+
+from app.backend.pipeline import EnrichmentRun
+from app.backend.search import (
+    HotelEnrichment,
+    hotel_enrichment_records,
+    parse_hotel_enrichment,
+)
+
+BLURB = "Located In Midtown! Trendy Bars, Pet-friendly, Close To Broadway!"
+
+
+def test_prefilter_decision_wins_over_the_answer():
+    answer = HotelEnrichment(
+        name="Hotel Edison",
+        is_legit_name=False,
+        brand="Independent",
+        subbrand="Midscale",
+        total_num_of_rooms=900,
+    )
+    assert parse_hotel_enrichment(answer) == {"is_legit_name": False, "details": None}
+    assert parse_hotel_enrichment(answer, is_legit_name=True)["details"] == {
+        "name": "Hotel Edison",
+        "brand": "Independent",
+        "subbrand": "Midscale",
+        "total_num_of_rooms": 900,
+    }
+
+
+def test_one_call_per_hotel_and_none_for_blurbs(fake_openai):
+    server = fake_openai()
+    names = ["Fused Hotel Edison", BLURB, "Hilton Garden Inn Fused Square"]
+    records = hotel_enrichment_records(names)
+
+    # the pre-filter rejects the blurb without a call
+    assert server.requests == 2
+    assert records[1] == {"is_legit_name": False, "details": None}
+    assert [records[i]["details"]["name"] for i in (0, 2)] == [names[0], names[2]]
+    assert records[2]["details"]["brand"] == "Hilton Worldwide"
+    assert all(isinstance(records[i]["is_legit_name"], bool) for i in (0, 2))
+
+    # answers come from the LLM cache the second time
+    assert hotel_enrichment_records(names) == records
+    assert server.requests == 2
+
+
+def test_fused_run_makes_one_call_per_listing(fake_openai):
+    server = fake_openai()
+    hotel_df = pd.DataFrame(
+        {
+            "name": ["Fused Run Hotel One", "Fused Run Hotel Two", BLURB],
+            "latitude": [40.75, 40.76, 40.77],
+            "longitude": [-73.98, -73.99, -73.97],
+            "link": ["a", "b", "c"],
+            "hotel_class": ["4-star hotel", None, None],
+            "property_token": ["fused-1", "fused-2", "fused-3"],
+        }
+    )
+    run = EnrichmentRun(hotel_df, fused=True)
+    run.start()
+    run.join(timeout=30)
+    assert run.done and run.error is None
+    assert server.requests == 2
+    assert sorted(run.snapshot()["name"]) == [
+        "Fused Run Hotel One",
+        "Fused Run Hotel Two",
+    ]
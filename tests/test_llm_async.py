@@ -0,0 +1,85 @@
+import asyncio
+import random
+
+import pytest
+
+from app.backend import llm_async
+from app.backend.llm_async import backoff_delay, gather_in_order, run_sync
+from app.backend.llm_gateway import get_llm_gateway
+from app.backend.search import LEGIT_MODEL, LEGIT_PROMPT, LegitHotel
+
+SLOW_MODEL = "slow-model"
+
+
+async def classify(hotel_name, model=LEGIT_MODEL):
+    return await get_llm_gateway().acreate(
+        model, LEGIT_PROMPT.format(hotel_name=hotel_name), LegitHotel
+    )
+
+
+def test_results_keep_input_order(fake_openai):
+    server = fake_openai(latency=0.01)
+    names = [f"Hotel Number {i}" for i in range(40)]
+
+    async def shuffled(hotel_name):
+        # finish in a different order than started
+        await asyncio.sleep(random.uniform(0, 0.05))
+        return await classify(hotel_name)
+
+    results = run_sync(gather_in_order(shuffled, names, concurrency=8, progress=False))
+    assert [result.name for result in results] == names
+    assert server.requests == len(names)
+
+
+def test_timed_out_call_ends_in_its_slot(fake_openai):
+    fake_openai(model_latency={SLOW_MODEL: 2.0})
+    names = ["Hotel Before", "Hotel Slow", "Hotel After"]
+
+    async def call(hotel_name):
+        return await classify(
+            hotel_name, SLOW_MODEL if "Slow" in hotel_name else LEGIT_MODEL
+        )
+
+    results = run_sync(
+        gather_in_order(call, names, timeout=0.3, max_retries=0, progress=False)
+    )
+    assert isinstance(results[1], TimeoutError)
+    assert [results[0].name, results[2].name] == ["Hotel Before", "Hotel After"]
+
+
+def test_transient_failures_are_retried(fake_openai, monkeypatch):
+    server = fake_openai()
+    delays = []
+    monkeypatch.setattr(
+        llm_async, "backoff_delay", lambda attempt: delays.append(attempt) or 0.01
+    )
+    names = [f"Flaky Hotel {i}" for i in range(5)]
+    attempts = dict.fromkeys(names, 0)
+
+    async def flaky(hotel_name):
+        attempts[hotel_name] += 1
+        if attempts[hotel_name] <= 2:
+            raise ConnectionError("connection reset")
+        return await classify(hotel_name)
+
+    results = run_sync(gather_in_order(flaky, names, max_retries=2, progress=False))
+    assert [result.name for result in results] == names
+    assert set(attempts.values()) == {3}
+    assert sorted(delays) == [0] * len(names) + [1] * len(names)
+    assert server.requests == len(names)
+
+
+def test_failures_past_max_retries_end_in_their_slot():
+    async def failing(item):
+        raise ConnectionError(item)
+
+    results = run_sync(gather_in_order(failing, ["a"], max_retries=1, progress=False))
+    assert isinstance(results[0], ConnectionError)
+
+
+@pytest.mark.parametrize("attempt", [0, 1, 3, 10])
+def test_backoff_is_jittered_under_the_exponential_ceiling(attempt):
+    ceiling = min(20.0, 0.5 * 2**attempt)
+    delays = [backoff_delay(attempt) for _ in range(200)]
+    assert all(0 <= delay <= ceiling for delay in delays)
+    assert len(set(delays)) > 1
@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+from app.backend.llm_async import run_sync
+from app.backend.llm_batch import pack_batches, run_batched
+from app.backend.search import aclassify_hotel_names, aclassify_hotel_names_batched
+
+
+def test_batches_stay_within_the_token_budget_and_size():
+    names = [f"Hotel {i}" for i in range(10)]
+    batches = pack_batches(
+        names, prompt_tokens=10, item_tokens=lambda name: 5, token_budget=30
+    )
+    assert batches == [names[i : i + 4] for i in range(0, 10, 4)]
+    batches = pack_batches(
+        names, 10, lambda name: 5, token_budget=1000, max_batch_size=3
+    )
+    assert [len(batch) for batch in batches] == [3, 3, 3, 1]
+    # a name over the budget still gets a batch of its own
+    assert pack_batches(["Huge"], 10, lambda name: 100, token_budget=30) == [["Huge"]]
+
+
+def test_answers_are_matched_by_name_and_bad_ones_resplit():
+    calls = []
+
+    async def call_batch(batch):
+        calls.append(batch)
+        answers = [SimpleNamespace(name=name) for name in reversed(batch)]
+        if "Hotel Dropped" in batch and len(batch) > 1:
+            answers = [a for a in answers if a.name != "Hotel Dropped"]
+        return answers
+
+    names = ["Hotel A", "Hotel Dropped", "Hotel B", "Hotel A", "Hotel C"]
+    results, requests = run_sync(
+        run_batched(call_batch, names, prompt_tokens=0, item_tokens=lambda n: 1)
+    )
+    assert {name: result.name for name, result in results.items()} == {
+        name: name for name in names
+    }
+    # the whole batch, then the name it left out on its own
+    assert requests == len(calls) == 2
+    assert calls[0] == ["Hotel A", "Hotel Dropped", "Hotel B", "Hotel C"]
+    assert calls[-1] == ["Hotel Dropped"]
+
+
+def test_batched_results_follow_the_input_order(fake_openai):
+    server = fake_openai()
+    names = [f"Batched Hotel {i}" for i in range(30)] + ["Batched Hotel 3"]
+    results = run_sync(aclassify_hotel_names_batched(names, token_budget=300))
+    assert [result.name for result in results] == names
+    assert 1 < server.requests < len(names)
+
+
+def test_batched_and_single_calls_share_the_cache(fake_openai):
+    server = fake_openai()
+    names = [f"Shared Hotel {i}" for i in range(5)]
+    single = run_sync(aclassify_hotel_names(names))
+    assert server.requests == len(names)
+
+    # every answer comes from the cache, nothing is sent again
+    batched = run_sync(aclassify_hotel_names_batched(names))
+    assert server.requests == len(names)
+    assert [result.is_legit_name for result in batched] == [
+        result.is_legit_name for result in single
+    ]
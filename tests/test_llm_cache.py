@@ -0,0 +1,97 @@
+import pytest
+from pydantic import BaseModel
+
+from app.backend import llm_cache
+from app.backend.llm_cache import LLMCache, cached_call
+
+
+class Answer(BaseModel):
+    name: str
+    rooms: int
+
+
+class OtherAnswer(BaseModel):
+    name: str
+
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    cache = LLMCache(str(tmp_path / "llm_cache.sqlite"))
+    monkeypatch.setattr(llm_cache, "_default_cache", cache)
+    return cache
+
+
+def test_key_is_stable_and_covers_every_part(cache):
+    key = cache.make_key("gpt-4o", "Rooms in {hotel_name}?", Answer, "Hotel Edison")
+    assert key == LLMCache(cache.path).make_key(
+        "gpt-4o", "Rooms in {hotel_name}?", Answer, "  Hotel Edison "
+    )
+    assert (
+        len(
+            {
+                key,
+                cache.make_key(
+                    "gpt-4o-mini", "Rooms in {hotel_name}?", Answer, "Hotel Edison"
+                ),
+                cache.make_key(
+                    "gpt-4o", "Rooms at {hotel_name}?", Answer, "Hotel Edison"
+                ),
+                cache.make_key(
+                    "gpt-4o", "Rooms in {hotel_name}?", OtherAnswer, "Hotel Edison"
+                ),
+                cache.make_key("gpt-4o", "Rooms in {hotel_name}?", Answer, "ROW NYC"),
+            }
+        )
+        == 5
+    )
+
+
+def test_get_set_and_expiry(cache):
+    key = cache.make_key("gpt-4o", "prompt", Answer, "Hotel Edison")
+    assert cache.get(key, Answer) is None
+    cache.set(key, Answer(name="Hotel Edison", rooms=1000))
+    assert cache.get(key, Answer) == Answer(name="Hotel Edison", rooms=1000)
+
+    cache.ttl = -1
+    assert cache.get(key, Answer) is None
+    cache.ttl = 3600
+    assert cache.get(key, Answer) is None
+
+
+def test_evict_keeps_the_most_recently_used(cache):
+    for i in range(3):
+        cache.set(f"key-{i}", Answer(name=f"Hotel {i}", rooms=i))
+        cache.connect().execute(
+            "UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (i, f"key-{i}")
+        )
+    (size,) = cache.connect().execute("SELECT MAX(size) FROM llm_cache").fetchone()
+    cache.max_bytes = size
+    cache.evict()
+    assert cache.get("key-2", Answer) is not None
+    assert cache.get("key-0", Answer) is None and cache.get("key-1", Answer) is None
+
+
+def test_cached_call_hits_after_the_first_call(cache):
+    calls = []
+
+    def call():
+        calls.append(None)
+        return Answer(name="Hotel Edison", rooms=1000)
+
+    for _ in range(2):
+        result = cached_call("gpt-4o", "prompt", Answer, "Hotel Edison", call)
+        assert result.rooms == 1000
+    assert len(calls) == 1
+
+
+def test_unnamed_listings_are_never_cached(cache):
+    calls = []
+
+    def call():
+        calls.append(None)
+        return Answer(name="", rooms=0)
+
+    for _ in range(2):
+        cached_call("gpt-4o", "prompt", Answer, None, call)
+    assert len(calls) == 2
+    assert cache.connect().execute("SELECT COUNT(*) FROM llm_cache").fetchone() == (0,)
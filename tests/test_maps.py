@@ -0,0 +1,80 @@
+import json
+
+import pandas as pd
+
+from app.backend.maps import (
+    cluster_hotels,
+    colors,
+    get_brand_colors_mapping,
+    get_map,
+    prepare_hotels,
+    viewport_mask,
+)
+
+HOTELS = pd.DataFrame(
+    {
+        "name": ["Hilton One", "Best Western Two", "Airbnb Three", "No Brand", "Empty"],
+        "latitude": [40.750, 40.751, 40.752, 40.753, 40.754],
+        "longitude": [-73.98, -73.981, -73.982, -73.983, -73.984],
+        "brand": [
+            "Hilton Worldwide",
+            "Best Western Hotels & Resorts",
+            "Airbnb",
+            None,
+            "Radisson Hotel Group",
+        ],
+        "total_num_of_rooms": [500, 100, 2, 50, 0],
+    }
+)
+
+
+def test_brands_without_a_color_are_drawn_as_independents():
+    assert get_brand_colors_mapping(HOTELS).tolist() == [
+        colors["Hilton Worldwide"],
+        colors["Independent"],
+        colors["Independent"],
+        colors["Independent"],
+        colors["Independent"],
+    ]
+
+
+def test_prepare_hotels_drops_empty_hotels_and_sizes_markers():
+    hotels_df = prepare_hotels(HOTELS)
+    assert hotels_df["name"].tolist() == HOTELS["name"][:4].tolist()
+    assert hotels_df["brand"].tolist()[3] == "Independent"
+    assert hotels_df["marker_radius"].tolist()[:3] == [10, 1 + 9 * 98 / 498, 1]
+    assert hotels_df["color"].notna().all()
+
+
+def test_map_has_a_color_for_every_marker():
+    html = get_map(HOTELS).get_root().render()
+    assert "NaN" not in html
+    assert json.dumps(colors["Independent"]) in html
+
+
+def test_clusters_of_brands_without_a_color():
+    clusters = cluster_hotels(prepare_hotels(HOTELS), zoom=10)
+    assert len(clusters) == 1
+    # most rooms are Hilton's; a Best Western-only cell still gets a color
+    assert clusters["color"].tolist() == [colors["Hilton Worldwide"]]
+    only_best_western = prepare_hotels(HOTELS.iloc[[1]])
+    assert cluster_hotels(only_best_western, zoom=10)["color"].tolist() == [
+        colors["Independent"]
+    ]
+
+
+def test_viewport_without_bounds_keeps_every_hotel():
+    hotels_df = prepare_hotels(HOTELS)
+    for bounds in (
+        {},
+        {
+            "_southWest": {"lat": None, "lng": None},
+            "_northEast": {"lat": None, "lng": None},
+        },
+    ):
+        assert viewport_mask(hotels_df, bounds).all()
+    view = {
+        "_southWest": {"lat": 40.7505, "lng": -73.9815},
+        "_northEast": {"lat": 40.7515, "lng": -73.9805},
+    }
+    assert viewport_mask(hotels_df, view).tolist() == [False, True, False, False]
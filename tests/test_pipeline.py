@@ -0,0 +1,104 @@
+import pandas as pd
+
+from app.backend import serp_fetch
+from app.backend.budget import Budget
+from app.backend.pipeline import EnrichmentRun, fetch_listings
+from app.backend.search import HOTEL_COLUMNS
+
+
+def listing(name, latitude, longitude):
+    return {
+        "name": name,
+        "latitude": latitude,
+        "longitude": longitude,
+        "link": f"https://example.com/{latitude}",
+        "hotel_class": "4-star hotel",
+    }
+
+
+def details(name, rooms):
+    return {
+        "name": name,
+        "brand": "Independent",
+        "subbrand": "Premium",
+        "total_num_of_rooms": rooms,
+    }
+
+
+def test_snapshot_keeps_listings_that_share_a_name():
+    run = EnrichmentRun(pd.DataFrame())
+    run.listings = [
+        listing("Hotel Twin", 40.75, -73.98),
+        listing("Hotel Twin", 40.71, -74.01),
+        listing("Hotel Single", 40.76, -73.97),
+    ]
+    run.details = [
+        details("Hotel Twin", 200),
+        details("The Hotel Twin", 80),
+        details("Hotel Single", 50),
+    ]
+    snapshot = run.snapshot()
+    assert snapshot[["name", "latitude", "total_num_of_rooms"]].values.tolist() == [
+        ["Hotel Twin", 40.75, 200],
+        ["Hotel Twin", 40.71, 80],
+        ["Hotel Single", 40.76, 50],
+    ]
+
+
+def test_search_without_results_gives_an_empty_run(monkeypatch):
+    monkeypatch.setattr(
+        serp_fetch,
+        "request_page",
+        lambda params: {"error": "Google hasn't returned any results for this query."},
+    )
+    hotel_df = fetch_listings("Hotels on the Moon", "key")
+    assert hotel_df.empty
+    assert list(hotel_df.columns) == HOTEL_COLUMNS
+
+    run = EnrichmentRun(hotel_df)
+    run.start()
+    run.join(timeout=10)
+    assert run.done and run.error is None
+    assert run.snapshot().empty
+
+
+def budget_listings(prefix, n):
+    return pd.DataFrame(
+        {
+            "name": [f"{prefix} Hotel {i}" for i in range(n)],
+            "latitude": [40.75 + i / 1000 for i in range(n)],
+            "longitude": -73.98,
+            "link": "https://example.com",
+            "hotel_class": "4-star hotel",
+            "property_token": [f"{prefix}-{i}" for i in range(n)],
+        }
+    )
+
+
+def test_new_limits_apply_to_the_running_budget(fake_openai):
+    fake_openai(latency=0.2)
+    run = EnrichmentRun(budget_listings("Limits", 4), budget=Budget(max_llm_calls=100))
+    run.start()
+    assert run.with_budget(max_llm_calls=100) is run
+    assert run.with_budget(max_llm_calls=50) is run
+    assert run.budget.limits["llm_calls"] == 50
+    run.join(timeout=30)
+    assert run.budget.exhausted is None
+
+
+def test_raising_a_spent_budget_resumes_over_the_same_listings(fake_openai):
+    server = fake_openai()
+    hotel_df = budget_listings("Resumed", 3)
+    # one call at a time: the three legitimacy calls queue up before the first
+    # hotel's details, and that's the budget spent
+    run = EnrichmentRun(hotel_df, concurrency=1, budget=Budget(max_llm_calls=4))
+    run.start().join(timeout=30)
+    assert run.budget.exhausted == "llm_calls"
+    assert len(run.snapshot()) == 1
+
+    resumed = run.with_budget(max_llm_calls=100)
+    assert resumed is not run and resumed.hotel_df is hotel_df
+    resumed.join(timeout=30)
+    assert len(resumed.snapshot()) == 3
+    # only the two missing details calls are made again
+    assert server.requests == 6
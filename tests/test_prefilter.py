@@ -0,0 +1,63 @@
+import logging
+
+import pytest
+
+from app.backend.prefilter import AhoCorasick
+from app.backend.search import HotelBrand, classify_legitimacy, get_name_prefilter
+
+
+def test_automaton_finds_overlapping_phrases():
+    automaton = AhoCorasick({"he": 1, "she": 2, "hers": 3})
+    assert sorted(automaton.find("ushers")) == [(1, 4, 2), (2, 4, 1), (2, 6, 3)]
+
+
+@pytest.mark.parametrize(
+    ("name", "brand", "level"),
+    [
+        ("Hilton Garden Inn Times Square", HotelBrand.Hilton, "Midscale"),
+        ("Moxy NYC Times Square", HotelBrand.Marriott, "Midscale"),
+        ("Conrad New York Midtown", HotelBrand.Hilton, "Luxury"),
+    ],
+)
+def test_branded_names_are_legit(name, brand, level):
+    prefilter = get_name_prefilter()
+    assert prefilter.scan(name) == ((brand, level), 0)
+    assert prefilter.decide(name) is True
+
+
+@pytest.mark.parametrize(
+    "name",
+    [
+        "Located In Midtown! Trendy Bars, Pet-friendly, Close To Broadway!",
+        "Spacious Room in The Heart of Manhattan, Sleeps 4",
+        "Spacious Apartments near Times Square",
+        "",
+        None,
+    ],
+)
+def test_blurbs_are_not_legit(name):
+    assert get_name_prefilter().decide(name) is False
+
+
+@pytest.mark.parametrize(
+    "name",
+    [
+        # a brand plus a marketing word, plural or not, goes to the LLM
+        "Conrad Apartments",
+        "Conrad Apartment",
+        # "w hotels" only on a word boundary
+        "New Hotels Inc",
+        "Hotel Edison",
+    ],
+)
+def test_unclear_names_go_to_the_llm(name):
+    assert get_name_prefilter().decide(name) is None
+
+
+def test_stats_are_logged(caplog):
+    names = ["Hilton Garden Inn Times Square", "Located In Midtown! Trendy Bars!"]
+    with caplog.at_level(logging.INFO, logger="app.backend.search"):
+        is_legit_name, stats = classify_legitimacy(names)
+    assert is_legit_name == [True, False]
+    assert stats["sent_to_llm"] == 0
+    assert "Pre-filter decided 2 of 2 names" in caplog.text
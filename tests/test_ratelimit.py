@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+from app.backend.llm_async import call_with_retries, run_sync
+from app.backend.llm_gateway import get_llm_gateway
+from app.backend.ratelimit import RateLimited
+from app.backend.search import LEGIT_MODEL, aclassify_hotel_names
+
+
+def test_no_rows_dropped_over_the_quota(fake_openai):
+    # 10 requests a second, answered with 429 and retry-after-ms above it
+    server = fake_openai(latency=0.05, rpm=600)
+    names = [f"Quota Hotel {i}" for i in range(60)]
+    results = run_sync(aclassify_hotel_names(names, concurrency=16, max_retries=0))
+    assert [result.name for result in results] == names
+    assert server.rate_limited > 0
+    assert server.requests == len(names)
+    assert get_llm_gateway().stats()[LEGIT_MODEL]["ceiling_rpm"] == 600
+
+
+def test_requeues_dont_use_up_retries():
+    calls = []
+
+    async def rate_limited_twice():
+        calls.append(None)
+        if len(calls) <= 2:
+            raise RateLimited("429", delay=0.01)
+        return "answer"
+
+    assert run_sync(call_with_retries(rate_limited_twice, max_retries=0)) == "answer"
+    assert len(calls) == 3
+
+
+def test_requeues_are_bounded():
+    async def always_rate_limited():
+        raise RateLimited("429")
+
+    with pytest.raises(RateLimited):
+        run_sync(call_with_retries(always_rate_limited, max_requeues=3))
+
+
+def test_waiting_for_the_limiter_doesnt_time_out(fake_openai):
+    fake_openai(latency=0.05)
+    # paused for longer than the whole request may take
+    get_llm_gateway().limiter(LEGIT_MODEL).on_rate_limited(delay=0.5)
+    results = run_sync(
+        aclassify_hotel_names(["Paused Hotel"], timeout=0.3, max_retries=0)
+    )
+    assert results[0].name == "Paused Hotel"
+
+
+def test_slow_requests_still_time_out():
+    async def slow():
+        await asyncio.sleep(1)
+
+    with pytest.raises(TimeoutError):
+        run_sync(call_with_retries(slow, timeout=0.05, max_retries=0))
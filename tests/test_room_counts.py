@@ -0,0 +1,69 @@
+import pandas as pd
+
+from app.backend.room_counts import RoomCountResolver, RoomCountStore
+
+HOTEL = "Hotel Nowhere Midtown"
+
+
+def answer(hotel_name, rooms=300):
+    return {
+        "name": hotel_name,
+        "brand": "Independent",
+        "subbrand": "Midscale",
+        "total_num_of_rooms": rooms,
+        "details_model": "gpt-4",
+    }
+
+
+def resolver(tmp_path, llm_version="v1"):
+    return RoomCountResolver(
+        RoomCountStore(tmp_path / "room_counts.sqlite"),
+        tmp_path / "cvent_room_info.parquet",
+        tmp_path / "room_overrides.csv",
+        llm_version,
+    )
+
+
+def fetcher(asked):
+    def fetch(hotel_names):
+        asked.extend(hotel_names)
+        return [answer(hotel_name) for hotel_name in hotel_names]
+
+    return fetch
+
+
+def test_earlier_answers_are_reused_under_the_same_version(tmp_path):
+    asked = []
+    resolver(tmp_path).details_records([HOTEL], fetcher(asked))
+    (record,) = resolver(tmp_path).details_records([HOTEL], fetcher(asked))
+    assert asked == [HOTEL]
+    assert record["rooms_source"] == "earlier_llm"
+    assert record["total_num_of_rooms"] == 300
+
+
+def test_earlier_answers_of_another_version_are_asked_again(tmp_path):
+    asked = []
+    resolver(tmp_path, "v1").details_records([HOTEL], fetcher(asked))
+    resolver(tmp_path, "v2").details_records([HOTEL], fetcher(asked))
+    assert asked == [HOTEL, HOTEL]
+
+
+def write_cvent(tmp_path, rooms):
+    pd.DataFrame({"hotel": [HOTEL], "total_num_rooms": [rooms]}).to_parquet(
+        tmp_path / "cvent_room_info.parquet"
+    )
+
+
+def test_cvent_counts_replace_the_llm_answer(tmp_path):
+    write_cvent(tmp_path, 250)
+    (record,) = resolver(tmp_path).overlay([answer(HOTEL)], [HOTEL])
+    assert (record["total_num_of_rooms"], record["rooms_source"]) == (250, "cvent")
+
+
+def test_overrides_win_over_cvent(tmp_path):
+    write_cvent(tmp_path, 250)
+    pd.DataFrame({"name": [HOTEL], "total_num_of_rooms": [120]}).to_csv(
+        tmp_path / "room_overrides.csv", index=False
+    )
+    (record,) = resolver(tmp_path).overlay([answer(HOTEL)], [HOTEL])
+    assert (record["total_num_of_rooms"], record["rooms_source"]) == (120, "override")
@@ -0,0 +1,78 @@
+from app.backend import scrape_cvent
+from app.backend.scrape_cvent import (
+    CventCheckpoint,
+    parse_total_guest_rooms,
+    resolve_cvent_links,
+)
+
+
+class FakeResolver:
+    requests = cache_hits = 0
+
+    def __init__(self, links):
+        self.links = links
+
+    def iter_resolve(self, queries):
+        for query in queries:
+            yield query, self.links[query]
+
+
+def test_parse_total_guest_rooms():
+    assert parse_total_guest_rooms("Guest Rooms\nTotal guest rooms 478") == 478
+    assert parse_total_guest_rooms("Meeting space 12") is None
+    assert parse_total_guest_rooms(None) is None
+
+
+def test_checkpoint_keeps_the_latest_state_and_counts_attempts(tmp_path):
+    checkpoint = CventCheckpoint(str(tmp_path / "crawl.sqlite"))
+    checkpoint.record("Hotel A", "found_link", cvent_link="https://cvent.com/a")
+    checkpoint.record(
+        "Hotel A",
+        "error",
+        stage="scrape",
+        cvent_link="https://cvent.com/a",
+        error=TimeoutError("page"),
+    )
+    checkpoint.record("Hotel B", "no_link")
+    checkpoint.record(
+        "Hotel C",
+        "scraped",
+        cvent_link="https://cvent.com/c",
+        all_info=["Total guest rooms 300"],
+        total_num_rooms=300,
+    )
+
+    assert checkpoint.states() == {
+        "Hotel A": ("error", "https://cvent.com/a"),
+        "Hotel B": ("no_link", None),
+        "Hotel C": ("scraped", "https://cvent.com/c"),
+    }
+    assert checkpoint.progress() == {"error": 1, "no_link": 1, "scraped": 1}
+    failures = checkpoint.failures()
+    assert failures[["hotel", "stage", "attempts"]].values.tolist() == [
+        ["Hotel A", "scrape", 2]
+    ]
+    assert "TimeoutError" in failures["error"][0]
+    assert checkpoint.room_info().values.tolist() == [
+        ["Hotel C", ["Total guest rooms 300"], 300]
+    ]
+
+
+def test_link_results_are_checkpointed_per_hotel(monkeypatch, tmp_path):
+    resolver = FakeResolver(
+        {
+            "Hotel A NYC": "https://cvent.com/a",
+            "Hotel B NYC": None,
+            "Hotel C NYC": RuntimeError("quota"),
+        }
+    )
+    monkeypatch.setattr(scrape_cvent, "get_link_resolver", lambda *args: resolver)
+    checkpoint = CventCheckpoint(str(tmp_path / "crawl.sqlite"))
+
+    resolve_cvent_links(["Hotel A", "Hotel B", "Hotel C"], checkpoint, location="NYC")
+    assert checkpoint.states() == {
+        "Hotel A": ("found_link", "https://cvent.com/a"),
+        "Hotel B": ("no_link", None),
+        "Hotel C": ("error", None),
+    }
+    assert checkpoint.failures()["stage"].to_list() == ["link"]
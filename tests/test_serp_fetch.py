@@ -0,0 +1,76 @@
+import pytest
+
+from app.backend import serp_fetch
+from app.backend.search import HOTEL_COLUMNS, fetch_all_hotels
+from app.backend.serp_fetch import SerpAPIError, SerpCache, iter_result_pages
+
+
+def hotel_page(names, next_page_token=None):
+    results = {
+        "properties": [
+            {
+                "name": name,
+                "property_token": name.lower().replace(" ", "-"),
+                "gps_coordinates": {"latitude": 40.75, "longitude": -73.98},
+            }
+            for name in names
+        ]
+    }
+    if next_page_token:
+        results["serpapi_pagination"] = {
+            "next": "https://serpapi.com/search",
+            "next_page_token": next_page_token,
+        }
+    return results
+
+
+@pytest.fixture
+def serpapi(monkeypatch):
+    """Answers requests from `pages`, {next_page_token or None: response},
+    and records the params of every request."""
+    pages = {}
+    requests = []
+
+    def request_page(params):
+        requests.append(params)
+        return pages[params.get("next_page_token")]
+
+    monkeypatch.setattr(serp_fetch, "request_page", request_page)
+    monkeypatch.setattr(serp_fetch, "_default_limiter", None)
+    return pages, requests
+
+
+def test_pages_follow_pagination_and_come_from_cache(serpapi, tmp_path):
+    pages, requests = serpapi
+    pages[None] = hotel_page(["Hotel A", "Hotel B"], next_page_token="page-1")
+    pages["page-1"] = hotel_page(["Hotel C"])
+    cache = SerpCache(str(tmp_path / "serp.sqlite"))
+    params = {"engine": "google_hotels", "q": "Hotels in Midtown", "api_key": "a"}
+
+    first = list(iter_result_pages(params, cache=cache))
+    assert [len(page["properties"]) for page in first] == [2, 1]
+    assert len(requests) == 2
+
+    # the api key and the case of the query don't change the cache key
+    again = {**params, "q": "hotels in  midtown", "api_key": "b"}
+    assert list(iter_result_pages(again, cache=cache)) == first
+    assert len(requests) == 2
+
+
+def test_error_page_raises(serpapi, tmp_path):
+    pages, _ = serpapi
+    pages[None] = hotel_page(["Hotel A"], next_page_token="page-1")
+    pages["page-1"] = {"error": "Invalid API key."}
+    cache = SerpCache(str(tmp_path / "serp.sqlite"))
+
+    with pytest.raises(SerpAPIError, match="Invalid API key"):
+        list(iter_result_pages({"q": "Hotels in Midtown"}, cache=cache))
+
+
+def test_query_without_results_gives_empty_frame(serpapi):
+    pages, _ = serpapi
+    pages[None] = {"error": "Google hasn't returned any results for this query."}
+
+    hotel_df = fetch_all_hotels("Hotels on the Moon", "key")
+    assert hotel_df.empty
+    assert list(hotel_df.columns) == HOTEL_COLUMNS
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+from app.backend.spatial import HotelIndex, haversine
+
+
+def random_hotels(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    hotel_df = pd.DataFrame(
+        {
+            "latitude": 40.70 + rng.random(n) * 0.12,
+            "longitude": -74.02 + rng.random(n) * 0.08,
+        }
+    )
+    hotel_df.loc[[3, 7], "latitude"] = np.nan
+    return hotel_df
+
+
+def brute_force_within(hotel_df, lat, lon, radius_m):
+    meters = haversine(lat, lon, hotel_df["latitude"], hotel_df["longitude"])
+    return np.flatnonzero(meters.to_numpy() <= radius_m)
+
+
+def test_radius_queries_match_haversine():
+    hotel_df = random_hotels()
+    index = HotelIndex(hotel_df)
+    assert len(index) == len(hotel_df) - 2
+    sites = [(40.758, -73.985), (40.75, -74.0), (40.0, -70.0)]
+    lats, lons = zip(*sites)
+
+    for (lat, lon), found in zip(sites, index.within_radius(lats, lons, 800)):
+        assert found.tolist() == brute_force_within(hotel_df, lat, lon, 800).tolist()
+
+    site, hotel, meters = index.within_radius_pairs(lats, lons, 800)
+    for i, (lat, lon) in enumerate(sites):
+        expected = brute_force_within(hotel_df, lat, lon, 800)
+        assert hotel[site == i].tolist() == expected.tolist()
+    expected_meters = haversine(
+        np.asarray(lats)[site],
+        np.asarray(lons)[site],
+        hotel_df["latitude"].to_numpy()[hotel],
+        hotel_df["longitude"].to_numpy()[hotel],
+    )
+    np.testing.assert_allclose(meters, expected_meters, rtol=1e-6)
+
+
+def test_nearest_pads_missing_neighbours():
+    hotel_df = pd.DataFrame({"latitude": [40.0, 40.01], "longitude": [-74.0, -74.0]})
+    meters, positions = HotelIndex(hotel_df).nearest([40.0], [-74.0], k=3)
+    assert positions.tolist() == [[0, 1, -1]]
+    np.testing.assert_allclose(meters[0, :2], [0, 1111.95], atol=0.1)
+    assert meters[0, 2] == np.inf
+
+
+def test_bbox_queries_including_the_antimeridian():
+    hotel_df = pd.DataFrame(
+        {
+            "latitude": [40.75, 40.76, 40.80, -17.0, -17.5],
+            "longitude": [-73.99, -73.98, -73.95, 179.9, -179.8],
+        }
+    )
+    index = HotelIndex(hotel_df)
+    midtown, fiji, empty = index.within_bbox(
+        [40.74, -18.0, 0.0],
+        [-74.0, 179.0, 0.0],
+        [40.77, -16.0, 1.0],
+        [-73.97, -179.0, 1.0],
+    )
+    assert midtown.tolist() == [0, 1]
+    assert fiji.tolist() == [3, 4]
+    assert empty.tolist() == []
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+from app.backend.supply import SUPPLY_COLUMNS, competitive_supply
+
+# about 111 m per 0.001 degree of latitude
+HOTELS = pd.DataFrame(
+    {
+        "name": ["Near A", "Near B", "Mid", "Far"],
+        "latitude": [40.7502, 40.7505, 40.7560, 40.7700],
+        "longitude": [-73.99] * 4,
+        "brand": [
+            "Hilton Worldwide",
+            "Marriott International",
+            "Hilton Worldwide",
+            None,
+        ],
+        "scale": ["Premium", "Luxury", "Premium", "Economy"],
+        "star_rating": ["4-star hotel", "5-star hotel", None, "2-star hotel"],
+        "total_num_of_rooms": [100, 300, 200, np.nan],
+    }
+)
+SITES = pd.DataFrame(
+    {"latitude": [40.75, 10.0], "longitude": [-73.99, 10.0]},
+    index=["times_sq", "nowhere"],
+)
+
+
+def supply_rows(supply, **where):
+    mask = np.ones(len(supply), dtype=bool)
+    for column, value in where.items():
+        mask &= supply[column] == value
+    return supply[mask]
+
+
+def test_totals_are_cumulative_over_the_radii():
+    supply = competitive_supply(HOTELS, SITES, radii_m=(100, 800, 3000))
+    assert list(supply.columns) == SUPPLY_COLUMNS
+    totals = supply_rows(supply, site="times_sq", dimension="total")
+    assert totals[["radius_m", "hotels", "rooms"]].values.tolist() == [
+        [100, 2, 400],
+        [800, 3, 600],
+        [3000, 4, 600],
+    ]
+    # every site gets its total rows, even without hotels around it
+    nowhere = supply_rows(supply, site="nowhere")
+    assert nowhere[["dimension", "hotels"]].values.tolist() == [["total", 0]] * 3
+
+
+def test_breakdowns_and_room_shares():
+    supply = competitive_supply(HOTELS, SITES, radii_m=(800,))
+    brands = supply_rows(supply, site="times_sq", dimension="brand")
+    assert brands[["value", "hotels", "rooms"]].values.tolist() == [
+        ["Hilton Worldwide", 2, 300],
+        ["Marriott International", 1, 300],
+    ]
+    assert brands["room_share"].tolist() == [0.5, 0.5]
+    stars = supply_rows(supply, site="times_sq", dimension="stars")
+    assert stars[["value", "hotels"]].values.tolist() == [
+        ["4", 1],
+        ["5", 1],
+        ["Unknown", 1],
+    ]
+
+
+def test_chunks_give_the_same_table():
+    sites = pd.DataFrame(
+        {"latitude": np.linspace(40.74, 40.78, 7), "longitude": -73.99}
+    )
+    whole = competitive_supply(HOTELS, sites)
+    chunked = competitive_supply(HOTELS, sites, chunk_size=2)
+    sort = ["site", "radius_m", "dimension", "value"]
+    pd.testing.assert_frame_equal(
+        whole.sort_values(sort, ignore_index=True),
+        chunked.sort_values(sort, ignore_index=True),
+    )
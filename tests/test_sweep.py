@@ -0,0 +1,38 @@
+from app.backend import serp_fetch
+from app.backend.sweep import SweepCheckpoint, run_sweep
+
+NO_RESULTS = {"error": "Google hasn't returned any results for this query."}
+
+
+def test_resume_skips_finished_tasks_including_empty_ones(monkeypatch, tmp_path):
+    requests = []
+
+    def request_page(params):
+        requests.append(params["q"])
+        if params["q"] == "Hotels in Empty Cell":
+            return NO_RESULTS
+        return {
+            "properties": [
+                {
+                    "name": f"Hotel {i}",
+                    "property_token": f"token-{i}",
+                    "gps_coordinates": {"latitude": 40.75, "longitude": -73.98},
+                }
+                for i in range(3)
+            ]
+        }
+
+    monkeypatch.setattr(serp_fetch, "request_page", request_page)
+    checkpoint = SweepCheckpoint(str(tmp_path / "sweeps.sqlite"))
+    queries = ["Hotels in Midtown", "Hotels in Empty Cell"]
+    stays = [("2024-06-01", "2024-06-02")]
+
+    hotels = run_sweep("test", queries, stays, "key", rate=100, checkpoint=checkpoint)
+    assert len(hotels) == 3
+    assert checkpoint.progress("test") == {"done": 2}
+    assert sorted(requests) == sorted(queries)
+
+    # nothing is left to run, the empty cell included
+    hotels = run_sweep("test", queries, stays, "key", rate=100, checkpoint=checkpoint)
+    assert len(hotels) == 3
+    assert len(requests) == 2